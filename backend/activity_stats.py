@@ -0,0 +1,146 @@
+"""
+Améliorations et tendance récentes du dashboard (/api/user/detailed-stats),
+calculées par MongoDB en un seul pipeline d'agrégation.
+
+Le pipeline ne lit que les RECENT_SESSIONS dernières analyses de l'index
+(user_id, date) puis un $facet calcule en une passe:
+    improvements  $setWindowFields ($shift): écart avec la session précédente
+    trend         $setWindowFields ($documentNumber) puis $group: sommes de
+                  la régression linéaire des scores récents
+Seul ce petit document sort de la base. activity_facets() en est
+l'équivalent en mémoire (mode démo), format_activity() met en forme le
+résultat des deux; check_activity_stats.py vérifie qu'ils concordent. L'activité par semaine vient des agrégats journaliers
+(voir rollups.py). Nécessite MongoDB 5.0+ ($setWindowFields).
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Analyses de la tendance et des améliorations
+RECENT_SESSIONS = 10
+IMPROVEMENT_SESSIONS = 5
+
+# Écart de score minimal d'une amélioration, pente minimale d'une tendance
+IMPROVEMENT_THRESHOLD = 5
+TREND_SLOPE = 0.5
+
+# Forme du document $facet lu par format_activity (champs de chaque ligne)
+FACET_FIELDS = {
+    'improvements': ('pose', 'improvement', 'date'),
+    'trend': ('n', 'sum_x', 'sum_y', 'sum_xy', 'sum_x2'),
+}
+
+
+def activity_pipeline(user_id) -> List[Dict[str, Any]]:
+    """Pipeline d'agrégation des améliorations et de la tendance d'un utilisateur"""
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$sort': {'date': -1}},
+        {'$limit': RECENT_SESSIONS},
+        # Champs utiles, score absent compté 0
+        {'$project': {'_id': 0, 'pose_name': 1, 'date': 1, 'score': {'$ifNull': ['$score', 0]}}},
+        {'$facet': {
+            'improvements': [
+                {'$sort': {'date': -1}},
+                {'$limit': IMPROVEMENT_SESSIONS},
+                {'$setWindowFields': {
+                    'sortBy': {'date': 1},
+                    'output': {'previous_score': {'$shift': {'output': '$score', 'by': -1}}},
+                }},
+                {'$match': {
+                    'previous_score': {'$ne': None},
+                    '$expr': {'$gt': ['$score', {'$add': ['$previous_score', IMPROVEMENT_THRESHOLD]}]},
+                }},
+                {'$sort': {'date': -1}},
+                {'$project': {
+                    'pose': '$pose_name',
+                    'improvement': {'$round': [{'$subtract': ['$score', '$previous_score']}, 1]},
+                    'date': 1,
+                }},
+            ],
+            'trend': [
+                {'$setWindowFields': {'sortBy': {'date': 1}, 'output': {'x': {'$documentNumber': {}}}}},
+                {'$group': {
+                    '_id': None,
+                    'n': {'$sum': 1},
+                    'sum_x': {'$sum': '$x'},
+                    'sum_y': {'$sum': '$score'},
+                    'sum_xy': {'$sum': {'$multiply': ['$x', '$score']}},
+                    'sum_x2': {'$sum': {'$multiply': ['$x', '$x']}},
+                }},
+            ],
+        }},
+    ]
+
+
+def activity_facets(analyses: Iterable[Dict[str, Any]]) -> Dict[str, List]:
+    """Équivalent en mémoire du résultat de activity_pipeline (mode démo)"""
+    analyses = sorted(
+        ({'pose_name': a.get('pose_name'), 'date': a.get('date', datetime.min), 'score': a.get('score', 0)}
+         for a in analyses),
+        key=lambda a: a['date'], reverse=True
+    )
+
+    recent = analyses[:RECENT_SESSIONS]
+    improvements = []
+    for current, previous in zip(recent[:IMPROVEMENT_SESSIONS], recent[1:IMPROVEMENT_SESSIONS]):
+        if current['score'] > previous['score'] + IMPROVEMENT_THRESHOLD:
+            improvements.append({
+                'pose': current['pose_name'],
+                'improvement': round(current['score'] - previous['score'], 1),
+                'date': current['date'],
+            })
+
+    # Régression sur les scores récents dans l'ordre chronologique (x = 1..n)
+    points = list(enumerate(reversed([a['score'] for a in recent]), 1))
+    trend = [{
+        '_id': None,
+        'n': len(points),
+        'sum_x': sum(x for x, _ in points),
+        'sum_y': sum(y for _, y in points),
+        'sum_xy': sum(x * y for x, y in points),
+        'sum_x2': sum(x * x for x, _ in points),
+    }] if points else []
+
+    return {
+        'improvements': improvements,
+        'trend': trend,
+    }
+
+
+def facet_errors(facets: Dict[str, List]) -> List[str]:
+    """Écarts d'un résultat $facet avec la forme attendue (FACET_FIELDS); liste vide si conforme"""
+    errors = [f"facette inattendue: {name}" for name in facets if name not in FACET_FIELDS]
+    for name, fields in FACET_FIELDS.items():
+        rows = facets.get(name)
+        if not isinstance(rows, list):
+            errors.append(f"{name}: liste attendue")
+            continue
+        for index, row in enumerate(rows):
+            missing = [field for field in fields if field not in row]
+            if missing:
+                errors.append(f"{name}[{index}]: champs manquants {', '.join(missing)}")
+    if len(facets.get('trend') or []) > 1:
+        errors.append("trend: une ligne au plus")
+    return errors
+
+
+def progress_trend(trend: Optional[Dict[str, Any]]) -> str:
+    """'improving', 'declining' ou 'stable' d'après la pente de la régression"""
+    if not trend or trend['n'] < 3:
+        return 'stable'
+
+    n = trend['n']
+    slope = (n * trend['sum_xy'] - trend['sum_x'] * trend['sum_y']) / (n * trend['sum_x2'] - trend['sum_x'] ** 2)
+    if slope > TREND_SLOPE:
+        return 'improving'
+    elif slope < -TREND_SLOPE:
+        return 'declining'
+    return 'stable'
+
+
+def format_activity(facets: Dict[str, List]) -> Dict[str, Any]:
+    """recent_improvements et progress_trend de /api/user/detailed-stats"""
+    return {
+        'recent_improvements': facets.get('improvements', []),
+        'progress_trend': progress_trend(next(iter(facets.get('trend', [])), None)),
+    }
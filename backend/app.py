@@ -1,45 +1,109 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+# Début du démarrage, pour la mesure du temps de démarrage (voir STARTUP_BUDGET_S)
+STARTUP_BEGIN = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import os
+import json
 import uuid
 import base64
+import binascii
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
-from bson import ObjectId
-
-# Configuration pour réduire les logs
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-import absl.logging
-absl.logging.set_verbosity(absl.logging.ERROR)
+from datetime import datetime
 
 # Import des modules
 from database import db
+from user_stats import summarize, current_streak
+from rollups import DEFAULT_PERIODS, MAX_PERIODS, period_starts, window_start, group_periods, streaks
 from auth import auth_manager
+from keypoints import PoseKeypoints
+from pose_rules import scoring_rules
+from image_store import ImageStore
+from principal_cache import PrincipalCache
+from pagination import parse_page_size, parse_fields, parse_date, decode_cursor, encode_cursor
+import wire_format
 
 # 🔥 CORRECTION: Importer les modules APRÈS la création de l'app
 try:
     from pose_analyzer_ml import MLAnalyzer
+    from inference_scheduler import InferenceScheduler
+    from pose_stream import PoseStreamAnalyzer, parse_timestamp
+    from live_channel import LiveChannel, parse_frame, LIVE_AUTH_TIMEOUT_S
+    from estimator_pool import EstimatorPool, PoolTimeout
     
     # Initialisation des composants
     pose_analyzer = MLAnalyzer()
     
+    # Analyse temporelle par session (tampons circulaires bornés)
+    pose_stream = PoseStreamAnalyzer(
+        pose_analyzer,
+        max_sessions=int(os.getenv('STREAM_MAX_SESSIONS', '1000')),
+        idle_timeout_s=float(os.getenv('STREAM_IDLE_TIMEOUT_S', '300'))
+    )
+    
+    # PoseEstimator pour l'analyse d'images côté serveur: préchauffés au premier
+    # /analyze/image (ESTIMATOR_POOL_WARM=1: dès le démarrage), pour que les
+    # workers qui n'analysent que des keypoints ne chargent pas MediaPipe
+    estimator_pool = EstimatorPool(
+        size=int(os.getenv('ESTIMATOR_POOL_SIZE', '2')),
+        adaptive=os.getenv('ESTIMATOR_ADAPTIVE', '0') == '1',
+        warm_on_first_use=True
+    )
+    if os.getenv('ESTIMATOR_POOL_WARM', '0') == '1':
+        estimator_pool.warm_async()
+    
+    # Micro-batching des requêtes /analyze concurrentes
+    inference_scheduler = InferenceScheduler(
+        pose_analyzer,
+        max_batch_size=int(os.getenv('INFERENCE_MAX_BATCH', '64')),
+        max_wait_ms=float(os.getenv('INFERENCE_BATCH_WINDOW_MS', '2'))
+    )
+    
 except ImportError as e:
     print(f"⚠️ Attention: {e}")
     print("⚠️ Certains modules ne sont pas disponibles, mode démo activé")
     pose_analyzer = None
+    inference_scheduler = None
+    pose_stream = None
+    estimator_pool = None
+
+# Canal temps réel WebSocket (optionnel: flask-sock)
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi', 'webm', 'mkv'}
+VIDEO_MAX_SAMPLE_FPS = float(os.getenv('VIDEO_MAX_SAMPLE_FPS', '30'))  # Frames analysées par seconde au plus
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+INFERENCE_TIMEOUT_S = 10
+ESTIMATOR_CHECKOUT_TIMEOUT_S = float(os.getenv('ESTIMATOR_CHECKOUT_TIMEOUT_S', '5'))
+ANALYSIS_IMAGE_MAX_SIZE = 1024  # Plus grand côté des images analysées (px)
+# Budget de démarrage d'un worker API (import + chargement du modèle)
+STARTUP_BUDGET_S = float(os.getenv('STARTUP_BUDGET_S', '1.0'))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
-# Créer le dossier uploads
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Principaux authentifiés par token (évite JWT + MongoDB à chaque requête).
+# Cache local au processus: invalidate_user n'atteint pas les autres workers,
+# qui servent l'ancien profil au plus PRINCIPAL_CACHE_TTL_S secondes. Ne
+# l'allonger qu'avec un seul worker.
+principal_cache = PrincipalCache(
+    max_entries=int(os.getenv('PRINCIPAL_CACHE_SIZE', '10000')),
+    ttl_s=float(os.getenv('PRINCIPAL_CACHE_TTL_S', '30'))
+)
+
+# Images d'analyse adressées par contenu, écrites en arrière-plan (crée le dossier uploads)
+image_store = ImageStore(UPLOAD_FOLDER, workers=int(os.getenv('IMAGE_STORE_WORKERS', '2')),
+                          record_usage=db.record_user_image)
 
 # Configuration CORS
 CORS(app, resources={
@@ -63,12 +127,24 @@ def get_current_user():
     if not token or not token.startswith('Bearer '):
         return None
     
+    return authenticate_token(token.split(' ')[1])
+
+def authenticate_token(token):
+    """Retourne le principal (utilisateur réduit) d'un JWT, ou None si le token est invalide"""
+    if not isinstance(token, str):
+        return None
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    
     try:
-        token = token.split(' ')[1]
-        user_id = auth_manager.verify_token(token)
-        return db.find_user_by_id(user_id)
+        payload = auth_manager.decode_token(token)
+        user = db.find_user_by_id(payload['user_id'])
     except:
         return None
+    if not user:
+        return None
+    return principal_cache.put(token, user, payload.get('exp'))
 
 def login_required(f):
     """Décorateur pour les routes protégées"""
@@ -92,6 +168,42 @@ def hello():
 def health_check():
     return jsonify({"status": "healthy"})
 
+@app.route('/metrics/startup')
+def startup_metrics():
+    """Temps de démarrage et mémoire résidente du worker"""
+    return jsonify(startup_stats)
+
+@app.route('/metrics/stream')
+def stream_metrics():
+    """Sessions de stream actives et évictions"""
+    if pose_stream is None:
+        return jsonify({'error': 'Stream analysis not available'}), 503
+    return jsonify(pose_stream.metrics())
+
+@app.route('/metrics/estimators')
+def estimator_metrics():
+    """Occupation du pool de PoseEstimator"""
+    if estimator_pool is None:
+        return jsonify({'error': 'Estimator pool not available'}), 503
+    return jsonify(estimator_pool.metrics())
+
+@app.route('/metrics/auth')
+def auth_metrics():
+    """Taux de succès du cache de principaux"""
+    return jsonify(principal_cache.metrics())
+
+@app.route('/metrics/images')
+def image_metrics():
+    """Écritures d'images en attente, dédupliquées et en erreur"""
+    return jsonify(image_store.metrics())
+
+@app.route('/metrics/inference')
+def inference_metrics():
+    """Métriques du micro-batching (profondeur de file, tailles de lot)"""
+    if inference_scheduler is None:
+        return jsonify({'error': 'Inference scheduler not available'}), 503
+    return jsonify(inference_scheduler.metrics())
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     """Serve uploaded files"""
@@ -191,159 +303,323 @@ def get_current_user_profile(user):
 @login_required
 def get_available_postures(user):
     """Retourne la liste des postures que l'IA peut détecter"""
-    postures = [
-        {
-            'id': 'downdog',
-            'name': 'Downward Dog',
-            'icon': '🐕',
-            'description': 'Posture de chien tête en bas, excellente pour l\'étirement complet',
-            'benefits': 'Étire les ischio-jambiers, renforce les bras et les épaules',
-            'difficulty': 'beginner',
-            'musclesWorked': ['Épaules', 'Ischio-jambiers', 'Mollets'],
-            'breathingTips': '5-10 respirations profondes',
-            'targetAngles': {
-                'left_shoulder': 90,
-                'right_shoulder': 90,
-                'left_hip': 90,
-                'right_hip': 90
-            }
-        },
-        {
-            'id': 'warrior2',
-            'name': 'Warrior II',
-            'icon': '⚔️',
-            'description': 'Posture de guerrier pour la force et la stabilité',
-            'benefits': 'Renforce les jambes, améliore l\'équilibre',
-            'difficulty': 'beginner',
-            'musclesWorked': ['Cuisses', 'Fessiers', 'Épaules'],
-            'breathingTips': '5-8 respirations par côté',
-            'targetAngles': {
-                'left_knee': 90,
-                'right_knee': 90,
-                'left_hip': 45,
-                'right_hip': 45
-            }
-        },
-        {
-            'id': 'tree',
-            'name': 'Tree Pose',
-            'icon': '🌳',
-            'description': 'Posture de l\'arbre pour l\'enracinement et l\'équilibre',
-            'benefits': 'Améliore l\'équilibre, concentration',
-            'difficulty': 'beginner',
-            'musclesWorked': ['Jambes', 'Abdominaux', 'Dos'],
-            'breathingTips': '5-10 respirations profondes',
-            'targetAngles': {
-                'left_hip': 45,
-                'right_hip': 45
-            }
-        },
-        {
-            'id': 'goddess',
-            'name': 'Goddess Pose',
-            'icon': '👸',
-            'description': 'Posture de la déesse pour la puissance et l\'ouverture',
-            'benefits': 'Renforce les cuisses, ouverture des hanches',
-            'difficulty': 'intermediate',
-            'musclesWorked': ['Cuisses', 'Hanches', 'Épaules'],
-            'breathingTips': '5-8 respirations profondes',
-            'targetAngles': {
-                'left_knee': 90,
-                'right_knee': 90,
-                'left_hip': 45,
-                'right_hip': 45
-            }
-        },
-        {
-            'id': 'plank',
-            'name': 'Plank',
-            'icon': '💪',
-            'description': 'Posture de la planche pour la force centrale',
-            'benefits': 'Renforce le core, bras et épaules',
-            'difficulty': 'beginner',
-            'musclesWorked': ['Abdominaux', 'Épaules', 'Bras'],
-            'breathingTips': '3-5 respirations profondes',
-            'targetAngles': {
-                'left_shoulder': 180,
-                'right_shoulder': 180,
-                'left_hip': 180,
-                'right_hip': 180
-            }
-        }
-    ]
+    # Fiches issues des règles de notation (une seule définition par posture)
+    postures = scoring_rules.catalog()
     
     return jsonify(postures)
 
+def save_analysis(user, analysis_result, image_url=None):
+    """Enregistre une analyse dans l'historique de l'utilisateur"""
+    analysis_record = {
+        'pose_name': analysis_result['pose_name'],
+        'score': analysis_result['score'],
+        'confidence': analysis_result['confidence'],
+        'level': analysis_result.get('level', 'beginner'),
+        'angles': analysis_result.get('angles', {}),
+        'quality_metrics': analysis_result.get('quality_metrics', {}),
+        'feedback': analysis_result.get('feedback', []),
+        'strengths': analysis_result.get('strengths', []),
+        'improvements': analysis_result.get('improvements', []),
+        'priority_feedback': analysis_result.get('priority_feedback', []),
+        'exercise_recommendation': analysis_result.get('exercise_recommendation', {}),
+        'image_url': image_url,
+        'date': datetime.utcnow()
+    }
+    
+    db.add_pose_analysis(str(user['_id']), analysis_record)
+    analysis_result['saved_to_history'] = True
+
+def analysis_response(analysis_result, compact=False):
+    """Réponse d'analyse en JSON ou en MessagePack (en-tête Accept), complète ou compacte"""
+    if compact:
+        analysis_result = wire_format.compact_result(analysis_result)
+    
+    if wire_format.msgpack is not None and \
+            request.accept_mimetypes.best_match(('application/json',) + wire_format.MSGPACK_CONTENT_TYPES) \
+            in wire_format.MSGPACK_CONTENT_TYPES:
+        return Response(wire_format.pack(analysis_result), mimetype=wire_format.MSGPACK_CONTENT_TYPES[0])
+    return jsonify(analysis_result)
+
 # Routes pour l'analyse
 @app.route('/analyze', methods=['POST'])
 @login_required
 def analyze_pose(user):
-    """Analyse les keypoints MediaPipe envoyés du frontend"""
+    """
+    Analyse les keypoints MediaPipe envoyés du frontend.
+    Corps JSON historique, ou binaire compact selon le Content-Type (voir wire_format.py).
+    """
     try:
-        data = request.get_json()
-        
         # Récupérer les keypoints du frontend
-        keypoints = data.get('keypoints')
-        if not keypoints:
-            return jsonify({'error': 'No keypoints provided'}), 400
-        
-        # Sauvegarder l'image si fournie (optionnel)
-        image_url = None
-        if 'image' in data:
-            # Générer un nom de fichier unique
-            filename = f"{uuid.uuid4()}.jpg"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            
-            # Décoder et sauvegarder l'image base64
-            image_data = data['image'].split(',')[1]  # Enlever le header base64
-            with open(filepath, 'wb') as f:
-                f.write(base64.b64decode(image_data))
-            image_url = f"/uploads/{filename}"
+        if wire_format.is_binary(request.mimetype):
+            try:
+                keypoints, data = wire_format.decode_body(request.mimetype, request.get_data())
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            image = data.get('image')
+            compact = data.get('compact', True)
+        else:
+            data = request.get_json()
+            if not data.get('keypoints'):
+                return jsonify({'error': 'No keypoints provided'}), 400
+            try:
+                keypoints = PoseKeypoints.from_json(data['keypoints'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            image = data.get('image')
+            compact = data.get('compact', False)
+        compact = request.args.get('compact', '1' if compact else '0') == '1'
+        if image and not isinstance(image, (str, bytes)):
+            return jsonify({'error': 'Invalid image: base64 string or bytes expected'}), 400
         
         # Analyse des keypoints avec le modèle ML
-        analysis_result = pose_analyzer.analyze_pose(keypoints)
+        analysis_result = inference_scheduler.analyze(keypoints, timeout=INFERENCE_TIMEOUT_S)
         
-        # Ajouter l'URL de l'image si sauvegardée
-        if image_url:
+        # Sauvegarder l'image si fournie (optionnel), seulement après une analyse
+        # réussie: URL immédiate, écriture en arrière-plan, stockage comptabilisé
+        image_url = None
+        if image:
+            try:
+                if isinstance(image, str):
+                    image_url = image_store.store_base64(user['_id'], image)
+                else:
+                    image_url = image_store.store(user['_id'], image)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             analysis_result['image_url'] = image_url
         
         # Sauvegarde dans l'historique utilisateur
-        analysis_record = {
-            'pose_name': analysis_result['pose_name'],
-            'score': analysis_result['score'],
-            'confidence': analysis_result['confidence'],
-            'level': analysis_result.get('level', 'beginner'),
-            'angles': analysis_result.get('angles', {}),
-            'quality_metrics': analysis_result.get('quality_metrics', {}),
-            'feedback': analysis_result.get('feedback', []),
-            'strengths': analysis_result.get('strengths', []),
-            'improvements': analysis_result.get('improvements', []),
-            'priority_feedback': analysis_result.get('priority_feedback', []),
-            'exercise_recommendation': analysis_result.get('exercise_recommendation', {}),
-            'image_url': image_url,
-            'date': datetime.utcnow()
-        }
-        
-        db.add_pose_analysis(str(user['_id']), analysis_record)
-        analysis_result['saved_to_history'] = True
+        save_analysis(user, analysis_result, image_url)
         
+        return analysis_response(analysis_result, compact)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/analyze/image', methods=['POST'])
+@login_required
+def analyze_image(user):
+    """
+    Analyse une image côté serveur, pour les clients qui ne peuvent pas
+    exécuter MediaPipe dans le navigateur.
+    Corps: multipart (champ "image") ou JSON {"image": "data:image/jpeg;base64,..."}
+    """
+    if estimator_pool is None or inference_scheduler is None:
+        return jsonify({'error': 'Image analysis not available'}), 503
+    
+    # Lecture de l'image en mémoire (aucun fichier temporaire)
+    upload = request.files.get('image')
+    if upload is not None:
+        if not allowed_file(upload.filename):
+            return jsonify({'error': 'Unsupported image format'}), 400
+        data = upload.read()
+    else:
+        payload = request.get_json(silent=True) or {}
+        if not isinstance(payload, dict) or not payload.get('image'):
+            return jsonify({'error': 'No image provided'}), 400
+        if not isinstance(payload['image'], str):
+            return jsonify({'error': 'Invalid base64 image'}), 400
+        try:
+            data = base64.b64decode(payload['image'].split(',')[-1])
+        except (binascii.Error, ValueError):
+            return jsonify({'error': 'Invalid base64 image'}), 400
+    
+    from pose_estimator import PoseEstimator
+    try:
+        image = PoseEstimator.decode_image(data, ANALYSIS_IMAGE_MAX_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with estimator_pool.checkout(timeout=ESTIMATOR_CHECKOUT_TIMEOUT_S) as estimator:
+            keypoints = estimator.estimate_keypoints(image)
+            estimation = estimator.last_report if estimator_pool.adaptive else None
+    except PoolTimeout as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if keypoints is None:
+        return jsonify({'error': 'No pose detected'}), 422
+    
+    try:
+        analysis_result = inference_scheduler.analyze(keypoints, timeout=INFERENCE_TIMEOUT_S)
+        analysis_result['image_url'] = image_store.store(user['_id'], data)
+        save_analysis(user, analysis_result, analysis_result['image_url'])
+        if estimation is not None:
+            analysis_result['estimation'] = estimation
         return jsonify(analysis_result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/analyze/stream', methods=['POST'])
+@login_required
+def analyze_stream(user):
+    """
+    Analyse une séquence de frames d'une session de pratique.
+    Corps: {"session_id": "...", "frames": [{"keypoints": [...], "t": secondes}, ...]}
+    (ou une seule frame: {"session_id": "...", "keypoints": [...], "t": ...}).
+    Sans 't', une seule frame par requête, datée à la réception; une session
+    ne mélange pas les deux horloges.
+    Retourne l'analyse de la dernière frame et les indicateurs temporels.
+    """
+    if pose_stream is None:
+        return jsonify({'error': 'Stream analysis not available'}), 503
     
+    data = request.get_json() or {}
+    session_id = data.get('session_id')
+    if not session_id:
+        return jsonify({'error': 'session_id is required'}), 400
+    
+    raw_frames = data.get('frames') or ([data] if data.get('keypoints') else [])
+    if not raw_frames:
+        return jsonify({'error': 'No frames provided'}), 400
+    try:
+        frames = [(PoseKeypoints.from_json(frame['keypoints']), parse_timestamp(frame.get('t')))
+                  for frame in raw_frames]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid frame: {e}'}), 400
+    
+    try:
+        return jsonify(pose_stream.process(str(user['_id']), session_id, frames))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/analyze/stream/<session_id>', methods=['DELETE'])
+@login_required
+def end_stream(user, session_id):
+    """Termine une session de stream et retourne ses derniers indicateurs"""
+    if pose_stream is None:
+        return jsonify({'error': 'Stream analysis not available'}), 503
+    
+    temporal = pose_stream.end_session(str(user['_id']), session_id)
+    if temporal is None:
+        return jsonify({'error': 'Session not found'}), 404
+    return jsonify({'session_id': session_id, 'temporal': temporal})
+
+@app.route('/analyze/video', methods=['POST'])
+@login_required
+def analyze_video(user):
+    """
+    Analyse une vidéo de pratique (multipart, champ "video").
+    Paramètres optionnels: sample_fps (frames analysées par seconde, au plus
+    VIDEO_MAX_SAMPLE_FPS),
+    timeline=0 pour ne renvoyer que le résumé.
+    """
+    if pose_analyzer is None:
+        return jsonify({'error': 'Analyzer not available'}), 503
+    
+    video = request.files.get('video')
+    if video is None or not video.filename:
+        return jsonify({'error': 'No video provided'}), 400
+    extension = video.filename.rsplit('.', 1)[-1].lower() if '.' in video.filename else ''
+    if extension not in VIDEO_EXTENSIONS:
+        return jsonify({'error': f'Unsupported video format: {extension}'}), 400
+    
+    try:
+        sample_fps = float(request.values.get('sample_fps', 10))
+    except ValueError:
+        return jsonify({'error': 'Invalid sample_fps'}), 400
+    # Rejette aussi 0, les valeurs négatives, nan et inf
+    if not 0 < sample_fps <= VIDEO_MAX_SAMPLE_FPS:
+        return jsonify({'error': f'sample_fps must be in (0, {VIDEO_MAX_SAMPLE_FPS:g}]'}), 400
+    include_timeline = request.values.get('timeline', '1') not in ('0', 'false')
+    
+    # Chargé au premier usage: OpenCV et MediaPipe ne sont pas nécessaires au démarrage
+    from video_pipeline import VideoAnalyzer
+    
+    # Copie sur disque pour OpenCV, supprimée après l'analyse
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}.{extension}")
+    video.save(filepath)
+    try:
+        result = VideoAnalyzer(pose_analyzer, sample_fps=sample_fps).analyze(filepath, include_timeline)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        os.remove(filepath)
+
+if Sock is not None and pose_stream is not None:
+    sock = Sock(app)
+    
+    @sock.route('/ws/live')
+    def live_socket(ws):
+        """
+        Canal temps réel, authentifié une seule fois par connexion.
+        1er message: {"type": "auth", "token": "<JWT>", "session_id": "..."}
+        Puis des frames compactes: {"k": [x0, y0, z0, v0, x1, ...], "t": secondes}
+        Le serveur répond par des messages "score" (voir LiveChannel).
+        """
+        try:
+            hello = json.loads(ws.receive(timeout=LIVE_AUTH_TIMEOUT_S) or '{}')
+        except (ValueError, ConnectionClosed):
+            return
+        # Un message JSON qui n'est pas un objet (liste, nombre) n'authentifie pas
+        is_auth = isinstance(hello, dict) and hello.get('type') == 'auth'
+        user = authenticate_token(hello.get('token')) if is_auth else None
+        if not user:
+            ws.send(json.dumps({'type': 'error', 'error': 'Authentication required'}))
+            return
+        
+        session_id = str(hello.get('session_id') or uuid.uuid4())
+        channel = LiveChannel(pose_stream, str(user['_id']), session_id, ws.send)
+        channel.send({'type': 'ready', 'session_id': session_id})
+        channel.start()
+        try:
+            while True:
+                message = ws.receive()
+                try:
+                    channel.push(*parse_frame(message))
+                except ValueError as e:
+                    channel.send({'type': 'error', 'error': str(e)})
+        except ConnectionClosed:
+            pass
+        finally:
+            channel.close()
+            print(f"🔌 Session temps réel {session_id} fermée: {channel.stats()}")
+
 # Routes pour l'historique et statistiques
 @app.route('/api/user/history', methods=['GET'])
 @login_required
 def get_user_history(user):
-    """Récupère l'historique des analyses"""
-    user_data = db.find_user_by_id(str(user['_id']))
-    history = user_data.get('posture_history', [])
+    """
+    Page de l'historique des analyses (triées par date décroissante).
     
-    # Trier par date décroissante
-    history.sort(key=lambda x: x.get('date', datetime.min), reverse=True)
+    Paramètres: limit, cursor (next_cursor de la page précédente), fields
+    (champs séparés par des virgules), pose, from et to (dates ISO, to exclu).
+    Les limit+1 analyses sont lues avant de répondre, leur sérialisation est
+    produite en flux: {"items": [...], "next_cursor": ...}
+    """
+    try:
+        limit = parse_page_size(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        if cursor:
+            decode_cursor(cursor)
+        projection = parse_fields(request.args.get('fields'))
+        since = parse_date(request.args.get('from'))
+        until = parse_date(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify(history)
+    # Requête exécutée avant la réponse: une erreur de la base donne un 500
+    # complet plutôt qu'un JSON tronqué après le statut 200
+    try:
+        documents = list(db.get_history_page(str(user['_id']), limit, cursor, projection,
+                                             pose=request.args.get('pose'), since=since, until=until))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    
+    def generate():
+        yield '{"items": ['
+        for count, analysis in enumerate(documents[:limit]):
+            yield (', ' if count else '') + app.json.dumps(dict(analysis, _id=str(analysis['_id'])))
+        yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/api/user/stats', methods=['GET'])
 @login_required
@@ -352,15 +628,21 @@ def get_user_stats(user):
     stats = db.get_user_stats(str(user['_id']))
     return jsonify(stats or {})
 
+@app.route('/api/user/storage', methods=['GET'])
+@login_required
+def get_user_storage(user):
+    """Espace utilisé par les images d'analyse de l'utilisateur"""
+    return jsonify(db.get_storage_usage(str(user['_id'])))
+
 @app.route('/api/user/detailed-stats', methods=['GET'])
 @login_required
 def get_detailed_stats(user):
     """Retourne des statistiques détaillées pour le dashboard"""
     try:
-        user_data = db.find_user_by_id(str(user['_id']))
-        history = user_data.get('posture_history', [])
+        user_id = str(user['_id'])
+        stats = db.get_stats_aggregates(user_id)
         
-        if not history:
+        if not stats or not stats.get('total_sessions'):
             return jsonify({
                 'total_sessions': 0,
                 'average_score': 0,
@@ -371,44 +653,57 @@ def get_detailed_stats(user):
                 'recent_improvements': []
             })
         
-        # Calcul des statistiques de base
-        total_sessions = len(history)
-        average_score = sum(session.get('score', 0) for session in history) / total_sessions
+        # Statistiques de base, niveaux, posture favorite et série: agrégats tenus à jour
+        summary = summarize(stats)
         
-        # Distribution des niveaux
-        level_distribution = {}
-        for session in history:
-            level = session.get('level', 'beginner')
-            level_distribution[level] = level_distribution.get(level, 0) + 1
+        # Améliorations et tendance: calculées par la base (pipeline d'agrégation, voir activity_stats.py)
+        activity = db.get_activity_stats(user_id)
         
-        # Activité hebdomadaire (4 dernières semaines)
-        weekly_activity = calculate_weekly_activity(history)
-        
-        # Posture favorite
-        pose_counts = {}
-        for session in history:
-            pose = session.get('pose_name', 'unknown')
-            pose_counts[pose] = pose_counts.get(pose, 0) + 1
-        favorite_pose = max(pose_counts, key=pose_counts.get) if pose_counts else None
-        
-        # Tendances de progression
-        recent_improvements = calculate_recent_improvements(history)
+        # Activité des 4 dernières semaines: au plus 28 lignes journalières (voir rollups.py)
+        rows = db.get_daily_rollups(user_id, since=period_starts('week', 4)[-1])
+        weekly_activity = [
+            {'week': week['period'], 'sessions': week['sessions'], 'average_score': week['average_score']}
+            for week in group_periods(rows, 'week', 4)
+        ]
         
         return jsonify({
-            'total_sessions': total_sessions,
-            'average_score': round(average_score, 1),
-            'progress_trend': calculate_progress_trend(history),
-            'level_distribution': level_distribution,
+            'total_sessions': summary['total_sessions'],
+            'average_score': summary['average_score'],
+            'progress_trend': activity['progress_trend'],
+            'level_distribution': stats.get('levels', {}),
             'weekly_activity': weekly_activity,
-            'favorite_pose': favorite_pose,
-            'recent_improvements': recent_improvements,
-            'best_session': get_best_session(history),
-            'current_streak': calculate_current_streak(history)
+            'favorite_pose': summary['most_frequent_pose'],
+            'recent_improvements': activity['recent_improvements'],
+            'best_session': stats.get('best_session'),
+            'current_streak': current_streak(stats)
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/user/activity', methods=['GET'])
+@login_required
+def get_user_activity(user):
+    """
+    Activité par jour, semaine ou mois (period, count) et séries de jours
+    consécutifs, calculées depuis les agrégats journaliers
+    """
+    period = request.args.get('period', 'week')
+    if period not in MAX_PERIODS:
+        return jsonify({'error': f"period doit être parmi: {', '.join(MAX_PERIODS)}"}), 400
+    count = request.args.get('count', str(DEFAULT_PERIODS[period]))
+    if not count.isdigit() or int(count) < 1:
+        return jsonify({'error': 'count doit être un entier positif'}), 400
+    count = min(int(count), MAX_PERIODS[period])
+    
+    now = datetime.utcnow()
+    rows = db.get_daily_rollups(str(user['_id']), since=window_start(period, count, now))
+    return jsonify({
+        'period': period,
+        'series': group_periods(rows, period, count, now),
+        'streak': streaks(rows, now),
+    })
+
 # Routes pour la gestion du profil
 @app.route('/api/user/profile', methods=['PUT'])
 @login_required
@@ -427,147 +722,61 @@ def update_profile(user):
         
         if updates:
             db.update_user_profile(str(user['_id']), updates)
+            principal_cache.invalidate_user(user['_id'])
         
         return jsonify({'message': 'Profile updated successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Fonctions utilitaires pour les statistiques
-def calculate_weekly_activity(history):
-    """Calcule l'activité hebdomadaire des 4 dernières semaines"""
-    weekly_activity = []
-    today = datetime.utcnow()
-    
-    for i in range(4):
-        week_start = today - timedelta(days=(today.weekday() + 7*i))
-        week_end = week_start + timedelta(days=6)
-        
-        week_sessions = [session for session in history 
-                        if week_start <= session.get('date', datetime.min) <= week_end]
-        
-        weekly_activity.append({
-            'week': week_start.strftime('%Y-%m-%d'),
-            'sessions': len(week_sessions),
-            'average_score': sum(session.get('score', 0) for session in week_sessions) / len(week_sessions) if week_sessions else 0
-        })
-    
-    return weekly_activity
-
-def calculate_recent_improvements(history):
-    """Identifie les améliorations récentes"""
-    if len(history) < 2:
-        return []
-    
-    recent_sessions = history[:5]  # 5 dernières sessions
-    improvements = []
-    
-    for i in range(1, len(recent_sessions)):
-        current = recent_sessions[i-1]
-        previous = recent_sessions[i]
-        
-        current_score = current.get('score', 0)
-        previous_score = previous.get('score', 0)
-        
-        if current_score > previous_score + 5:  # Amélioration de plus de 5%
-            improvements.append({
-                'pose': current.get('pose_name'),
-                'improvement': round(current_score - previous_score, 1),
-                'date': current.get('date')
-            })
-    
-    return improvements
-
-def calculate_progress_trend(history):
-    """Calcule la tendance de progression"""
-    if len(history) < 3:
-        return 'stable'
-    
-    recent_scores = [session.get('score', 0) for session in history[:10]]
-    
-    if len(recent_scores) < 2:
-        return 'stable'
-    
-    # Calculer la pente de régression linéaire simple
-    x = list(range(len(recent_scores)))
-    y = recent_scores
-    
-    n = len(x)
-    sum_x = sum(x)
-    sum_y = sum(y)
-    sum_xy = sum(x[i] * y[i] for i in range(n))
-    sum_x2 = sum(x_i * x_i for x_i in x)
-    
-    slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
-    
-    if slope > 0.5:
-        return 'improving'
-    elif slope < -0.5:
-        return 'declining'
-    else:
-        return 'stable'
-
-def get_best_session(history):
-    """Retourne la meilleure session"""
-    if not history:
-        return None
-    
-    best_session = max(history, key=lambda x: x.get('score', 0))
-    return {
-        'pose_name': best_session.get('pose_name'),
-        'score': best_session.get('score', 0),
-        'date': best_session.get('date'),
-        'level': best_session.get('level', 'beginner')
-    }
-
-def calculate_current_streak(history):
-    """Calcule la série actuelle de jours consécutifs avec pratique"""
-    if not history:
-        return 0
-    
-    sorted_history = sorted(history, key=lambda x: x.get('date', datetime.min), reverse=True)
-    
-    streak = 0
-    current_date = datetime.utcnow().date()
-    
-    for session in sorted_history:
-        session_date = session.get('date', datetime.min).date()
-        
-        if session_date == current_date:
-            streak += 1
-            current_date -= timedelta(days=1)
-        else:
-            break
-    
-    return streak
-
 @app.route('/api/user/history', methods=['DELETE'])
 @login_required
 def clear_user_history(user):
     """Supprime tout l'historique de l'utilisateur"""
     try:
-        user_id = str(user['_id'])
-        
-        # Mettre à jour l'utilisateur pour vider l'historique
-        db.users.update_one(
-            # {'_id': ObjectId(user_id)},
-            {'_id': ObjectId(user_id)},  
-            {'$set': {'posture_history': []}}
-        )
+        deleted_count = db.delete_user_history(str(user['_id']))
+        principal_cache.invalidate_user(user['_id'])
         
         return jsonify({
             'message': 'Historique supprimé avec succès',
-            'deleted_count': len(user.get('posture_history', []))
+            'deleted_count': deleted_count
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _measure_startup():
+    """Mesure le démarrage du worker et le compare au budget"""
+    startup_s = time.perf_counter() - STARTUP_BEGIN
+    try:
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss est en octets sous macOS, en Ko sous Linux
+        max_rss_mb = max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+    except ImportError:  # Windows
+        max_rss_mb = None
+    
+    stats = {
+        'startup_ms': round(1000 * startup_s, 1),
+        'budget_ms': round(1000 * STARTUP_BUDGET_S, 1),
+        'within_budget': startup_s <= STARTUP_BUDGET_S,
+        'max_rss_mb': round(max_rss_mb, 1) if max_rss_mb is not None else None,
+    }
+    memory = f", mémoire {stats['max_rss_mb']} Mo" if max_rss_mb is not None else ""
+    if stats['within_budget']:
+        print(f"⚡ Démarrage en {stats['startup_ms']} ms{memory}")
+    else:
+        print(f"⚠️ Démarrage en {stats['startup_ms']} ms{memory} - budget de {stats['budget_ms']} ms dépassé")
+    return stats
+
+startup_stats = _measure_startup()
+
 if __name__ == '__main__':
     print("🚀 Démarrage de l'application Yoga Pose Analyzer...")
     
     # Vérifier l'état du modèle
-    if pose_analyzer and hasattr(pose_analyzer, 'model') and pose_analyzer.model is not None:
+    if pose_analyzer and pose_analyzer.has_model:
         print("🤖 Mode: Machine Learning (modèle chargé)")
     else:
         print("🎭 Mode: Démonstration (modèle non entraîné)")
@@ -28,9 +28,12 @@ class AuthManager:
     
     def verify_token(self, token):
         """Vérifie et décode un JWT token"""
+        return self.decode_token(token)['user_id']
+    
+    def decode_token(self, token):
+        """Vérifie un JWT token et retourne son contenu (user_id, exp, iat)"""
         try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload['user_id']
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
         except jwt.ExpiredSignatureError:
             raise ValueError("Token expiré")
         except jwt.InvalidTokenError:
@@ -56,7 +59,6 @@ class AuthManager:
             'email': email,
             'hashed_password': self.hash_password(password),
             'profile': user_profile,  # ✅ TOUJOURS profile.first_name
-            'posture_history': [],
             'preferences': {
                 'language': 'fr',
                 'notifications': True
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Vérification du pipeline d'agrégation des améliorations et de la tendance
+(activity_stats.py).
+
+Sans base, contrôle activity_facets sur un historique de référence: forme
+du document $facet lue par format_activity et résultat attendu. Avec
+MongoDB, exécute activity_pipeline pour chaque utilisateur et compare sa
+sortie à celle d'activity_facets sur les mêmes analyses (forme $facet puis
+résultat de format_activity).
+
+Usage: python check_activity_stats.py [--user USER_ID] [--limit 100] [--offline]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from activity_stats import (RECENT_SESSIONS, activity_pipeline, activity_facets,
+                            facet_errors, format_activity)
+
+# Historique de référence (ordre chronologique): seule la dernière hausse
+# dépasse IMPROVEMENT_THRESHOLD parmi les IMPROVEMENT_SESSIONS dernières analyses
+REFERENCE_SCORES = [40, 42, 44, 46, 48, 50, 52, 54, 56, 58, 66, 60]
+REFERENCE_START = datetime(2026, 1, 1, 8)
+
+
+def check_reference():
+    """Erreurs d'activity_facets sur l'historique de référence"""
+    analyses = [{'pose_name': 'tree', 'score': score, 'date': REFERENCE_START + timedelta(days=day)}
+                for day, score in enumerate(REFERENCE_SCORES)]
+    facets = activity_facets(analyses)
+    errors = facet_errors(facets)
+
+    expected = {
+        'recent_improvements': [{'pose': 'tree', 'improvement': 8, 'date': REFERENCE_START + timedelta(days=10)}],
+        'progress_trend': 'improving',
+    }
+    activity = format_activity(facets)
+    if activity != expected:
+        errors.append(f"référence: {activity} au lieu de {expected}")
+    return errors
+
+
+def compare_user(db, user_id):
+    """Écarts entre activity_pipeline (MongoDB) et activity_facets pour un utilisateur"""
+    from database import SUMMARY_FIELDS
+    from pymongo import DESCENDING
+
+    aggregated = next(db.analyses.aggregate(activity_pipeline(user_id)), {})
+    recent = db.analyses.find({'user_id': user_id}, SUMMARY_FIELDS).sort('date', DESCENDING).limit(RECENT_SESSIONS)
+    computed = activity_facets(recent)
+
+    errors = [f"pipeline {error}" for error in facet_errors(aggregated)]
+    expected = format_activity(computed)
+    actual = format_activity(aggregated)
+    if actual != expected:
+        errors.append(f"pipeline {actual} au lieu de {expected}")
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Vérification du pipeline des améliorations et de la tendance")
+    parser.add_argument('--user', help="Ne compare que cet utilisateur")
+    parser.add_argument('--limit', type=int, default=100, help="Utilisateurs comparés au plus")
+    parser.add_argument('--offline', action='store_true', help="Contrôle de référence seulement, sans MongoDB")
+    args = parser.parse_args()
+
+    errors = check_reference()
+    failed = bool(errors)
+    for error in errors:
+        print(f"❌ {error}")
+    if not errors:
+        print("✅ activity_facets conforme à la forme $facet et au résultat de référence")
+
+    if not args.offline:
+        from bson import ObjectId
+        from database import db
+
+        if getattr(db, 'demo_mode', False):
+            print("❌ MongoDB indisponible: pipeline non comparé")
+            raise SystemExit(1)
+
+        start = time.perf_counter()
+        user_ids = [ObjectId(args.user)] if args.user else db.analyses.distinct('user_id')[:args.limit]
+        mismatches = 0
+        for user_id in user_ids:
+            user_errors = compare_user(db, user_id)
+            if user_errors:
+                mismatches += 1
+                print(f"❌ {user_id}: " + '; '.join(user_errors))
+        failed = failed or mismatches > 0
+        print(f"{'✅' if not mismatches else '❌'} Pipeline comparé pour {len(user_ids)} utilisateurs, "
+              f"{mismatches} écarts ({time.perf_counter() - start:.1f} s)")
+
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,344 @@
+"""
+Inférence compilée en NumPy pur pour le classifieur de postures.
+
+Le modèle sklearn sélectionné est exporté en tableaux plats (.npz); le
+prédicteur ne dépend que de NumPy et retourne la classe et la probabilité
+en un seul appel, sans la validation ni le double appel predict/predict_proba
+de sklearn. Modèles supportés: forêts et arbres de décision, SVC (tous
+noyaux, probability=True), régression logistique et MLP.
+
+Les noms de postures (classes du LabelEncoder) peuvent être enregistrés
+avec le modèle: l'API charge alors le .npz seul, sans joblib ni sklearn.
+"""
+import numpy as np
+from typing import Tuple
+
+FORMAT_VERSION = 1
+
+# Probabilité minimale utilisée par libsvm pour le couplage des paires
+_SVM_MIN_PROB = 1e-7
+
+
+class CompiledModel:
+    """Modèle compilé: un type ('forest', 'svc', 'linear', 'mlp') et ses tableaux"""
+
+    def __init__(self, kind, arrays):
+        if kind not in _PREDICTORS:
+            raise ValueError(f"Type de modèle compilé inconnu: {kind}")
+        self.kind = kind
+        self.arrays = arrays
+        self.classes = arrays['classes']
+        # Noms des postures, indexés par classe encodée (optionnel)
+        self.labels = arrays.get('labels')
+        self._predict = _PREDICTORS[kind]
+
+    def predict(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Prédit un lot (N, F). Retourne (indices de classe (N,), probabilités (N, C)).
+        Les indices respectent la règle de décision du modèle d'origine
+        (vote un-contre-un pour le SVC, argmax des probabilités sinon).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self._predict(self.arrays, X)
+
+    def predict_one(self, features) -> Tuple[object, float]:
+        """Prédit un échantillon; retourne (classe, probabilité maximale)"""
+        indices, probabilities = self.predict(features)
+        return self.classes[indices[0]], float(probabilities[0].max())
+
+    def save(self, path):
+        np.savez(path, kind=np.array(self.kind), format_version=np.array(FORMAT_VERSION), **self.arrays)
+
+    @classmethod
+    def load(cls, path) -> 'CompiledModel':
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"Format de modèle compilé non supporté: {int(data['format_version'])}")
+            arrays = {key: data[key] for key in data.files if key not in ('kind', 'format_version')}
+            return cls(str(data['kind']), arrays)
+
+
+# ----------------------------------------------------------------------
+# Compilation (modèle sklearn -> tableaux)
+# ----------------------------------------------------------------------
+def compile_model(model) -> CompiledModel:
+    """Compile un modèle sklearn entraîné en CompiledModel"""
+    name = type(model).__name__
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        return CompiledModel('forest', _compile_forest(model, model.estimators_))
+    if name in ('DecisionTreeClassifier', 'ExtraTreeClassifier'):
+        return CompiledModel('forest', _compile_forest(model, [model]))
+    if name == 'SVC':
+        return CompiledModel('svc', _compile_svc(model))
+    if name == 'LogisticRegression':
+        return CompiledModel('linear', _compile_linear(model))
+    if name == 'MLPClassifier':
+        return CompiledModel('mlp', _compile_mlp(model))
+    raise ValueError(f"Modèle non supporté pour la compilation: {name}")
+
+
+def _compile_forest(model, trees):
+    """Concatène les noeuds de tous les arbres dans des tableaux plats"""
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        t = tree.tree_
+        is_leaf = t.children_left == -1
+        roots.append(offset)
+        # Les feuilles pointent sur elles-mêmes: le parcours s'y stabilise
+        own = np.arange(t.node_count) + offset
+        left.append(np.where(is_leaf, own, t.children_left + offset))
+        right.append(np.where(is_leaf, own, t.children_right + offset))
+        feature.append(np.where(is_leaf, 0, t.feature))
+        threshold.append(np.where(is_leaf, np.inf, t.threshold))
+        leaf_value = t.value[:, 0, :]
+        value.append(leaf_value / np.maximum(leaf_value.sum(axis=1, keepdims=True), 1e-300))
+        offset += t.node_count
+
+    return {
+        'classes': model.classes_,
+        'left': np.concatenate(left).astype(np.int64),
+        'right': np.concatenate(right).astype(np.int64),
+        'feature': np.concatenate(feature).astype(np.int64),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'value': np.concatenate(value).astype(np.float64),
+        'roots': np.array(roots, dtype=np.int64),
+        'max_depth': np.array(max(tree.tree_.max_depth for tree in trees)),
+    }
+
+
+def _compile_svc(model):
+    if not getattr(model, 'probability', False):
+        raise ValueError("Le SVC doit être entraîné avec probability=True")
+    if callable(model.kernel) or model.kernel == 'precomputed':
+        raise ValueError(f"Noyau SVC non supporté: {model.kernel}")
+
+    return {
+        'classes': model.classes_,
+        'support_vectors': np.asarray(model.support_vectors_, dtype=np.float64),
+        'n_support': model.n_support_.astype(np.int64),
+        # Coefficients internes (libsvm): dual_coef_ est inversé pour 2 classes
+        'dual_coef': np.asarray(model._dual_coef_, dtype=np.float64),
+        'intercept': np.asarray(model._intercept_, dtype=np.float64),
+        'prob_a': np.asarray(model.probA_, dtype=np.float64),
+        'prob_b': np.asarray(model.probB_, dtype=np.float64),
+        'kernel': np.array(model.kernel),
+        'gamma': np.array(float(model._gamma)),
+        'coef0': np.array(float(model.coef0)),
+        'degree': np.array(int(model.degree)),
+    }
+
+
+def _compile_linear(model):
+    multinomial = len(model.classes_) > 2 and getattr(model, 'multi_class', 'auto') != 'ovr'
+    return {
+        'classes': model.classes_,
+        'coef': np.asarray(model.coef_, dtype=np.float64),
+        'intercept': np.asarray(model.intercept_, dtype=np.float64),
+        'multinomial': np.array(multinomial),
+    }
+
+
+def _compile_mlp(model):
+    arrays = {
+        'classes': model.classes_,
+        'activation': np.array(model.activation),
+        'out_activation': np.array(model.out_activation_),
+        'n_layers': np.array(len(model.coefs_)),
+    }
+    for i, (coef, intercept) in enumerate(zip(model.coefs_, model.intercepts_)):
+        arrays[f'coef_{i}'] = np.asarray(coef, dtype=np.float64)
+        arrays[f'intercept_{i}'] = np.asarray(intercept, dtype=np.float64)
+    return arrays
+
+
+# ----------------------------------------------------------------------
+# Prédicteurs
+# ----------------------------------------------------------------------
+def _predict_forest(a, X):
+    # Les arbres sklearn comparent des features converties en float32
+    X = X.astype(np.float32).astype(np.float64)
+    rows = np.arange(len(X))[:, np.newaxis]
+    nodes = np.broadcast_to(a['roots'], (len(X), len(a['roots']))).copy()
+
+    for _ in range(int(a['max_depth'])):
+        go_left = X[rows, a['feature'][nodes]] <= a['threshold'][nodes]
+        nodes = np.where(go_left, a['left'][nodes], a['right'][nodes])
+
+    probabilities = a['value'][nodes].mean(axis=1)
+    return probabilities.argmax(axis=1), probabilities
+
+
+def _kernel(a, X):
+    kernel = str(a['kernel'])
+    sv = a['support_vectors']
+    gamma, coef0, degree = float(a['gamma']), float(a['coef0']), int(a['degree'])
+
+    if kernel == 'linear':
+        return X @ sv.T
+    if kernel == 'rbf':
+        sq_dist = (X ** 2).sum(axis=1)[:, np.newaxis] + (sv ** 2).sum(axis=1) - 2 * X @ sv.T
+        return np.exp(-gamma * np.maximum(sq_dist, 0))
+    if kernel == 'poly':
+        return (gamma * X @ sv.T + coef0) ** degree
+    if kernel == 'sigmoid':
+        return np.tanh(gamma * X @ sv.T + coef0)
+    raise ValueError(f"Noyau SVC non supporté: {kernel}")
+
+
+def _multiclass_probability(r):
+    """Couplage des probabilités par paires (Wu, Lin et Weng), port de libsvm"""
+    k = r.shape[0]
+    Q = -r.T * r
+    np.fill_diagonal(Q, (r ** 2).sum(axis=0) - np.diag(r) ** 2)
+    p = np.full(k, 1.0 / k)
+    eps = 0.005 / k
+
+    for _ in range(max(100, k)):
+        Qp = Q @ p
+        pQp = p @ Qp
+        if np.max(np.abs(Qp - pQp)) < eps:
+            break
+        for t in range(k):
+            diff = (-Qp[t] + pQp) / Q[t, t]
+            p[t] += diff
+            pQp = (pQp + diff * (diff * Q[t, t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+            Qp = (Qp + diff * Q[t]) / (1 + diff)
+            p /= 1 + diff
+    return p
+
+
+def _predict_svc(a, X):
+    kernel_values = _kernel(a, X)
+    n_support = a['n_support']
+    starts = np.concatenate([[0], np.cumsum(n_support)])
+    dual_coef = a['dual_coef']
+    n_classes = len(n_support)
+
+    # Valeurs de décision un-contre-un, dans l'ordre de libsvm
+    decisions = []
+    for i in range(n_classes):
+        for j in range(i + 1, n_classes):
+            si, sj = slice(starts[i], starts[i + 1]), slice(starts[j], starts[j + 1])
+            decisions.append(kernel_values[:, si] @ dual_coef[j - 1, si]
+                             + kernel_values[:, sj] @ dual_coef[i, sj])
+    decisions = np.stack(decisions, axis=1) + a['intercept']
+
+    # Vote (règle de SVC.predict)
+    votes = np.zeros((len(X), n_classes))
+    pair = 0
+    for i in range(n_classes):
+        for j in range(i + 1, n_classes):
+            positive = decisions[:, pair] > 0
+            votes[:, i] += positive
+            votes[:, j] += ~positive
+            pair += 1
+
+    # Probabilités: sigmoïdes de Platt par paire puis couplage
+    fApB = decisions * a['prob_a'] + a['prob_b']
+    pairwise = np.where(fApB >= 0,
+                        np.exp(-np.abs(fApB)) / (1 + np.exp(-np.abs(fApB))),
+                        1 / (1 + np.exp(-np.abs(fApB))))
+    pairwise = np.clip(pairwise, _SVM_MIN_PROB, 1 - _SVM_MIN_PROB)
+
+    upper = np.triu_indices(n_classes, k=1)
+    probabilities = np.empty((len(X), n_classes))
+    for row in range(len(X)):
+        r = np.zeros((n_classes, n_classes))
+        r[upper] = pairwise[row]
+        r.T[upper] = 1 - pairwise[row]
+        probabilities[row] = _multiclass_probability(r)
+
+    return votes.argmax(axis=1), probabilities
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _logistic(z):
+    return 1 / (1 + np.exp(-z))
+
+
+def _predict_linear(a, X):
+    scores = X @ a['coef'].T + a['intercept']
+    if scores.shape[1] == 1:
+        positive = _logistic(scores[:, 0])
+        probabilities = np.stack([1 - positive, positive], axis=1)
+    elif bool(a['multinomial']):
+        probabilities = _softmax(scores)
+    else:
+        probabilities = _logistic(scores)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+    return probabilities.argmax(axis=1), probabilities
+
+
+_ACTIVATIONS = {
+    'identity': lambda z: z,
+    'relu': lambda z: np.maximum(z, 0),
+    'tanh': np.tanh,
+    'logistic': _logistic,
+}
+
+
+def _predict_mlp(a, X):
+    n_layers = int(a['n_layers'])
+    activation = _ACTIVATIONS[str(a['activation'])]
+    hidden = X
+    for i in range(n_layers):
+        hidden = hidden @ a[f'coef_{i}'] + a[f'intercept_{i}']
+        if i < n_layers - 1:
+            hidden = activation(hidden)
+
+    if str(a['out_activation']) == 'softmax':
+        probabilities = _softmax(hidden)
+    else:
+        positive = _logistic(hidden[:, 0])
+        probabilities = np.stack([1 - positive, positive], axis=1)
+    return probabilities.argmax(axis=1), probabilities
+
+
+_PREDICTORS = {
+    'forest': _predict_forest,
+    'svc': _predict_svc,
+    'linear': _predict_linear,
+    'mlp': _predict_mlp,
+}
+
+
+# ----------------------------------------------------------------------
+# Export avec vérification de parité
+# ----------------------------------------------------------------------
+def export_compiled_model(model, X_test, path, labels=None, atol=1e-6) -> CompiledModel:
+    """
+    Compile le modèle, vérifie la parité avec sklearn sur X_test
+    (mêmes classes prédites, probabilités à atol près) puis l'enregistre,
+    avec les noms de postures labels s'ils sont fournis.
+    Lève ValueError si la parité n'est pas atteinte.
+    """
+    compiled = compile_model(model)
+    if labels is not None:
+        compiled.arrays['labels'] = np.asarray(labels).astype(str)
+        compiled.labels = compiled.arrays['labels']
+    X_test = np.asarray(X_test, dtype=np.float64)
+
+    indices, probabilities = compiled.predict(X_test)
+    expected_classes = model.predict(X_test)
+    expected_probabilities = model.predict_proba(X_test)
+
+    class_mismatches = int(np.sum(compiled.classes[indices] != expected_classes))
+    max_error = float(np.max(np.abs(probabilities - expected_probabilities))) if len(X_test) else 0.0
+    if class_mismatches or max_error > atol:
+        raise ValueError(
+            f"Parité non atteinte: {class_mismatches} classes différentes, "
+            f"écart de probabilité max {max_error:.2e}"
+        )
+
+    compiled.save(path)
+    print(f"Modèle compilé ({compiled.kind}) sauvegardé dans {path} - "
+          f"parité vérifiée sur {len(X_test)} échantillons (écart max {max_error:.2e})")
+    return compiled
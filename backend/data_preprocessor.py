@@ -1,81 +1,142 @@
 import os
-import json
+import time
 import numpy as np
-import pandas as pd
 from pose_estimator import PoseEstimator
-from sklearn.model_selection import train_test_split
+from feature_store import FeatureStore, DATASET_DIR
+from pose_geometry import (
+    ANGLE_POINTS, FEATURE_NAMES,
+    keypoints_to_array, calculate_angles_batch, calculate_distances_batch, extract_features_batch,
+)
 from sklearn.preprocessing import LabelEncoder
 import joblib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Taille maximale (plus grand côté, en pixels) des images décodées pour le dataset
+MAX_IMAGE_SIZE = 1024
+
+# Threads de hachage des images pour le KeypointCache (lecture disque et SHA-256)
+HASH_THREADS = min(32, (os.cpu_count() or 1) + 4)
+
+# PoseEstimator propre à chaque processus worker (voir _init_worker)
+_worker_estimator = None
+
+
+def _init_worker(model_complexity, min_detection_confidence):
+    """Initialise le PoseEstimator du processus worker"""
+    global _worker_estimator
+    _worker_estimator = PoseEstimator(model_complexity, min_detection_confidence)
+
+
+def _estimate_image(estimator, image_path, max_image_size):
+    """
+    Estime les keypoints d'une image.
+    Retourne (tableau (33, 4) ou None, message d'erreur ou None)
+    """
+    try:
+        image = PoseEstimator.load_image(image_path, max_image_size)
+        keypoints = estimator.estimate_keypoints(image)
+        return (keypoints.array if keypoints is not None else None), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _worker_estimate_image(task):
+    image_path, max_image_size = task
+    return _estimate_image(_worker_estimator, image_path, max_image_size)
+
+
+def _hash_file(cache, image_path):
+    """(hash, None), ou (None, message d'erreur) si l'image est illisible"""
+    try:
+        return cache.hash_file(image_path), None
+    except OSError as e:
+        return None, str(e)
+
+
+def _hash_images(cache, image_paths) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Hash du contenu des images, en parallèle (hashlib libère le GIL), dans l'ordre"""
+    with ThreadPoolExecutor(max_workers=HASH_THREADS) as executor:
+        return list(executor.map(lambda image_path: _hash_file(cache, image_path), image_paths))
+
+
+def _report_progress(results, total, steps=20):
+    """Affiche l'avancement pendant le parcours des résultats"""
+    start = time.time()
+    every = max(1, total // steps)
+    
+    for done, result in enumerate(results, 1):
+        if done % every == 0 or done == total:
+            rate = done / max(time.time() - start, 1e-9)
+            print(f"  {done}/{total} images ({100 * done / total:.0f}%) - {rate:.1f} images/s")
+        yield result
+
 
 class DataPreprocessor:
-    def __init__(self):
-        self.pose_estimator = PoseEstimator()
+    def __init__(self, model_complexity=2, min_detection_confidence=0.5):
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self._pose_estimator = None
         self.label_encoder = LabelEncoder()
     
+    @property
+    def pose_estimator(self) -> PoseEstimator:
+        """PoseEstimator créé au premier usage (le graphe MediaPipe est coûteux)"""
+        if self._pose_estimator is None:
+            self._pose_estimator = PoseEstimator(self.model_complexity, self.min_detection_confidence)
+        return self._pose_estimator
+    
+    # ------------------------------------------------------------------
+    # API batch : tableaux (N, 33, 4) -> matrices de features (voir pose_geometry)
+    # ------------------------------------------------------------------
+    keypoints_to_array = staticmethod(keypoints_to_array)
+    calculate_angles_batch = staticmethod(calculate_angles_batch)
+    calculate_distances_batch = staticmethod(calculate_distances_batch)
+    
+    def extract_features_batch(self, keypoints: np.ndarray) -> np.ndarray:
+        """Extrait la matrice de features (N, len(FEATURE_NAMES)) d'un lot de poses"""
+        return extract_features_batch(keypoints)
+    
+    # ------------------------------------------------------------------
+    # API par échantillon (wrappers sur l'API batch)
+    # ------------------------------------------------------------------
     def extract_features_from_keypoints(self, keypoints) -> np.ndarray:
         """
         Extrait les features des keypoints MediaPipe
         """
-        if not keypoints:
+        if keypoints is None or len(keypoints) == 0:
             return None
         
-        features = []
-        
-        # 1. Positions normalisées des points clés (x, y)
-        for kp in keypoints:
-            features.extend([kp['x'], kp['y']])
-        
-        # 2. Angles articulaires importants
-        angles = self.calculate_all_angles(keypoints)
-        features.extend(angles.values())
-        
-        # 3. Distances et ratios
-        distances = self.calculate_distances(keypoints)
-        features.extend(distances.values())
-        
-        return np.array(features)
+        array = self.keypoints_to_array(keypoints)
+        return self.extract_features_batch(array[np.newaxis])[0]
     
     def calculate_all_angles(self, keypoints):
         """Calcule tous les angles articulaires"""
-        angles = {}
-        
-        # Définition des triplets pour calcul d'angles
-        angle_points = [
-            ('left_elbow', [11, 13, 15]),      # Épaule, coude, poignet gauche
-            ('right_elbow', [12, 14, 16]),     # Épaule, coude, poignet droit
-            ('left_knee', [23, 25, 27]),       # Hanche, genou, cheville gauche
-            ('right_knee', [24, 26, 28]),      # Hanche, genou, cheville droit
-            ('left_hip', [11, 23, 25]),        # Épaule, hanche, genou gauche
-            ('right_hip', [12, 24, 26]),       # Épaule, hanche, genou droit
-            ('left_shoulder', [13, 11, 23]),   # Coude, épaule, hanche gauche
-            ('right_shoulder', [14, 12, 24]),  # Coude, épaule, hanche droit
-        ]
-        
-        for angle_name, (a, b, c) in angle_points:
-            if all(idx < len(keypoints) for idx in [a, b, c]):
-                angle = self.calculate_angle(keypoints[a], keypoints[b], keypoints[c])
-                angles[angle_name] = angle
-        
-        return angles
+        array = self.keypoints_to_array(keypoints)
+        values = self.calculate_angles_batch(array[np.newaxis])[0]
+        
+        return {
+            angle_name: float(value)
+            for (angle_name, indices), value in zip(ANGLE_POINTS, values)
+            if all(idx < len(keypoints) for idx in indices)
+        }
     
     def calculate_distances(self, keypoints):
         """Calcule les distances et ratios importants"""
-        distances = {}
+        if len(keypoints) <= 24:
+            return {}
         
-        # Distances entre points symétriques (pour la symétrie)
-        if len(keypoints) > 24:
-            # Épaules
-            shoulder_width = abs(keypoints[11]['x'] - keypoints[12]['x'])
-            distances['shoulder_width'] = shoulder_width
-            
-            # Hanches
-            hip_width = abs(keypoints[23]['x'] - keypoints[24]['x'])
-            distances['hip_width'] = hip_width
-            
-            # Ratio épaule/hanche
-            if hip_width > 0:
-                distances['shoulder_hip_ratio'] = shoulder_width / hip_width
+        array = self.keypoints_to_array(keypoints)
+        shoulder_width, hip_width, ratio = self.calculate_distances_batch(array[np.newaxis])[0]
         
+        distances = {
+            'shoulder_width': float(shoulder_width),
+            'hip_width': float(hip_width),
+        }
+        if hip_width > 0:
+            distances['shoulder_hip_ratio'] = float(ratio)
         return distances
     
     def calculate_angle(self, a, b, c):
@@ -87,54 +148,110 @@ class DataPreprocessor:
         angle = np.arccos(np.clip(cosine_angle, -1.0, 1.0))
         return np.degrees(angle)
     
-    def process_dataset(self, dataset_path):
+    def list_dataset_images(self, dataset_path) -> List[Tuple[str, str]]:
         """
-        Traite tout le dataset et extrait les features
+        Liste les images du dataset sous forme de (chemin, posture),
+        triées pour un ordre de traitement déterministe
         """
-        features_list = []
-        labels_list = []
+        samples = []
         
         # Parcours des dossiers de postures
-        for pose_name in os.listdir(dataset_path):
+        for pose_name in sorted(os.listdir(dataset_path)):
             pose_path = os.path.join(dataset_path, pose_name)
+            if not os.path.isdir(pose_path):
+                continue
             
-            if os.path.isdir(pose_path):
-                print(f"Traitement de la posture: {pose_name}")
-                
-                for image_file in os.listdir(pose_path):
-                    if image_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                        image_path = os.path.join(pose_path, image_file)
-                        
-                        try:
-                            # Estimation de la pose
-                            pose_result = self.pose_estimator.estimate_pose(image_path)
-                            
-                            if pose_result['keypoints']:
-                                # Extraction des features
-                                features = self.extract_features_from_keypoints(pose_result['keypoints'])
-                                
-                                if features is not None:
-                                    features_list.append(features)
-                                    labels_list.append(pose_name)
-                        
-                        except Exception as e:
-                            print(f"Erreur avec {image_path}: {e}")
-        
-        return np.array(features_list), np.array(labels_list)
+            image_files = [
+                f for f in sorted(os.listdir(pose_path))
+                if f.lower().endswith(IMAGE_EXTENSIONS) and '_annotated.' not in f
+            ]
+            print(f"Posture {pose_name}: {len(image_files)} images")
+            samples.extend((os.path.join(pose_path, f), pose_name) for f in image_files)
+        
+        return samples
     
-    def save_dataset(self, features, labels, output_path):
-        """Sauvegarde le dataset traité"""
-        # CRÉATION DU DOSSIER SI IL N'EXISTE PAS
-        os.makedirs(output_path, exist_ok=True)
+    def process_dataset(self, dataset_path, workers=1, chunksize=16, max_image_size=MAX_IMAGE_SIZE, cache=None):
+        """
+        Traite tout le dataset et extrait les features.
+        Avec workers > 1, l'estimation de pose est répartie sur un pool de
+        processus (un PoseEstimator par worker), par paquets de chunksize images.
+        Avec un KeypointCache, seules les images nouvelles ou modifiées sont estimées.
+        Les résultats sont toujours dans l'ordre de list_dataset_images.
+        """
+        samples = self.list_dataset_images(dataset_path)
+        results = [None] * len(samples)
+        
+        # Recherche dans le cache par hash du contenu (hachage sur un pool de
+        # threads; une image illisible est écartée comme une pose non détectée)
+        digests = None
+        cached = 0
+        if cache is not None:
+            digests = _hash_images(cache, [image_path for image_path, _ in samples])
+            for i, (digest, error) in enumerate(digests):
+                if error is not None:
+                    results[i] = (None, error)
+                    print(f"Erreur avec {samples[i][0]}: {error}")
+                    continue
+                found, keypoints = cache.lookup(digest)
+                if found:
+                    results[i] = (keypoints, None)
+                    cached += 1
+        pending = [i for i, result in enumerate(results) if result is None]
+        if cache is not None:
+            print(f"Cache: {cached}/{len(samples)} images déjà traitées")
+        image_paths = [samples[i][0] for i in pending]
         
-        np.save(f'{output_path}/features.npy', features)
-        np.save(f'{output_path}/labels.npy', labels)
+        if workers and workers > 1 and len(pending) > 1:
+            estimated = self._estimate_parallel(image_paths, workers, chunksize, max_image_size)
+        else:
+            estimated = (_estimate_image(self.pose_estimator, image_path, max_image_size)
+                         for image_path in image_paths)
+        
+        for i, (keypoints, error) in zip(pending, _report_progress(estimated, len(pending))):
+            results[i] = (keypoints, error)
+            if error is not None:
+                print(f"Erreur avec {samples[i][0]}: {error}")
+            elif cache is not None:
+                cache.store(digests[i][0], keypoints)
+        
+        keypoints_list = []
+        labels_list = []
+        for (_, pose_name), (keypoints, error) in zip(samples, results):
+            if error is None and keypoints is not None:
+                keypoints_list.append(keypoints)
+                labels_list.append(pose_name)
+        
+        if not keypoints_list:
+            return np.empty((0, len(FEATURE_NAMES))), np.array(labels_list)
+        
+        # Extraction des features en une seule passe vectorisée
+        features = self.extract_features_batch(np.stack(keypoints_list))
+        return features, np.array(labels_list)
+    
+    def _estimate_parallel(self, image_paths, workers, chunksize, max_image_size):
+        """Estime les poses sur un pool de processus, dans l'ordre des entrées"""
+        initargs = (self.model_complexity, self.min_detection_confidence)
+        tasks = ((image_path, max_image_size) for image_path in image_paths)
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            yield from executor.map(_worker_estimate_image, tasks, chunksize=chunksize)
+    
+    def save_dataset(self, features, labels, output_path, split='train'):
+        """
+        Sauvegarde le dataset traité dans le FeatureStore de output_path/dataset.
+        Le split est remplacé; les autres splits sont conservés.
+        """
+        store = FeatureStore(os.path.join(output_path, DATASET_DIR))
+        store.reset(split)
+        store.append(split, features, labels, FEATURE_NAMES)
+        # Un seul fichier par split: load_data le lit en memmap sans copie
+        store.compact(split)
         
-        # Sauvegarde du label encoder
-        encoded_labels = self.label_encoder.fit_transform(labels)
+        # Sauvegarde du label encoder (classes de tous les splits)
+        self.label_encoder.fit(store.classes)
         joblib.dump(self.label_encoder, f'{output_path}/label_encoder.pkl')
         
-        print(f"Dataset sauvegardé avec {len(features)} échantillons")
+        print(f"Dataset '{split}' sauvegardé avec {len(features)} échantillons")
         print(f"Classes: {self.label_encoder.classes_}")
 
 if __name__ == "__main__":
@@ -143,9 +260,9 @@ if __name__ == "__main__":
     # Traitement des données d'entraînement
     print("Traitement du dataset TRAIN...")
     X_train, y_train = preprocessor.process_dataset(r'../data/DATASET/TRAIN')
-    preprocessor.save_dataset(X_train, y_train, '../ml_core')
+    preprocessor.save_dataset(X_train, y_train, '../ml_core', split='train')
     
     # Traitement des données de test
     print("\nTraitement du dataset TEST...")
     X_test, y_test = preprocessor.process_dataset(r'../data/DATASET/TEST')
-    preprocessor.save_dataset(X_test, y_test, '../ml_core')
\ No newline at end of file
+    preprocessor.save_dataset(X_test, y_test, '../ml_core', split='test')
\ No newline at end of file
@@ -1,7 +1,19 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from datetime import datetime
 import os
+import copy
 from bson import ObjectId
+from user_stats import stats_update, followup_updates, build_stats, summarize
+from activity_stats import activity_pipeline, activity_facets, format_activity, RECENT_SESSIONS
+from rollups import rollup_update, build_rollups
+from pagination import after_cursor
+
+# Champs exclus des lectures d'utilisateur: l'historique embarqué des
+# documents pas encore migrés (voir migrate_history.py)
+USER_PROJECTION = {'posture_history': 0}
+
+# Champs d'une analyse utiles aux statistiques
+SUMMARY_FIELDS = {'pose_name': 1, 'score': 1, 'level': 1, 'date': 1}
 
 
 # Classes de démo pour quand MongoDB n'est pas disponible
@@ -14,7 +26,7 @@ class DemoUsers:
         self.data[user_id] = user_data
         return type('obj', (object,), {'inserted_id': user_id})
     
-    def find_one(self, query):
+    def find_one(self, query, projection=None):
         if 'email' in query:
             for user_id, user_data in self.data.items():
                 if user_data.get('email') == query['email']:
@@ -49,13 +61,203 @@ class DemoSessions:
         pass
 
 
+_MISSING = object()
+
+# Opérateurs de comparaison des filtres de démo
+_COMPARISONS = {
+    '$lt': lambda value, operand: value < operand,
+    '$lte': lambda value, operand: value <= operand,
+    '$gt': lambda value, operand: value > operand,
+    '$gte': lambda value, operand: value >= operand,
+    '$in': lambda value, operand: value in operand,
+}
+
+
+def _get_path(document, key):
+    """Valeur d'une clé avec points ('poses.tree.count') ou _MISSING"""
+    for part in key.split('.'):
+        if not isinstance(document, dict) or part not in document:
+            return _MISSING
+        document = document[part]
+    return document
+
+
+def _matches(document, query):
+    """Filtre MongoDB simplifié: égalité, $or et opérateurs de _COMPARISONS"""
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+            continue
+        value = _get_path(document, key)
+        if isinstance(condition, dict) and any(op.startswith('$') for op in condition):
+            if value is _MISSING:
+                return False
+            for op, operand in condition.items():
+                if not _COMPARISONS[op](value, operand):
+                    return False
+        elif condition is None:
+            if value is not _MISSING and value is not None:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _apply_update(document, update):
+    """Opérateurs $set, $inc, $min et $max avec clés à points"""
+    for op, fields in update.items():
+        for key, value in fields.items():
+            *parents, last = key.split('.')
+            target = document
+            for part in parents:
+                target = target.setdefault(part, {})
+            if op == '$set':
+                target[last] = value
+            elif op == '$inc':
+                target[last] = target.get(last, 0) + value
+            elif op == '$min':
+                target[last] = value if target.get(last) is None else min(target[last], value)
+            elif op == '$max':
+                target[last] = value if target.get(last) is None else max(target[last], value)
+
+
+class DemoUserStats:
+    def __init__(self):
+        self.data = {}
+    
+    def find_one(self, query):
+        document = self.data.get(query['_id'])
+        return document if document is not None and _matches(document, query) else None
+    
+    def find_one_and_update(self, query, update, upsert=False):
+        document = self.find_one(query)
+        before = None if document is None else copy.deepcopy(document)
+        if document is None:
+            if not upsert:
+                return None
+            document = self.data[query['_id']] = {'_id': query['_id']}
+        _apply_update(document, update)
+        return before
+    
+    def update_one(self, query, update, upsert=False):
+        document = self.find_one(query)
+        if document is None and upsert and query['_id'] not in self.data:
+            document = self.data[query['_id']] = {'_id': query['_id']}
+        if document is not None:
+            _apply_update(document, update)
+    
+    def replace_one(self, query, document, upsert=False):
+        self.data[query['_id']] = document
+    
+    def delete_one(self, query):
+        self.data.pop(query['_id'], None)
+
+
+class DemoUserImages:
+    def __init__(self):
+        self.data = {}  # (user_id, filename) -> image
+    
+    def update_one(self, query, update, upsert=False):
+        key = (query['user_id'], query['filename'])
+        if key in self.data or not upsert:
+            return type('obj', (object,), {'upserted_id': None})
+        self.data[key] = dict(query, _id=ObjectId(), **update.get('$setOnInsert', {}))
+        return type('obj', (object,), {'upserted_id': self.data[key]['_id']})
+    
+    def delete_many(self, query):
+        keys = [key for key, image in self.data.items() if _matches(image, query)]
+        for key in keys:
+            del self.data[key]
+        return type('obj', (object,), {'deleted_count': len(keys)})
+
+
+class DemoRollups:
+    def __init__(self):
+        self.data = {}  # (user_id, day) -> ligne
+    
+    def update_one(self, query, update, upsert=False):
+        key = (query['user_id'], query['day'])
+        if key not in self.data:
+            if not upsert:
+                return
+            self.data[key] = {'_id': ObjectId(), 'user_id': query['user_id'], 'day': query['day']}
+        _apply_update(self.data[key], update)
+    
+    def insert_many(self, documents):
+        for document in documents:
+            self.data[(document['user_id'], document['day'])] = dict(document, _id=ObjectId())
+    
+    def find(self, query, projection=None):
+        return DemoCursor([copy.deepcopy(row) for row in self.data.values() if _matches(row, query)])
+    
+    def delete_many(self, query):
+        keys = [key for key, row in self.data.items() if _matches(row, query)]
+        for key in keys:
+            del self.data[key]
+        return type('obj', (object,), {'deleted_count': len(keys)})
+
+
+class DemoCursor:
+    def __init__(self, documents):
+        self.documents = documents
+    
+    def sort(self, key, direction=ASCENDING):
+        # Clé unique ou liste [(champ, sens), ...]: tris stables du dernier critère au premier
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, field_direction in reversed(keys):
+            self.documents.sort(key=lambda doc: doc.get(field, datetime.min), reverse=field_direction == DESCENDING)
+        return self
+    
+    def limit(self, count):
+        if count:
+            self.documents = self.documents[:count]
+        return self
+    
+    def __iter__(self):
+        return iter(self.documents)
+
+
+class DemoAnalyses:
+    def __init__(self):
+        self.data = []
+    
+    def insert_one(self, document):
+        document.setdefault('_id', ObjectId())
+        self.data.append(document)
+        return type('obj', (object,), {'inserted_id': document['_id']})
+    
+    def find(self, query, projection=None):
+        documents = [doc for doc in self.data if _matches(doc, query)]
+        if projection:
+            # Projection d'inclusion ({'score': 1}) ou d'exclusion ({'user_id': 0})
+            if any(projection.values()):
+                keep = lambda key: key in projection or key == '_id'
+            else:
+                keep = lambda key: key not in projection
+            documents = [{key: value for key, value in doc.items() if keep(key)} for doc in documents]
+        return DemoCursor(documents)
+    
+    def count_documents(self, query):
+        return sum(1 for doc in self.data if doc.get('user_id') == query.get('user_id'))
+    
+    def delete_many(self, query):
+        count = self.count_documents(query)
+        self.data = [doc for doc in self.data if doc.get('user_id') != query.get('user_id')]
+        return type('obj', (object,), {'deleted_count': count})
+
+
 class MongoDB:
     def __init__(self):
         # Récupération de l'URI depuis les variables d'environnement
         self.connection_string = os.getenv('MONGO_URI', 'mongodb://localhost:27017/yoga_pose_analyzer')
         
         try:
-            self.client = MongoClient(self.connection_string)
+            # Délai court: sans serveur, le passage en mode démo ne bloque pas le démarrage
+            self.client = MongoClient(
+                self.connection_string,
+                serverSelectionTimeoutMS=int(os.getenv('MONGO_TIMEOUT_MS', '2000'))
+            )
             # Test de la connexion
             self.client.admin.command('ping')
             print("✅ Connexion MongoDB réussie")
@@ -63,9 +265,19 @@ class MongoDB:
             self.db = self.client.get_database()
             self.users = self.db['users']
             self.sessions = self.db['sessions']
+            self.analyses = self.db['analyses']
+            self.user_stats = self.db['user_stats']
+            self.daily_rollups = self.db['daily_rollups']
+            self.user_images = self.db['user_images']
             
             # Création des index
             self.users.create_index('email', unique=True)
+            # (user_id, date, _id): historique paginé par clé; par posture: filtre pose sans parcours
+            self.analyses.create_index([('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)])
+            self.analyses.create_index([('user_id', ASCENDING), ('pose_name', ASCENDING),
+                                        ('date', DESCENDING), ('_id', DESCENDING)])
+            self.daily_rollups.create_index([('user_id', ASCENDING), ('day', DESCENDING)], unique=True)
+            self.user_images.create_index([('user_id', ASCENDING), ('filename', ASCENDING)], unique=True)
             self.sessions.create_index('user_id')
             self.sessions.create_index('created_at', expireAfterSeconds=30*24*60*60)  # 30 jours
             
@@ -75,6 +287,10 @@ class MongoDB:
             self.demo_mode = True
             self.users = DemoUsers()
             self.sessions = DemoSessions()
+            self.analyses = DemoAnalyses()
+            self.user_stats = DemoUserStats()
+            self.daily_rollups = DemoRollups()
+            self.user_images = DemoUserImages()
 
             
     
@@ -91,8 +307,8 @@ class MongoDB:
         return self.users.find_one({'email': email})
     
     def find_user_by_id(self, user_id):
-        """Trouve un utilisateur par ID"""
-        return self.users.find_one({'_id': ObjectId(user_id)})
+        """Trouve un utilisateur par ID (sans historique)"""
+        return self.users.find_one({'_id': ObjectId(user_id)}, USER_PROJECTION)
     
     def update_user_profile(self, user_id, updates):
         """Met à jour le profil utilisateur"""
@@ -104,44 +320,104 @@ class MongoDB:
     def add_pose_analysis(self, user_id, analysis_data):
         """Ajoute une analyse de posture à l'historique"""
         analysis_data['date'] = datetime.utcnow()
+        analysis_data['user_id'] = ObjectId(user_id)
         
-        self.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$push': {'posture_history': analysis_data}}
+        self.analyses.insert_one(analysis_data)
+        self._update_stats(analysis_data['user_id'], analysis_data)
+    
+    def _update_stats(self, user_id, analysis_data):
+        """Met à jour les agrégats de l'utilisateur et la ligne du jour (deux écritures dans le cas courant)"""
+        before = self.user_stats.find_one_and_update({'_id': user_id}, stats_update(analysis_data), upsert=True)
+        for query, update in followup_updates(before, analysis_data):
+            self.user_stats.update_one(dict(query, _id=user_id), update)
+        self.daily_rollups.update_one(*rollup_update(analysis_data), upsert=True)
+    
+    def get_stats_aggregates(self, user_id):
+        """Document d'agrégats de l'utilisateur (voir user_stats.py), ou None"""
+        return self.user_stats.find_one({'_id': ObjectId(user_id)})
+    
+    def rebuild_user_stats(self, user_id):
+        """Recalcule les agrégats et les lignes journalières d'un utilisateur depuis ses analyses"""
+        user_id = ObjectId(user_id)
+        analyses = list(self.analyses.find({'user_id': user_id}, SUMMARY_FIELDS).sort('date', ASCENDING))
+        stats = build_stats(analyses)
+        # L'espace utilisé par les images ne se déduit pas des analyses: il est conservé
+        storage = (self.user_stats.find_one({'_id': user_id}) or {}).get('storage')
+        document = dict(stats or {}, _id=user_id)
+        if storage is not None:
+            document['storage'] = storage
+        if len(document) == 1:
+            self.user_stats.delete_one({'_id': user_id})
+        else:
+            self.user_stats.replace_one({'_id': user_id}, document, upsert=True)
+        
+        rollups = build_rollups(user_id, analyses)
+        self.daily_rollups.delete_many({'user_id': user_id})
+        if rollups:
+            self.daily_rollups.insert_many(rollups)
+        return stats
+    
+    def record_user_image(self, user_id, filename, size):
+        """Compte une image dans l'espace utilisé de l'utilisateur, une seule fois par image distincte"""
+        user_id = ObjectId(user_id)
+        result = self.user_images.update_one(
+            {'user_id': user_id, 'filename': filename},
+            {'$setOnInsert': {'size': size, 'created_at': datetime.utcnow()}},
+            upsert=True
         )
+        if result.upserted_id is not None:
+            self.user_stats.update_one({'_id': user_id}, {'$inc': {'storage.images': 1, 'storage.bytes': size}},
+                                       upsert=True)
+    
+    def get_storage_usage(self, user_id):
+        """Nombre d'images distinctes et octets stockés pour un utilisateur"""
+        storage = (self.get_stats_aggregates(user_id) or {}).get('storage', {})
+        return {'images': storage.get('images', 0), 'bytes': storage.get('bytes', 0)}
+    
+    def get_daily_rollups(self, user_id, since):
+        """Lignes journalières d'un utilisateur depuis since (voir rollups.py), la plus récente d'abord"""
+        query = {'user_id': ObjectId(user_id), 'day': {'$gte': since}}
+        return list(self.daily_rollups.find(query, {'_id': 0, 'user_id': 0}).sort('day', DESCENDING))
+    
+    def get_history_page(self, user_id, limit, cursor=None, projection=None, pose=None, since=None, until=None):
+        """
+        Page d'analyses triées par (date, _id) décroissants, après le curseur
+        (voir pagination.py). Lit limit + 1 analyses: la dernière indique
+        s'il reste une page suivante.
+        """
+        query = {'user_id': ObjectId(user_id)}
+        query.update(after_cursor(cursor))
+        if pose:
+            query['pose_name'] = pose
+        if since is not None or until is not None:
+            query['date'] = {}
+            if since is not None:
+                query['date']['$gte'] = since
+            if until is not None:
+                query['date']['$lt'] = until
+        cursor = self.analyses.find(query, projection)
+        return cursor.sort([('date', DESCENDING), ('_id', DESCENDING)]).limit(limit + 1)
+    
+    def get_activity_stats(self, user_id):
+        """Améliorations et tendance récentes (un pipeline d'agrégation)"""
+        user_id = ObjectId(user_id)
+        if getattr(self, 'demo_mode', False):
+            recent = self.analyses.find({'user_id': user_id}, SUMMARY_FIELDS).sort('date', DESCENDING)
+            facets = activity_facets(recent.limit(RECENT_SESSIONS))
+        else:
+            facets = next(self.analyses.aggregate(activity_pipeline(user_id)), {})
+        return format_activity(facets)
+    
+    def delete_user_history(self, user_id):
+        """Supprime toutes les analyses d'un utilisateur; retourne leur nombre"""
+        self.user_stats.delete_one({'_id': ObjectId(user_id)})
+        self.daily_rollups.delete_many({'user_id': ObjectId(user_id)})
+        self.user_images.delete_many({'user_id': ObjectId(user_id)})
+        return self.analyses.delete_many({'user_id': ObjectId(user_id)}).deleted_count
     
     def get_user_stats(self, user_id):
-        """Récupère les statistiques de l'utilisateur"""
-        user = self.find_user_by_id(user_id)
-        if not user or 'posture_history' not in user:
-            return None
-            
-        history = user['posture_history']
-        if not history:
-            return None
-            
-        # Calcul des statistiques
-        total_sessions = len(history)
-        average_score = sum(session.get('score', 0) for session in history) / total_sessions
-        
-        # Posture la plus pratiquée
-        pose_counts = {}
-        for session in history:
-            pose = session.get('pose_name', 'unknown')
-            pose_counts[pose] = pose_counts.get(pose, 0) + 1
-        
-        most_frequent_pose = max(pose_counts, key=pose_counts.get) if pose_counts else None
-        
-        # Meilleur score
-        best_session = max(history, key=lambda x: x.get('score', 0))
-        
-        return {
-            'total_sessions': total_sessions,
-            'average_score': round(average_score, 1),
-            'most_frequent_pose': most_frequent_pose,
-            'best_score': best_session.get('score', 0),
-            'best_pose': best_session.get('pose_name', 'unknown')
-        }
+        """Récupère les statistiques de l'utilisateur (lecture des agrégats)"""
+        return summarize(self.get_stats_aggregates(user_id))
 
     def delete_sessions_by_user(self, user_id):
         """Supprime toutes les sessions d'un utilisateur spécifique"""
@@ -0,0 +1,140 @@
+import time
+import queue
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class PoolTimeout(TimeoutError):
+    """Aucun PoseEstimator disponible dans le délai demandé"""
+
+
+class EstimatorPool:
+    """
+    Pool borné de PoseEstimator réutilisables.
+
+    Un objet MediaPipe Pose ne doit pas être partagé entre threads: chaque
+    requête emprunte une instance avec checkout() et la rend à la sortie du
+    bloc. Les instances sont créées à la demande jusqu'à size, ou à l'avance
+    par warm_async() (une inférence à blanc initialise le graphe). Avec
+    warm_on_first_use, le premier checkout préchauffe les instances restantes
+    en arrière-plan: MediaPipe n'est chargé que si le pool sert. Au-delà,
+    les requêtes attendent au plus timeout secondes puis lèvent PoolTimeout.
+
+    Avec adaptive=True, le pool contient des AdaptivePoseEstimator (complexité
+    choisie à chaque appel, model_complexity étant le palier maximal); leur
+    région d'intérêt est oubliée à chaque checkout, les images étant
+    indépendantes d'une requête à l'autre.
+    """
+
+    def __init__(self, size=2, model_complexity=2, min_detection_confidence=0.5,
+                 factory: Optional[Callable[[], Any]] = None, adaptive=False, warm_on_first_use=False):
+        self.size = size
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.adaptive = adaptive
+        self.warm_on_first_use = warm_on_first_use
+        self._factory = factory or self._create_estimator
+        # LIFO: les instances les plus récemment utilisées restent chaudes
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_s = 0.0
+
+    def _create_estimator(self):
+        # Import au premier usage: MediaPipe n'est chargé que si le pool sert
+        from pose_estimator import PoseEstimator, AdaptivePoseEstimator
+        if self.adaptive:
+            estimator = AdaptivePoseEstimator(max_complexity=self.model_complexity,
+                                              min_detection_confidence=self.min_detection_confidence)
+        else:
+            estimator = PoseEstimator(self.model_complexity, self.min_detection_confidence)
+        estimator.estimate_keypoints(np.zeros((64, 64, 3), dtype=np.uint8))
+        return estimator
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _new_estimator(self):
+        try:
+            return self._factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def warm_async(self, count=None) -> threading.Thread:
+        """Crée count instances (par défaut size) en arrière-plan"""
+        def warm():
+            for _ in range(self.size if count is None else count):
+                if not self._reserve():
+                    return
+                try:
+                    self._idle.put(self._new_estimator())
+                except Exception as e:
+                    print(f"⚠️ Préchauffage du pool de PoseEstimator impossible: {e}")
+                    return
+            print(f"🔥 Pool de PoseEstimator prêt ({self._created} instances)")
+
+        thread = threading.Thread(target=warm, name='estimator-pool-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def _acquire(self, timeout):
+        started = time.perf_counter()
+        try:
+            estimator = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve():
+                estimator = self._new_estimator()
+            else:
+                try:
+                    estimator = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(f"Aucun PoseEstimator disponible après {timeout} s")
+
+        with self._lock:
+            self._checkouts += 1
+            self._wait_s += time.perf_counter() - started
+        return estimator
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Emprunte un PoseEstimator pour la durée du bloc with"""
+        estimator = self._acquire(timeout)
+        if self.warm_on_first_use:
+            self.warm_on_first_use = False
+            self.warm_async()
+        if self.adaptive:
+            estimator.reset()
+        try:
+            yield estimator
+        finally:
+            self._idle.put(estimator)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'available': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(1000 * self._wait_s / self._checkouts, 3) if self._checkouts else 0,
+            }
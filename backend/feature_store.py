@@ -0,0 +1,202 @@
+import os
+import json
+import shutil
+import numpy as np
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Version du format du dossier dataset (manifest + shards)
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+# Nom du dossier du FeatureStore dans le dossier des modèles (ml_core)
+DATASET_DIR = 'dataset'
+
+# Nombre maximal de lignes par shard
+SHARD_ROWS = 50000
+
+
+class FeatureStore:
+    """
+    Dataset de features versionné, stocké en shards .npy append-only.
+
+    Structure:
+        <root>/manifest.json                 schéma, colonnes, splits et shards
+        <root>/<split>/shard-00000.features.npy
+        <root>/<split>/shard-00000.labels.npy
+
+    Les shards sont ouverts avec np.load(mmap_mode='r'): les données ne sont
+    lues depuis le disque qu'à l'accès. load() renvoie toujours le split en
+    un seul fichier memmappé (fusionné par compact si nécessaire).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest = self._read_manifest()
+
+    @staticmethod
+    def exists(root) -> bool:
+        return os.path.exists(os.path.join(root, MANIFEST_FILE))
+
+    # Manifest
+    def _read_manifest(self) -> Dict:
+        path = os.path.join(self.root, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {'format_version': FORMAT_VERSION, 'schema': None, 'splits': {}}
+
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Format de dataset non supporté: {manifest.get('format_version')}")
+        return manifest
+
+    def _write_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, MANIFEST_FILE)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @property
+    def splits(self) -> List[str]:
+        return list(self.manifest['splits'])
+
+    @property
+    def feature_names(self) -> Optional[List[str]]:
+        schema = self.manifest['schema']
+        return schema['feature_names'] if schema else None
+
+    @property
+    def classes(self) -> List[str]:
+        """Classes présentes dans l'ensemble des splits, triées"""
+        classes = set()
+        for split in self.manifest['splits'].values():
+            classes.update(split['classes'])
+        return sorted(classes)
+
+    def num_rows(self, split) -> int:
+        return sum(shard['rows'] for shard in self._split(split)['shards'])
+
+    def _split(self, split) -> Dict:
+        if split not in self.manifest['splits']:
+            raise KeyError(f"Split inconnu: {split} (disponibles: {self.splits})")
+        return self.manifest['splits'][split]
+
+    # Écriture
+    def append(self, split, features: np.ndarray, labels: np.ndarray, feature_names: Optional[List[str]] = None):
+        """Ajoute des lignes à un split, en un ou plusieurs nouveaux shards"""
+        features = np.asarray(features)
+        labels = np.asarray(labels).astype(str)
+        if features.ndim != 2 or len(features) != len(labels):
+            raise ValueError("features doit être de forme (N, F) avec N labels")
+
+        self._check_schema(features, feature_names)
+        entry = self.manifest['splits'].setdefault(split, {'shards': [], 'classes': [], 'next_shard': 0})
+
+        split_dir = os.path.join(self.root, split)
+        os.makedirs(split_dir, exist_ok=True)
+
+        for start in range(0, len(features), SHARD_ROWS):
+            name = self._next_shard_name(entry)
+            rows = features[start:start + SHARD_ROWS]
+            np.save(os.path.join(split_dir, f'{name}.features.npy'), rows)
+            np.save(os.path.join(split_dir, f'{name}.labels.npy'), labels[start:start + SHARD_ROWS])
+            entry['shards'].append({'name': name, 'rows': len(rows)})
+
+        entry['classes'] = sorted(set(entry['classes']) | set(labels.tolist()))
+        entry['updated_at'] = datetime.utcnow().isoformat()
+        self._write_manifest()
+
+    @staticmethod
+    def _next_shard_name(entry) -> str:
+        name = f"shard-{entry['next_shard']:05d}"
+        entry['next_shard'] += 1
+        return name
+
+    def _check_schema(self, features, feature_names):
+        schema = {
+            'dtype': features.dtype.str,
+            'num_features': int(features.shape[1]),
+            'feature_names': list(feature_names) if feature_names is not None else self.feature_names,
+        }
+        current = self.manifest['schema']
+        if current is None:
+            self.manifest['schema'] = schema
+        elif (current['dtype'], current['num_features']) != (schema['dtype'], schema['num_features']):
+            raise ValueError(
+                f"Schéma incompatible: {schema['dtype']}x{schema['num_features']}, "
+                f"attendu {current['dtype']}x{current['num_features']}"
+            )
+        elif current['feature_names'] is None:
+            current['feature_names'] = schema['feature_names']
+        elif schema['feature_names'] != current['feature_names']:
+            # Même nombre de colonnes dans un autre ordre ou d'autres features
+            raise ValueError("Schéma incompatible: noms ou ordre des features différents du dataset")
+
+    def reset(self, split):
+        """Supprime un split et ses shards"""
+        if self.manifest['splits'].pop(split, None) is not None:
+            shutil.rmtree(os.path.join(self.root, split), ignore_errors=True)
+            if not self.manifest['splits']:
+                self.manifest['schema'] = None
+            self._write_manifest()
+
+    def compact(self, split):
+        """
+        Fusionne les shards d'un split en un seul, shard par shard,
+        sans charger l'ensemble du split en mémoire
+        """
+        entry = self._split(split)
+        if len(entry['shards']) <= 1:
+            return
+
+        split_dir = os.path.join(self.root, split)
+        total = self.num_rows(split)
+        shards = list(self.iter_shards(split))
+        label_dtype = max((labels.dtype for _, labels in shards), key=lambda dtype: dtype.itemsize)
+
+        name = self._next_shard_name(entry)
+        features_out = np.lib.format.open_memmap(
+            os.path.join(split_dir, f'{name}.features.npy'), mode='w+',
+            dtype=np.dtype(self.manifest['schema']['dtype']), shape=(total, self.manifest['schema']['num_features'])
+        )
+        labels_out = np.lib.format.open_memmap(
+            os.path.join(split_dir, f'{name}.labels.npy'), mode='w+', dtype=label_dtype, shape=(total,)
+        )
+        offset = 0
+        for features, labels in shards:
+            features_out[offset:offset + len(features)] = features
+            labels_out[offset:offset + len(labels)] = labels
+            offset += len(features)
+        features_out.flush()
+        labels_out.flush()
+        del features_out, labels_out, shards
+
+        old_shards = entry['shards']
+        entry['shards'] = [{'name': name, 'rows': total}]
+        self._write_manifest()
+        for shard in old_shards:
+            for suffix in ('features', 'labels'):
+                os.remove(os.path.join(split_dir, f"{shard['name']}.{suffix}.npy"))
+
+    # Lecture
+    def iter_shards(self, split) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Parcourt les shards d'un split, ouverts en memmap (lecture seule)"""
+        split_dir = os.path.join(self.root, split)
+        for shard in self._split(split)['shards']:
+            features = np.load(os.path.join(split_dir, f"{shard['name']}.features.npy"), mmap_mode='r')
+            labels = np.load(os.path.join(split_dir, f"{shard['name']}.labels.npy"), mmap_mode='r')
+            yield features, labels
+
+    def load(self, split) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Charge un split sous forme de memmaps en lecture seule (aucune copie
+        en mémoire). Un split de plusieurs shards est d'abord fusionné sur
+        disque par compact(), shard par shard: il n'a pas besoin de tenir en RAM.
+        """
+        if not self._split(split)['shards']:
+            num_features = self.manifest['schema']['num_features'] if self.manifest['schema'] else 0
+            return np.empty((0, num_features)), np.array([])
+        self.compact(split)
+        return next(self.iter_shards(split))
@@ -0,0 +1,258 @@
+import os
+import csv
+import json
+import hashlib
+import time
+import warnings
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+# Espaces de recherche par modèle (valeurs discrètes échantillonnées)
+SEARCH_SPACES = {
+    'random_forest': {
+        'n_estimators': [25, 50, 100, 200],
+        'max_depth': [None, 8, 16, 32],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': ['sqrt', 'log2'],
+    },
+    'svm': {
+        'C': [0.1, 1, 10, 100],
+        'gamma': ['scale', 0.01, 0.1],
+        'kernel': ['rbf', 'linear'],
+    },
+    'mlp': {
+        'hidden_layer_sizes': [(32,), (64,), (64, 32), (100, 50)],
+        'alpha': [1e-4, 1e-3, 1e-2],
+        'learning_rate_init': [1e-3, 1e-2],
+    },
+}
+
+TRIAL_COLUMNS = ['trial_id', 'model', 'params', 'rung', 'n_samples',
+                 'cv_score', 'cv_std', 'fit_time_s', 'cpu_time_s']
+
+
+def sample_candidates(search_spaces, n_candidates, random_state=42):
+    """
+    Tire n_candidates configurations distinctes par modèle.
+    Le tirage est déterministe pour un random_state donné (nécessaire à la reprise).
+    """
+    rng = np.random.RandomState(random_state)
+    candidates = []
+
+    for model_name, space in search_spaces.items():
+        grid_size = int(np.prod([len(values) for values in space.values()]))
+        seen = set()
+        while len(seen) < min(n_candidates, grid_size):
+            params = {name: values[rng.randint(len(values))] for name, values in space.items()}
+            key = json.dumps(params, sort_keys=True, default=str)
+            if key not in seen:
+                seen.add(key)
+                candidates.append({'trial_id': f'{model_name}-{len(seen) - 1:03d}',
+                                   'model': model_name, 'params': params})
+    return candidates
+
+
+def data_fingerprint(X, y):
+    """Formes et empreinte SHA-256 des données d'une recherche"""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X).tobytes())
+    digest.update(np.asarray(y).astype(str).tobytes())
+    return {'X_shape': list(np.shape(X)), 'y_shape': list(np.shape(y)), 'sha256': digest.hexdigest()}
+
+
+def _evaluate(model, params, X, y, cv):
+    """Validation croisée d'une configuration; retourne (scores, durée, temps CPU)"""
+    start, cpu_start = time.time(), time.process_time()
+    scores = []
+    for train_idx, test_idx in StratifiedKFold(n_splits=cv).split(X, y):
+        estimator = clone(model).set_params(**params)
+        estimator.fit(X[train_idx], y[train_idx])
+        scores.append(estimator.score(X[test_idx], y[test_idx]))
+    return scores, time.time() - start, time.process_time() - cpu_start
+
+
+class SuccessiveHalvingSearch:
+    """
+    Recherche d'hyperparamètres par successive halving.
+
+    Au rung i, chaque configuration encore en lice est évaluée par validation
+    croisée sur min_samples * eta**i échantillons; seul le meilleur 1/eta de
+    chaque modèle passe au rung suivant. La recherche s'arrête dès que le
+    budget de temps réel ou de temps CPU (somme des workers) est épuisé.
+
+    Après chaque essai, la table des essais est écrite dans checkpoint_path
+    avec la configuration de la recherche (tirage, espaces, modèles, eta, cv,
+    min_samples et empreinte des données). Une recherche relancée avec la même
+    configuration reprend là où elle s'était arrêtée sans réévaluer les essais
+    déjà faits; toute différence invalide le checkpoint, dont les identifiants
+    d'essai ne désigneraient plus les mêmes paramètres. Les budgets sont
+    vérifiés après chaque essai.
+    """
+
+    def __init__(self, models, search_spaces=None, n_candidates=8, eta=3, min_samples=None,
+                 cv=3, time_budget_s=None, cpu_budget_s=None, n_jobs=-1,
+                 checkpoint_path=None, random_state=42):
+        self.models = models
+        self.search_spaces = {name: space for name, space in (search_spaces or SEARCH_SPACES).items()
+                              if name in models}
+        self.n_candidates = n_candidates
+        self.eta = eta
+        self.min_samples = min_samples
+        self.cv = cv
+        self.time_budget_s = time_budget_s
+        self.cpu_budget_s = cpu_budget_s
+        self.n_jobs = n_jobs
+        self.checkpoint_path = checkpoint_path
+        self.random_state = random_state
+        self.trials = []
+        self.candidates = []
+        self.config = None
+
+    def _search_config(self, X, y):
+        """Paramètres dont dépendent les essais d'un checkpoint (forme JSON)"""
+        config = {
+            'random_state': self.random_state,
+            'n_candidates': self.n_candidates,
+            'eta': self.eta,
+            'cv': self.cv,
+            'min_samples': self.min_samples,
+            'models': sorted(self.models),
+            'search_spaces': self.search_spaces,
+            'data': data_fingerprint(X, y),
+        }
+        return json.loads(json.dumps(config, sort_keys=True, default=str))
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        saved = checkpoint.get('config') or {}
+        changed = sorted(key for key in set(saved) | set(self.config) if saved.get(key) != self.config.get(key))
+        if changed:
+            print(f"⚠️ Checkpoint ignoré (configuration différente: {', '.join(changed)})")
+            return {}
+        self.trials = checkpoint['trials']
+        print(f"Reprise de la recherche: {len(self.trials)} essais déjà évalués")
+        return {(trial['trial_id'], trial['rung']): trial for trial in self.trials}
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': self.config, 'trials': self.trials}, f, default=str)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _subsample(self, X, y, n_samples):
+        if n_samples >= len(y):
+            return X, y
+        X_sub, _, y_sub, _ = train_test_split(X, y, train_size=n_samples, stratify=y,
+                                              random_state=self.random_state)
+        return X_sub, y_sub
+
+    def fit(self, X, y):
+        """
+        Lance la recherche. Retourne {modèle: meilleurs paramètres}, la
+        meilleure configuration de chaque famille au rung le plus élevé atteint.
+        """
+        self.config = self._search_config(X, y)
+        self.trials = []
+        done = self._load_checkpoint()
+        candidates = sample_candidates(self.search_spaces, self.n_candidates, self.random_state)
+        self.candidates = list(candidates)
+        start = time.time()
+        cpu_used = sum(trial['cpu_time_s'] for trial in self.trials)
+
+        n_classes = len(np.unique(y))
+        min_samples = self.min_samples or max(self.cv * n_classes * 2, len(y) // self.eta ** 3)
+        rung = 0
+
+        while candidates:
+            n_samples = min(len(y), int(min_samples * self.eta ** rung))
+            X_rung, y_rung = self._subsample(X, y, n_samples)
+
+            todo = [c for c in candidates if (c['trial_id'], rung) not in done]
+            print(f"Rung {rung}: {len(candidates)} configurations sur {len(y_rung)} échantillons "
+                  f"({len(candidates) - len(todo)} déjà évaluées)")
+
+            exhausted = self._budget_exhausted(start, cpu_used)
+            if exhausted:
+                print(f"⏱️ Budget {exhausted} épuisé, arrêt de la recherche")
+                break
+
+            # Résultats consommés au fil de l'eau: checkpoint et budgets après
+            # chaque essai (les essais restants sont annulés à l'arrêt)
+            outputs = Parallel(n_jobs=self.n_jobs, return_as='generator')(
+                delayed(_evaluate)(self.models[c['model']], c['params'], X_rung, y_rung, self.cv)
+                for c in todo
+            ) if todo else iter(())
+            for candidate, (scores, fit_time, cpu_time) in zip(todo, outputs):
+                trial = {
+                    'trial_id': candidate['trial_id'],
+                    'model': candidate['model'],
+                    'params': candidate['params'],
+                    'rung': rung,
+                    'n_samples': len(y_rung),
+                    'cv_score': float(np.mean(scores)),
+                    'cv_std': float(np.std(scores)),
+                    'fit_time_s': fit_time,
+                    'cpu_time_s': cpu_time,
+                }
+                self.trials.append(trial)
+                done[(trial['trial_id'], rung)] = trial
+                cpu_used += cpu_time
+                self._save_checkpoint()
+                exhausted = self._budget_exhausted(start, cpu_used)
+                if exhausted:
+                    # Annule les essais en cours (avertissement de joblib attendu)
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', UserWarning)
+                        outputs.close()
+                    break
+
+            if exhausted:
+                print(f"⏱️ Budget {exhausted} épuisé, arrêt de la recherche")
+                break
+            if n_samples >= len(y) or len(candidates) == len(self.search_spaces):
+                break
+
+            # Seul le meilleur 1/eta de chaque modèle passe au rung suivant
+            survivors = []
+            for model_name in self.search_spaces:
+                group = [c for c in candidates if c['model'] == model_name]
+                group.sort(key=lambda c: done[(c['trial_id'], rung)]['cv_score'], reverse=True)
+                survivors.extend(group[:max(1, len(group) // self.eta)])
+            candidates = survivors
+            rung += 1
+
+        return self.best_params()
+
+    def _budget_exhausted(self, start, cpu_used):
+        """'de temps' ou 'CPU' si un budget est épuisé, sinon None"""
+        if self.time_budget_s is not None and time.time() - start >= self.time_budget_s:
+            return 'de temps'
+        if self.cpu_budget_s is not None and cpu_used >= self.cpu_budget_s:
+            return 'CPU'
+        return None
+
+    def best_params(self):
+        """Meilleure configuration de chaque modèle (rung le plus élevé, puis score)"""
+        best = {}
+        for trial in self.trials:
+            current = best.get(trial['model'])
+            if current is None or (trial['rung'], trial['cv_score']) > (current['rung'], current['cv_score']):
+                best[trial['model']] = trial
+        # Paramètres issus du tirage (les tuples deviennent des listes en JSON)
+        params = {c['trial_id']: c['params'] for c in self.candidates}
+        return {model: params.get(trial['trial_id'], trial['params']) for model, trial in best.items()}
+
+    def save_trials(self, path):
+        """Écrit la table complète des essais en CSV"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=TRIAL_COLUMNS)
+            writer.writeheader()
+            for trial in self.trials:
+                writer.writerow(dict(trial, params=json.dumps(trial['params'], default=str)))
@@ -0,0 +1,147 @@
+import os
+import base64
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Taille des morceaux décodés à la volée (multiple de 4 caractères base64)
+BASE64_CHUNK_CHARS = 64 * 1024
+
+# Extensions reconnues dans l'en-tête d'une data URL (data:image/png;base64,...)
+IMAGE_EXTENSIONS = {'image/jpeg': 'jpg', 'image/jpg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+
+
+def _sniff_extension(head: bytes) -> str:
+    """Extension d'après les premiers octets de l'image (jpg par défaut)"""
+    if head.startswith(b'\x89PNG'):
+        return 'png'
+    if head.startswith(b'GIF8'):
+        return 'gif'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'webp'
+    return 'jpg'
+
+
+def iter_base64_chunks(data: str, chunk_chars=BASE64_CHUNK_CHARS) -> Iterable[bytes]:
+    """
+    Décode une chaîne base64 (ou une data URL) morceau par morceau, sans
+    copie intermédiaire de toute la chaîne. Lève ValueError si elle est invalide.
+    """
+    start = data.find(',', 0, 256) + 1  # 0 si la chaîne n'a pas d'en-tête
+    chunk_chars -= chunk_chars % 4
+    for offset in range(start, len(data), chunk_chars):
+        yield base64.b64decode(data[offset:offset + chunk_chars], validate=True)
+
+
+class ImageStore:
+    """
+    Stockage des images d'analyse, adressé par contenu.
+
+    Le nom du fichier est le SHA-256 de l'image: une image identique (par
+    exemple une requête rejouée) n'est écrite qu'une fois. L'URL est
+    calculée dans la requête et renvoyée aussitôt; l'écriture sur disque est
+    faite par un pool de threads, dans un fichier temporaire renommé à la fin
+    (un fichier servi n'est jamais partiel).
+
+    Chaque image enregistrée est signalée à record_usage(user_id, nom, taille),
+    qui tient l'espace utilisé par utilisateur hors du processus (voir
+    MongoDB.record_user_image): il reste juste après un redémarrage et entre
+    plusieurs workers.
+    """
+
+    def __init__(self, root, url_prefix='/uploads', workers=2,
+                 record_usage: Optional[Callable[[Any, str, int], None]] = None):
+        self.root = root
+        self.url_prefix = url_prefix
+        self.record_usage = record_usage
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-store')
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_written = 0
+        self.errors = 0
+        os.makedirs(root, exist_ok=True)
+
+    def store(self, user_id, data: bytes, extension: Optional[str] = None) -> str:
+        """Enregistre une image (octets) en arrière-plan; retourne son URL"""
+        return self._store(user_id, [data], hashlib.sha256(data), len(data),
+                           extension or _sniff_extension(data[:12]))
+
+    def store_base64(self, user_id, data: str) -> str:
+        """
+        Enregistre une image base64 ou data URL; le décodage et le hachage se
+        font par morceaux. Lève ValueError si le base64 est invalide.
+        """
+        digest = hashlib.sha256()
+        chunks: List[bytes] = []
+        size = 0
+        try:
+            for chunk in iter_base64_chunks(data):
+                digest.update(chunk)
+                chunks.append(chunk)
+                size += len(chunk)
+        except ValueError as e:
+            raise ValueError(f"Image base64 invalide: {e}")
+        if not size:
+            raise ValueError("Image base64 vide")
+
+        header = data[:data.find(',', 0, 256)] if data.startswith('data:') else ''
+        mimetype = header[len('data:'):].split(';')[0]
+        extension = IMAGE_EXTENSIONS.get(mimetype) or _sniff_extension(chunks[0][:12])
+        return self._store(user_id, chunks, digest, size, extension)
+
+    def _store(self, user_id, chunks: List[bytes], digest, size: int, extension: str) -> str:
+        filename = f"{digest.hexdigest()}.{extension}"
+        path = os.path.join(self.root, filename)
+
+        with self._lock:
+            if filename in self._pending or os.path.exists(path):
+                self.deduplicated += 1
+            else:
+                self._pending[filename] = self._executor.submit(self._write, filename, path, chunks)
+
+        if self.record_usage is not None:
+            self.record_usage(user_id, filename, size)
+        return f"{self.url_prefix}/{filename}"
+
+    def _write(self, filename, path, chunks: List[bytes]):
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.writelines(chunks)
+            os.replace(temp_path, path)
+            with self._lock:
+                self.stored += 1
+                self.bytes_written += sum(len(chunk) for chunk in chunks)
+        except OSError as e:
+            print(f"❌ Erreur d'écriture de l'image {filename}: {e}")
+            with self._lock:
+                self.errors += 1
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        finally:
+            with self._lock:
+                self._pending.pop(filename, None)
+
+    def flush(self, timeout=None):
+        """Attend la fin des écritures en cours"""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.result(timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stored': self.stored,
+                'deduplicated': self.deduplicated,
+                'pending': len(self._pending),
+                'bytes_written': self.bytes_written,
+                'errors': self.errors,
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,122 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict
+
+# Bornes des tranches de l'histogramme des tailles de lot
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class InferenceScheduler:
+    """
+    Regroupe les requêtes d'analyse concurrentes en micro-lots.
+
+    Les threads Flask déposent leurs keypoints avec submit() et attendent le
+    résultat. Un thread dédié collecte les requêtes pendant au plus
+    max_wait_ms (ou jusqu'à max_batch_size requêtes), lance une seule analyse
+    vectorisée avec MLAnalyzer.analyze_batch, puis renvoie à chaque requête
+    son propre résultat.
+    """
+
+    def __init__(self, analyzer, max_batch_size=64, max_wait_ms=2.0):
+        self.analyzer = analyzer
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._reset_metrics()
+
+        self._worker = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+        self._worker.start()
+
+    def submit(self, keypoints) -> Future:
+        """Ajoute une pose à analyser; le Future reçoit le résultat de analyze_pose"""
+        future = Future()
+        self._queue.put((keypoints, future, time.perf_counter()))
+        return future
+
+    def analyze(self, keypoints, timeout=None) -> Dict[str, Any]:
+        """Analyse une pose via le prochain micro-lot (bloquant)"""
+        return self.submit(keypoints).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Attend une première requête puis complète le lot jusqu'à la fenêtre ou la taille max"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            keypoints_list = [keypoints for keypoints, _, _ in batch]
+
+            try:
+                results = self.analyzer.analyze_batch(keypoints_list)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_individually(batch)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+
+            self._record(batch, started, time.perf_counter())
+
+    def _run_individually(self, batch):
+        """Lot en échec: chaque pose est ré-analysée seule, seules les requêtes fautives échouent"""
+        with self._lock:
+            self._fallbacks += 1
+        for keypoints, future, _ in batch:
+            try:
+                future.set_result(self.analyzer.analyze_batch([keypoints])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    # Métriques
+    def _reset_metrics(self):
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._wait_s = 0.0
+        self._inference_s = 0.0
+        self._fallbacks = 0
+        self._histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self._histogram['more'] = 0
+
+    def _record(self, batch, started, finished):
+        size = len(batch)
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), 'more')
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._wait_s += sum(started - enqueued for _, _, enqueued in batch)
+            self._inference_s += finished - started
+            self._histogram[bucket] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Profondeur de file, tailles de lot et temps moyens"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0,
+                'max_batch_size': self._max_batch_seen,
+                'batch_size_histogram': {f'<={b}' if b != 'more' else f'>{BATCH_SIZE_BUCKETS[-1]}': count
+                                         for b, count in self._histogram.items()},
+                'avg_wait_ms': round(1000 * self._wait_s / self._items, 3) if self._items else 0,
+                'avg_batch_inference_ms': round(1000 * self._inference_s / self._batches, 3) if self._batches else 0,
+                'batch_fallbacks': self._fallbacks,
+                'config': {'max_batch_size': self.max_batch_size, 'max_wait_ms': self.max_wait_s * 1000}
+            }
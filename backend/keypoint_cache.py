@@ -0,0 +1,96 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+# Version du format du cache (à incrémenter si le contenu stocké change)
+CACHE_VERSION = 1
+
+
+class KeypointCache:
+    """
+    Cache disque des keypoints extraits, adressé par le contenu de l'image.
+    La clé combine le hash SHA-256 des octets de l'image et la configuration
+    de l'estimateur: changer la complexité, la confiance ou la taille maximale
+    des images utilise automatiquement un autre espace du cache.
+    """
+
+    def __init__(self, cache_dir, model_complexity=2, min_detection_confidence=0.5, max_image_size=None):
+        self.config_tag = (
+            f"v{CACHE_VERSION}_c{model_complexity}"
+            f"_d{min_detection_confidence:g}_s{max_image_size or 'full'}"
+        )
+        self.root = cache_dir
+        self.cache_dir = os.path.join(cache_dir, self.config_tag)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @classmethod
+    def for_estimator(cls, cache_dir, estimator, max_image_size=None) -> 'KeypointCache':
+        """Crée un cache pour la configuration d'un PoseEstimator"""
+        return cls(cache_dir, estimator.model_complexity, estimator.min_detection_confidence, max_image_size)
+
+    @staticmethod
+    def hash_file(image_path) -> str:
+        """Hash SHA-256 du contenu d'une image"""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_path(self, digest) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.npy')
+
+    def lookup(self, digest) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Cherche les keypoints d'une image.
+        Retourne (trouvé, tableau (33, 4) ou None si aucune pose n'a été détectée)
+        """
+        try:
+            array = np.load(self._entry_path(digest))
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return False, None
+
+        self.hits += 1
+        return True, (array if array.size else None)
+
+    def store(self, digest, keypoints: Optional[np.ndarray]):
+        """Enregistre les keypoints d'une image (None si aucune pose détectée)"""
+        path = self._entry_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        array = np.empty((0, 4), dtype=np.float32) if keypoints is None else np.asarray(keypoints, dtype=np.float32)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+        self.stores += 1
+
+    def invalidate(self, digest) -> bool:
+        """Supprime l'entrée d'une image pour la configuration courante"""
+        try:
+            os.remove(self._entry_path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self, all_configs=False):
+        """Vide le cache de la configuration courante (ou de toutes les configurations)"""
+        target = self.root if all_configs else self.cache_dir
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def stats(self) -> Dict[str, float]:
+        """Statistiques d'utilisation depuis la création du cache"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,172 @@
+import numpy as np
+from typing import Any, Dict, List, Sequence
+
+# Nombre de landmarks MediaPipe Pose et colonnes par landmark
+NUM_LANDMARKS = 33
+KEYPOINT_FIELDS = ('x', 'y', 'z', 'visibility')
+
+# Noms des landmarks MediaPipe Pose, dans l'ordre des indices
+LANDMARK_NAMES = [
+    'nose',
+    'left_eye_inner', 'left_eye', 'left_eye_outer',
+    'right_eye_inner', 'right_eye', 'right_eye_outer',
+    'left_ear', 'right_ear',
+    'mouth_left', 'mouth_right',
+    'left_shoulder', 'right_shoulder',
+    'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist',
+    'left_pinky', 'right_pinky',
+    'left_index', 'right_index',
+    'left_thumb', 'right_thumb',
+    'left_hip', 'right_hip',
+    'left_knee', 'right_knee',
+    'left_ankle', 'right_ankle',
+    'left_heel', 'right_heel',
+    'left_foot_index', 'right_foot_index',
+]
+LANDMARK_INDEX = {name: idx for idx, name in enumerate(LANDMARK_NAMES)}
+
+# Taille du format binaire compact: 33 * 4 float32
+KEYPOINTS_NBYTES = NUM_LANDMARKS * len(KEYPOINT_FIELDS) * 4
+
+
+class PoseKeypoints:
+    """
+    Keypoints d'une pose stockés dans un tableau contigu (33, 4) float32.
+    Colonnes: x, y, z, visibility. Les accesseurs renvoient des vues (sans copie).
+    """
+    __slots__ = ('array',)
+
+    # Indices nommés (mêmes valeurs que mediapipe.solutions.pose.PoseLandmark)
+    NOSE = 0
+    LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+    LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+    LEFT_WRIST, RIGHT_WRIST = 15, 16
+    LEFT_HIP, RIGHT_HIP = 23, 24
+    LEFT_KNEE, RIGHT_KNEE = 25, 26
+    LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+    LEFT_HEEL, RIGHT_HEEL = 29, 30
+    LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX = 31, 32
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array, dtype=np.float32)
+        if array.shape != (NUM_LANDMARKS, len(KEYPOINT_FIELDS)):
+            raise ValueError(f"Keypoints invalides: forme {array.shape}, attendu ({NUM_LANDMARKS}, 4)")
+        self.array = array
+
+    # Constructeurs
+    @classmethod
+    def from_mediapipe(cls, pose_landmarks) -> 'PoseKeypoints':
+        """Construit les keypoints depuis results.pose_landmarks de MediaPipe"""
+        array = np.array(
+            [(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark],
+            dtype=np.float32
+        )
+        return cls(array)
+
+    @classmethod
+    def from_json(cls, data: Sequence[Any]) -> 'PoseKeypoints':
+        """
+        Construit les keypoints depuis le JSON du frontend: liste de 33 objets
+        {'x', 'y', 'z', 'visibility'} ou liste de 33 tableaux [x, y, z, visibility].
+        """
+        if not isinstance(data, (list, tuple)) or len(data) != NUM_LANDMARKS:
+            raise ValueError(f"Keypoints invalides: {NUM_LANDMARKS} points attendus")
+
+        try:
+            if isinstance(data[0], dict):
+                array = np.array(
+                    [(kp['x'], kp['y'], kp.get('z', 0.0), kp.get('visibility', 0.0)) for kp in data],
+                    dtype=np.float32
+                )
+            else:
+                array = np.array(data, dtype=np.float32)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Keypoints invalides: {e}")
+
+        return cls(array)
+
+    @classmethod
+    def from_flat(cls, values: Sequence[float]) -> 'PoseKeypoints':
+        """
+        Construit les keypoints depuis un tableau plat de 33 * 4 valeurs
+        [x0, y0, z0, v0, x1, ...] (format compact du canal temps réel)
+        """
+        try:
+            array = np.asarray(values, dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Keypoints invalides: {e}")
+        if array.shape != (NUM_LANDMARKS * len(KEYPOINT_FIELDS),):
+            raise ValueError(f"Keypoints invalides: {NUM_LANDMARKS * len(KEYPOINT_FIELDS)} valeurs attendues")
+
+        return cls(array.reshape(NUM_LANDMARKS, len(KEYPOINT_FIELDS)))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'PoseKeypoints':
+        """
+        Construit les keypoints depuis un tampon binaire de 33 * 4 float32
+        little-endian (ligne par ligne: x, y, z, visibility)
+        """
+        if len(data) != KEYPOINTS_NBYTES:
+            raise ValueError(f"Keypoints invalides: {KEYPOINTS_NBYTES} octets attendus, {len(data)} reçus")
+        return cls(np.frombuffer(data, dtype='<f4').reshape(NUM_LANDMARKS, len(KEYPOINT_FIELDS)))
+
+    @classmethod
+    def coerce(cls, keypoints) -> 'PoseKeypoints':
+        """Renvoie des PoseKeypoints depuis une instance, un tableau ou du JSON"""
+        if isinstance(keypoints, cls):
+            return keypoints
+        if isinstance(keypoints, np.ndarray):
+            return cls(keypoints)
+        return cls.from_json(keypoints)
+
+    @staticmethod
+    def stack(keypoints_list: Sequence['PoseKeypoints']) -> np.ndarray:
+        """Empile plusieurs poses en un tableau batch (N, 33, 4)"""
+        if not keypoints_list:
+            return np.empty((0, NUM_LANDMARKS, len(KEYPOINT_FIELDS)), dtype=np.float32)
+        return np.stack([kp.array for kp in keypoints_list])
+
+    # Vues sur les colonnes
+    @property
+    def x(self) -> np.ndarray:
+        return self.array[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.array[:, 1]
+
+    @property
+    def z(self) -> np.ndarray:
+        return self.array[:, 2]
+
+    @property
+    def visibility(self) -> np.ndarray:
+        return self.array[:, 3]
+
+    @property
+    def xy(self) -> np.ndarray:
+        return self.array[:, :2]
+
+    def landmark(self, key) -> np.ndarray:
+        """Vue (4,) sur un landmark, par indice ou par nom ('left_hip')"""
+        if isinstance(key, str):
+            key = LANDMARK_INDEX[key.lower()]
+        return self.array[key]
+
+    __getitem__ = landmark
+
+    def __len__(self) -> int:
+        return NUM_LANDMARKS
+
+    # Sérialisation
+    def to_list(self) -> List[Dict[str, float]]:
+        """Format JSON historique: liste de dicts x/y/z/visibility"""
+        return [dict(zip(KEYPOINT_FIELDS, row)) for row in self.array.tolist()]
+
+    def to_bytes(self) -> bytes:
+        """Format binaire compact: 33 * 4 float32 little-endian"""
+        return self.array.astype('<f4', copy=False).tobytes()
+
+    def __repr__(self) -> str:
+        return f"PoseKeypoints(shape={self.array.shape})"
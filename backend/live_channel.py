@@ -0,0 +1,142 @@
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from keypoints import PoseKeypoints
+from pose_stream import parse_timestamp
+
+# Délai pour recevoir le message d'authentification d'une connexion
+LIVE_AUTH_TIMEOUT_S = 10
+
+
+def parse_frame(message) -> Tuple[PoseKeypoints, Optional[float]]:
+    """
+    Décode une frame compacte {"k": [33 * 4 valeurs], "t": secondes}.
+    Lève ValueError si la frame est invalide.
+    """
+    try:
+        data = json.loads(message)
+        return PoseKeypoints.from_flat(data['k']), parse_timestamp(data.get('t'))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Frame invalide: {e}")
+
+
+def _round_values(values: Dict[str, float], digits=1) -> Dict[str, float]:
+    return {name: round(float(value), digits) for name, value in values.items()}
+
+
+class LiveChannel:
+    """
+    Canal temps réel d'une connexion, indépendant du transport (WebSocket).
+
+    Le thread de réception dépose chaque frame avec push() dans une boîte aux
+    lettres d'une seule place; le thread d'analyse prend toujours la frame la
+    plus récente. Une frame arrivée pendant l'analyse remplace la précédente
+    non traitée, qui est comptée dans dropped: un client plus rapide que
+    l'analyseur n'accumule pas de retard.
+
+    Chaque résultat est un message compact (scores arrondis, indicateurs
+    temporels); le feedback n'est renvoyé que lorsqu'il change.
+    """
+
+    def __init__(self, stream, user_id, session_id, send: Callable[[str], Any]):
+        self.stream = stream
+        self.user_id = user_id
+        self.session_id = session_id
+        self._send = send
+        self._send_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self._last_feedback = None
+
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+
+        self._worker = threading.Thread(target=self._run, name=f'live-{session_id}', daemon=True)
+
+    def start(self):
+        self._worker.start()
+
+    def push(self, keypoints: PoseKeypoints, timestamp: Optional[float] = None):
+        """Dépose une frame; une frame en attente non analysée est abandonnée"""
+        with self._condition:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (keypoints, timestamp)
+            self.received += 1
+            self._condition.notify()
+
+    def close(self, timeout=1.0):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._worker.is_alive():
+            self._worker.join(timeout)
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        """Envoie un message JSON; retourne False si la connexion est fermée"""
+        try:
+            with self._send_lock:
+                self._send(json.dumps(message, default=str))
+            return True
+        except Exception:
+            return False
+
+    def _next_frame(self):
+        with self._condition:
+            while self._pending is None and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            frame, self._pending = self._pending, None
+            return frame
+
+    def _run(self):
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return
+            try:
+                result = self.stream.process(self.user_id, self.session_id, [frame])
+                message = self._compact(result)
+            except Exception as e:
+                message = {'type': 'error', 'error': str(e)}
+            self.processed += 1
+            if not self.send(message):
+                return
+
+    def _compact(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        analysis = result['analysis']
+        temporal = result['temporal']
+
+        message = {
+            'type': 'score',
+            'seq': self.processed,
+            'pose': analysis.get('pose_name'),
+            'confidence': round(float(analysis.get('confidence', 0)), 3),
+            'score': round(float(analysis.get('score', 0)), 1),
+            'level': analysis.get('level'),
+            'metrics': _round_values(analysis.get('quality_metrics', {})),
+            'temporal': {
+                'pose': temporal.get('pose_name'),
+                'hold_s': round(temporal.get('hold_duration_s', 0.0), 2),
+                'stability': round(temporal.get('prediction_stability', 0.0), 3),
+                'sway': round(temporal.get('sway_variance', 0.0), 6),
+                'jitter': round(temporal.get('jitter', 0.0), 5),
+            },
+            'dropped': self.dropped,
+        }
+
+        # Feedback incrémental: seulement lorsqu'il change
+        feedback = {
+            'priority': analysis.get('priority_feedback', []),
+            'improvements': analysis.get('improvements', []),
+        }
+        if feedback != self._last_feedback:
+            message['feedback'] = feedback
+            self._last_feedback = feedback
+        return message
+
+    def stats(self) -> Dict[str, int]:
+        return {'received': self.received, 'processed': self.processed, 'dropped': self.dropped}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Migration de l'historique embarqué (users.posture_history) vers la
+collection analyses.
+
+Les utilisateurs sont lus en flux (curseur, un historique à la fois) et
+les analyses écrites par lots avec bulk_write. Chaque analyse migrée reçoit
+un _id déterministe (date, utilisateur, rang): relancer la migration après
+une interruption remplace les documents au lieu de les dupliquer.
+L'historique embarqué d'un utilisateur n'est retiré qu'après l'écriture de
+toutes ses analyses. Les statistiques se reconstruisent ensuite avec
+rebuild_stats.py.
+
+Usage: python migrate_history.py [--batch-size 1000] [--dry-run] [--keep-embedded]
+"""
+import argparse
+import calendar
+import hashlib
+import time
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+from database import db
+
+
+def legacy_analysis_id(user_id, index, date) -> ObjectId:
+    """
+    _id d'une analyse migrée: horodatage de l'analyse (4 octets, comme un
+    ObjectId généré à l'insertion), empreinte de l'utilisateur (5 octets) et
+    rang dans l'historique embarqué (3 octets)
+    """
+    # Dates naïves en UTC (datetime.utcnow)
+    timestamp = calendar.timegm(date.utctimetuple()) if isinstance(date, datetime) else 0
+    user_hash = hashlib.sha1(str(user_id).encode()).digest()[:5]
+    return ObjectId(timestamp.to_bytes(4, 'big') + user_hash + index.to_bytes(3, 'big'))
+
+
+def migrate(batch_size=1000, dry_run=False, keep_embedded=False):
+    query = {'posture_history.0': {'$exists': True}}
+    users = db.users.find(query, {'posture_history': 1}, batch_size=10)
+
+    stats = {'users': 0, 'analyses': 0, 'batches': 0}
+    operations = []
+    migrated_users = []
+
+    def flush():
+        if operations and not dry_run:
+            db.analyses.bulk_write(operations, ordered=False)
+            stats['batches'] += 1
+        # Tous les lots des utilisateurs en attente sont écrits (y compris
+        # quand leurs dernières analyses ont rempli un lot précédent)
+        if migrated_users and not dry_run and not keep_embedded:
+            db.users.bulk_write([
+                UpdateOne({'_id': user_id}, {'$unset': {'posture_history': ''}})
+                for user_id in migrated_users
+            ], ordered=False)
+        operations.clear()
+        migrated_users.clear()
+
+    for user in users:
+        for index, analysis in enumerate(user['posture_history']):
+            document = dict(analysis, user_id=user['_id'])
+            document['_id'] = legacy_analysis_id(user['_id'], index, document.get('date'))
+            operations.append(ReplaceOne({'_id': document['_id']}, document, upsert=True))
+            if len(operations) >= batch_size:
+                flush()
+        migrated_users.append(user['_id'])
+        stats['users'] += 1
+        stats['analyses'] += len(user['posture_history'])
+        if stats['users'] % 100 == 0:
+            print(f"   {stats['users']} utilisateurs, {stats['analyses']} analyses")
+    flush()
+
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migration de posture_history vers la collection analyses")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Analyses par appel à bulk_write")
+    parser.add_argument('--dry-run', action='store_true', help="Compte les analyses sans rien écrire")
+    parser.add_argument('--keep-embedded', action='store_true',
+                        help="Conserve posture_history dans les documents utilisateur")
+    args = parser.parse_args()
+
+    if getattr(db, 'demo_mode', False):
+        print("❌ MongoDB indisponible: rien à migrer")
+        raise SystemExit(1)
+
+    start = time.perf_counter()
+    stats = migrate(args.batch_size, args.dry_run, args.keep_embedded)
+    action = "à migrer" if args.dry_run else "migrées"
+    print(f"✅ {stats['analyses']} analyses {action} pour {stats['users']} utilisateurs "
+          f"({stats['batches']} lots, {time.perf_counter() - start:.1f} s)")
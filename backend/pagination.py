@@ -0,0 +1,89 @@
+"""
+Pagination par clé (keyset) de l'historique des analyses.
+
+Les analyses sont triées par (date, _id) décroissants. Le curseur d'une page
+encode la clé de sa dernière analyse: la page suivante reprend strictement
+après elle via l'index (user_id, date, _id), sans skip. Le coût d'une page
+ne dépend donc pas de la taille de l'historique.
+"""
+import base64
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Taille de page par défaut et maximale
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Champs toujours renvoyés (clé du curseur) et champs jamais renvoyés
+KEY_FIELDS = ('_id', 'date')
+HIDDEN_FIELDS = ('user_id',)
+
+_FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def encode_cursor(analysis: Dict[str, Any]) -> str:
+    """Curseur opaque pointant après cette analyse"""
+    key = f"{analysis['date'].isoformat()}|{analysis['_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Clé (date, _id) d'un curseur; ValueError s'il est invalide"""
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, analysis_id = key.split('|')
+        return datetime.fromisoformat(date), ObjectId(analysis_id)
+    except (ValueError, TypeError, InvalidId):
+        raise ValueError("Curseur invalide")
+
+
+def after_cursor(cursor: Optional[str]) -> Dict[str, Any]:
+    """Filtre des analyses qui suivent le curseur dans l'ordre (date, _id) décroissant"""
+    if not cursor:
+        return {}
+    date, analysis_id = decode_cursor(cursor)
+    return {'$or': [{'date': {'$lt': date}}, {'date': date, '_id': {'$lt': analysis_id}}]}
+
+
+def parse_page_size(value: Optional[str]) -> int:
+    """Paramètre limit borné à MAX_PAGE_SIZE; ValueError s'il est invalide"""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError("limit doit être un entier positif")
+    size = int(value)
+    return min(size, MAX_PAGE_SIZE)
+
+
+def parse_fields(value: Optional[str]) -> Optional[Dict[str, int]]:
+    """
+    Projection d'inclusion depuis 'pose_name,score,...' (None: tous les champs
+    sauf HIDDEN_FIELDS); ValueError sur un nom de champ invalide
+    """
+    if not value:
+        return {field: 0 for field in HIDDEN_FIELDS}
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    for field in fields:
+        if not _FIELD_NAME.match(field) or field in HIDDEN_FIELDS:
+            raise ValueError(f"Champ invalide: {field}")
+    return {field: 1 for field in KEY_FIELDS + tuple(fields)}
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """
+    Date ISO 8601 ('2026-10-01', '2026-10-01T08:00:00' ou avec décalage
+    '+02:00') ramenée en UTC naïf comme les dates stockées; ValueError si invalide
+    """
+    if not value:
+        return None
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Date invalide: {value}")
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
@@ -1,53 +1,109 @@
+import os
 import numpy as np
-import joblib
-from typing import List, Dict, Any, Tuple
-from data_preprocessor import DataPreprocessor
+from typing import List, Dict, Any, Sequence, Tuple
+from keypoints import PoseKeypoints
+from pose_features import PoseFeatures
+from compiled_model import CompiledModel
+from pose_rules import scoring_rules
 
 class MLAnalyzer:
     def __init__(self, model_path='../ml_core'):
-        self.preprocessor = DataPreprocessor()
+        self.model = None
+        self.label_encoder = None
+        self.class_names = None
+        
+        # Prédicteur NumPy compilé (voir compiled_model.py), s'il a été exporté
+        self.compiled_model = None
+        compiled_path = f'{model_path}/pose_classifier.npz'
+        if os.path.exists(compiled_path):
+            try:
+                self.compiled_model = CompiledModel.load(compiled_path)
+            except ValueError as e:
+                print(f"⚠️ Prédicteur compilé ignoré: {e}")
+        
+        if self.compiled_model is not None and self.compiled_model.labels is not None:
+            # Le .npz contient les noms de postures: ni joblib ni sklearn ne sont chargés
+            self.class_names = self.compiled_model.labels
+            print(f"Prédicteur compilé chargé ({self.compiled_model.kind})")
+            return
         
         # Chargement du modèle entraîné
         try:
+            import joblib
             self.model = joblib.load(f'{model_path}/pose_classifier.pkl')
             self.label_encoder = joblib.load(f'{model_path}/label_encoder.pkl')
+            self.class_names = self.label_encoder.classes_
             print("Modèle ML chargé avec succès")
         except FileNotFoundError:
             print("Modèle non trouvé. Utilisation du mode démo.")
             self.model = None
             self.label_encoder = None
+            self.compiled_model = None
+        
+        if self.compiled_model is not None:
+            print(f"Prédicteur compilé chargé ({self.compiled_model.kind})")
+    
+    @property
+    def has_model(self) -> bool:
+        """Vrai si un modèle entraîné (compilé ou sklearn) est chargé"""
+        return self.class_names is not None
     
-    def analyze_pose(self, keypoints: List[Dict]) -> Dict[str, Any]:
+    def analyze_pose(self, keypoints: PoseKeypoints) -> Dict[str, Any]:
         """
         Analyse la pose avec le modèle ML et retourne des indicateurs détaillés
         """
-        if not keypoints:
+        if keypoints is None or len(keypoints) == 0:
             return {'error': 'No keypoints detected'}
         
-        # Extraction des angles
-        angles = self.preprocessor.calculate_all_angles(keypoints)
-        
-        if self.model is None:
-            return self._demo_analysis(keypoints, angles)
+        return self.analyze_batch([keypoints])[0]
+    
+    def analyze_batch(self, keypoints_list: Sequence[PoseKeypoints]) -> List[Dict[str, Any]]:
+        """
+        Analyse un lot de poses: extraction des features et prédiction du
+        modèle en un seul appel vectorisé, puis indicateurs par pose
+        """
+        # Géométrie calculée une seule fois pour toute l'analyse
+        return self.analyze_features(PoseFeatures.batch(keypoints_list))
+    
+    def analyze_features(self, features_list: Sequence[PoseFeatures]) -> List[Dict[str, Any]]:
+        """Analyse un lot de poses dont la géométrie (PoseFeatures) est déjà calculée"""
+        if not self.has_model:
+            return [self._demo_analysis(f.keypoints, f.angles) for f in features_list]
         
         try:
-            # Extraction des features et prédiction
-            features = self.preprocessor.extract_features_from_keypoints(keypoints)
-            features = features.reshape(1, -1)
-            prediction = self.model.predict(features)[0]
-            probability = np.max(self.model.predict_proba(features))
-            
-            pose_name = self.label_encoder.inverse_transform([prediction])[0]
-            
-            # Calcul des indicateurs de qualité
-            quality_metrics = self._calculate_quality_metrics(pose_name, keypoints, angles)
-            
-            # Génération du feedback détaillé
-            detailed_feedback = self._generate_detailed_feedback(pose_name, quality_metrics, angles)
+            # Prédiction à partir des vecteurs de features
+            predictions, probabilities = self._predict_batch(np.stack([f.vector for f in features_list]))
+            pose_names = self.class_names[predictions]
             
+            # Indicateurs de qualité du lot, en une passe sur les règles compilées
+            quality_metrics_list = scoring_rules.quality_metrics(
+                pose_names,
+                np.stack([f.angle_values for f in features_list]),
+                np.array([f.hip_height_difference for f in features_list])
+            )
+        except Exception as e:
+            print(f"❌ Erreur lors de la prédiction: {e}")
+            return [self._demo_analysis(f.keypoints, f.angles) for f in features_list]
+        
+        return [
+            self._analyze_prediction(features, pose_name, probability, quality_metrics)
+            for features, pose_name, probability, quality_metrics
+            in zip(features_list, pose_names, probabilities, quality_metrics_list)
+        ]
+    
+    def _analyze_prediction(self, features: PoseFeatures, pose_name: str, probability: float,
+                            quality_metrics: Dict[str, float]) -> Dict[str, Any]:
+        """Construit le résultat d'analyse d'une pose à partir de sa prédiction et de ses indicateurs"""
+        keypoints = features.keypoints
+        angles = features.angles
+        
+        try:
             # Calcul du score global
             global_score = self._calculate_global_score(quality_metrics)
             
+            # Génération du feedback détaillé
+            detailed_feedback = self._generate_detailed_feedback(pose_name, quality_metrics, features, global_score)
+            
             # Recommandation d'exercice
             exercise_recommendation = self._recommend_exercise(pose_name, quality_metrics)
             
@@ -63,7 +119,7 @@ class MLAnalyzer:
                 'improvements': detailed_feedback['improvements'],
                 'priority_feedback': detailed_feedback['priority_feedback'],
                 'exercise_recommendation': exercise_recommendation,
-                'keypoints': keypoints,
+                'keypoints': keypoints.to_list(),
                 'model_type': 'machine_learning'
             }
             
@@ -71,125 +127,15 @@ class MLAnalyzer:
             print(f"❌ Erreur lors de la prédiction: {e}")
             return self._demo_analysis(keypoints, angles)
     
-    def _calculate_quality_metrics(self, pose_name: str, keypoints: List[Dict], angles: Dict[str, float]) -> Dict[str, float]:
-        """Calcule les indicateurs de qualité de la posture"""
-        metrics = {}
-        
-        # 1. Indicateur d'alignement (0-100)
-        metrics['alignment'] = self._calculate_alignment_score(pose_name, keypoints, angles)
-        
-        # 2. Indicateur de stabilité (0-100)
-        metrics['stability'] = self._calculate_stability_score(pose_name, keypoints)
-        
-        # 3. Indicateur de symétrie (0-100)
-        metrics['symmetry'] = self._calculate_symmetry_score(pose_name, keypoints, angles)
-        
-        # 4. Indicateur d'amplitude (0-100)
-        metrics['range_of_motion'] = self._calculate_range_of_motion_score(pose_name, angles)
-        
-        # 5. Indicateur technique (0-100)
-        metrics['technique'] = self._calculate_technique_score(pose_name, angles)
-        
-        return metrics
-    
-    def _calculate_alignment_score(self, pose_name: str, keypoints: List[Dict], angles: Dict[str, float]) -> float:
-        """Calcule le score d'alignement basé sur la posture"""
-        alignment_score = 50.0  # Score de base
-        
-        # Logique spécifique par posture
-        if pose_name == 'downdog':
-            # Vérifier l'alignement épaules-mains-hanches
-            if 'left_shoulder' in angles and 'right_shoulder' in angles:
-                shoulder_avg = (angles['left_shoulder'] + angles['right_shoulder']) / 2
-                if 70 <= shoulder_avg <= 100:
-                    alignment_score += 10
-                elif shoulder_avg < 70:
-                    alignment_score -= 15
-        
-        elif pose_name == 'warrior2':
-            # Vérifier l'alignement genou-cheville
-            if 'left_knee' in angles and 'right_knee' in angles:
-                knee_angles = [angles['left_knee'], angles['right_knee']]
-                optimal_knee = 90
-                for angle in knee_angles:
-                    if 80 <= angle <= 100:
-                        alignment_score += 5
-        
-        return max(0, min(100, alignment_score))
-    
-    def _calculate_stability_score(self, pose_name: str, keypoints: List[Dict]) -> float:
-        """Calcule le score de stabilité"""
-        stability_score = 50.0
-        
-        # Analyser la répartition du poids (simplifié)
-        if len(keypoints) > 25:
-            left_hip = keypoints[23]
-            right_hip = keypoints[24]
-            
-            # Calculer la différence de hauteur entre les hanches
-            hip_height_diff = abs(left_hip['y'] - right_hip['y'])
-            if hip_height_diff < 0.05:  # Seuil arbitraire
-                stability_score += 15
-            elif hip_height_diff > 0.1:
-                stability_score -= 20
-        
-        return max(0, min(100, stability_score))
-    
-    def _calculate_symmetry_score(self, pose_name: str, keypoints: List[Dict], angles: Dict[str, float]) -> float:
-        """Calcule le score de symétrie"""
-        symmetry_score = 50.0
-        
-        # Comparer les angles gauche/droite
-        symmetric_pairs = [
-            ('left_elbow', 'right_elbow'),
-            ('left_knee', 'right_knee'),
-            ('left_shoulder', 'right_shoulder')
-        ]
-        
-        for left, right in symmetric_pairs:
-            if left in angles and right in angles:
-                diff = abs(angles[left] - angles[right])
-                if diff <= 10:  # Différence acceptable
-                    symmetry_score += 3
-                elif diff > 25:  # Grande asymétrie
-                    symmetry_score -= 10
-        
-        return max(0, min(100, symmetry_score))
-    
-    def _calculate_range_of_motion_score(self, pose_name: str, angles: Dict[str, float]) -> float:
-        """Calcule le score d'amplitude articulaire"""
-        rom_score = 50.0
-        
-        # Valeurs cibles par posture
-        target_ranges = {
-            'downdog': {'left_shoulder': 90, 'right_shoulder': 90},
-            'warrior2': {'left_knee': 90, 'right_knee': 90},
-            'tree': {'left_hip': 45, 'right_hip': 45},
-            'plank': {'left_hip': 180, 'right_hip': 180, 'left_knee': 180, 'right_knee': 180},
-            'godess': {'left_knee': 90, 'right_knee': 90} # Genoux fléchis à 90°
-        }
-        
-        if pose_name in target_ranges:
-            for angle_name, target in target_ranges[pose_name].items():
-                if angle_name in angles:
-                    current_angle = angles[angle_name]
-                    ratio = min(current_angle / target, 1.0) if target > 0 else 1.0
-                    rom_score += ratio * 10
-        
-        return max(0, min(100, rom_score))
-    
-    def _calculate_technique_score(self, pose_name: str, angles: Dict[str, float]) -> float:
-        """Calcule le score technique global"""
-        # Basé sur la cohérence des angles avec la posture idéale
-        technique_score = 80.0
-        
-        # Logique simplifiée pour différentes postures
-        if pose_name == 'plank':
-            if 'left_shoulder' in angles:
-                if angles['left_shoulder'] > 160:  # Bras presque droits
-                    technique_score += 10
-        
-        return max(0, min(100, technique_score))
+    def _predict_batch(self, feature_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Retourne (classes encodées (N,), probabilités max (N,)) pour une matrice de features"""
+        if self.compiled_model is not None:
+            indices, probabilities = self.compiled_model.predict(feature_matrix)
+            return self.compiled_model.classes[indices], probabilities.max(axis=1)
+        
+        predictions = self.model.predict(feature_matrix)
+        probabilities = np.max(self.model.predict_proba(feature_matrix), axis=1)
+        return predictions, probabilities
     
     def _calculate_global_score(self, quality_metrics: Dict[str, float]) -> float:
         """Calcule le score global pondéré"""
@@ -226,7 +172,7 @@ class MLAnalyzer:
         else:
             return "Débutant"        
     
-    def _generate_detailed_feedback(self, pose_name: str, quality_metrics: Dict[str, float], angles: Dict[str, float]) -> Dict[str, Any]:
+    def _generate_detailed_feedback(self, pose_name: str, quality_metrics: Dict[str, float], features: PoseFeatures, global_score: float) -> Dict[str, Any]:
         """Génère un feedback détaillé avec points forts et axes d'amélioration"""
         feedback = {
             'general_feedback': [],
@@ -236,7 +182,6 @@ class MLAnalyzer:
         }
         
         # Feedback général basé sur le score
-        global_score = self._calculate_global_score(quality_metrics)
         if global_score >= 85:
             feedback['general_feedback'].append("🌟 Excellente exécution ! Votre posture est très bien maîtrisée.")
         elif global_score >= 70:
@@ -268,7 +213,7 @@ class MLAnalyzer:
         
         # Feedback prioritaire
         if weakest_metric:
-            priority_tip = self._get_priority_tip(pose_name, weakest_metric, angles)
+            priority_tip = self._get_priority_tip(pose_name, weakest_metric, features)
             feedback['priority_feedback'].append(f"💡 Priorité: {priority_tip}")
         
         return feedback
@@ -285,32 +230,22 @@ class MLAnalyzer:
         return names.get(metric, metric)
     
     def _get_improvement_tip(self, pose_name: str, metric: str) -> str:
-        """Retourne un conseil d'amélioration spécifique"""
-        tips = {
-            'alignment': {
-                'downdog': "Travaillez l'alignement épaules-mains-hanches",
-                'warrior2': "Alignez le genou avant avec la cheville",
-                'tree': "Maintenez l'alignement hanche-genou-cheville"
-            },
-            'stability': {
-                'default': "Renforcez votre ancrage au sol et votre équilibre"
-            },
-            'symmetry': {
-                'default': "Travaillez la symétrie entre les côtés gauche et droit"
-            }
+        """Retourne un conseil d'amélioration spécifique (voir POSE_RULES)"""
+        default_tips = {
+            'stability': "Renforcez votre ancrage au sol et votre équilibre",
+            'symmetry': "Travaillez la symétrie entre les côtés gauche et droit"
         }
         
-        return tips.get(metric, {}).get(pose_name, tips.get(metric, {}).get('default', "Pratiquez régulièrement pour améliorer cet aspect"))
+        return (scoring_rules.tip(pose_name, metric)
+                or default_tips.get(metric, "Pratiquez régulièrement pour améliorer cet aspect"))
     
-    def _get_priority_tip(self, pose_name: str, metric: str, angles: Dict[str, float]) -> str:
-        """Génère un conseil prioritaire personnalisé"""
-        if metric == 'alignment' and pose_name == 'downdog':
-            return "Pliez légèrement les genoux pour permettre à votre bassin de se souvier et améliorer l'alignement de votre colonne."
+    def _get_priority_tip(self, pose_name: str, metric: str, features: PoseFeatures) -> str:
+        """Génère un conseil prioritaire personnalisé (voir POSE_RULES)"""
+        tip = scoring_rules.tip(pose_name, metric, 'priority_tips')
+        if tip:
+            return tip
         
-        elif metric == 'stability' and pose_name == 'tree':
-            return "Fixez un point devant vous et engagez vos abdominaux pour améliorer votre stabilité."
-        
-        elif metric == 'symmetry':
+        if metric == 'symmetry':
             return "Concentrez-vous sur une répartition égale du poids entre vos deux côtés."
         
         return f"Travaillez spécifiquement votre {self._get_metric_display_name(metric).lower()} pour progresser dans cette posture."
@@ -354,35 +289,35 @@ class MLAnalyzer:
             'benefit': "Amélioration globale de la technique"
         })
     
-    # def _demo_analysis(self, keypoints: List[Dict], angles: Dict[str, float]) -> Dict[str, Any]:
-    #     """Analyse de démonstration avec indicateurs simulés"""
-    #     quality_metrics = {
-    #         'alignment': 75.0,
-    #         'stability': 68.0,
-    #         'symmetry': 82.0,
-    #         'range_of_motion': 70.0,
-    #         'technique': 65.0
-    #     }
+    def _demo_analysis(self, keypoints: PoseKeypoints, angles: Dict[str, float]) -> Dict[str, Any]:
+        """Analyse de démonstration avec indicateurs simulés"""
+        quality_metrics = {
+            'alignment': 75.0,
+            'stability': 68.0,
+            'symmetry': 82.0,
+            'range_of_motion': 70.0,
+            'technique': 65.0
+        }
         
-    #     global_score = self._calculate_global_score(quality_metrics)
+        global_score = self._calculate_global_score(quality_metrics)
         
-    #     return {
-    #         'pose_name': 'demo_pose',
-    #         'confidence': 0.7,
-    #         'score': float(global_score),
-    #         'level': self._get_level(global_score),
-    #         'angles': angles,
-    #         'quality_metrics': quality_metrics,
-    #         'feedback': ['Mode démonstration - Entraînez le modèle ML pour de meilleurs résultats'],
-    #         'strengths': ['🎯 Symétrie: Correct (82%)'],
-    #         'improvements': ['📝 Stabilité: Travaillez votre équilibre (68%)'],
-    #         'priority_feedback': ['💡 Priorité: Renforcez votre stabilité en engageant les abdominaux'],
-    #         'exercise_recommendation': {
-    #             'name': "Posture de la montagne",
-    #             'description': "Exercice de base pour améliorer la stabilité",
-    #             'duration': "3 minutes",
-    #             'benefit': "Renforcement de l'équilibre"
-    #         },
-    #         'keypoints': keypoints,
-    #         'model_type': 'demo'
-    #     }
\ No newline at end of file
+        return {
+            'pose_name': 'demo_pose',
+            'confidence': 0.7,
+            'score': float(global_score),
+            'level': self._get_level(global_score),
+            'angles': angles,
+            'quality_metrics': quality_metrics,
+            'feedback': ['Mode démonstration - Entraînez le modèle ML pour de meilleurs résultats'],
+            'strengths': ['🎯 Symétrie: Correct (82%)'],
+            'improvements': ['📝 Stabilité: Travaillez votre équilibre (68%)'],
+            'priority_feedback': ['💡 Priorité: Renforcez votre stabilité en engageant les abdominaux'],
+            'exercise_recommendation': {
+                'name': "Posture de la montagne",
+                'description': "Exercice de base pour améliorer la stabilité",
+                'duration': "3 minutes",
+                'benefit': "Renforcement de l'équilibre"
+            },
+            'keypoints': keypoints.to_list(),
+            'model_type': 'demo'
+        }
@@ -1,28 +1,103 @@
+import os
 import cv2
+
+# Configuration pour réduire les logs (avant le chargement de MediaPipe)
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+import absl.logging
+absl.logging.set_verbosity(absl.logging.ERROR)
+
+import time
 import mediapipe as mp
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from keypoints import PoseKeypoints
+
+# Adaptive mode: longest side of the image passed to MediaPipe
+ADAPTIVE_TARGET_SIZE = 512
+
+# Adaptive mode: time allowed per call before giving up on escalation (ms)
+ADAPTIVE_LATENCY_BUDGET_MS = 150
+
+# Adaptive mode: mean body landmark visibility required to accept a pass
+ADAPTIVE_MIN_CONFIDENCE = 0.6
+
+# Adaptive mode: margin added around the previous detection (fraction of its size)
+ROI_MARGIN = 0.25
 
 class PoseEstimator:
-    def __init__(self):
+    def __init__(self, model_complexity=2, min_detection_confidence=0.5, static_image_mode=True):
+        """
+        static_image_mode=False enables tracking across consecutive video
+        frames: full detection only runs again when tracking is lost
+        """
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.static_image_mode = static_image_mode
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
         self.pose = self.mp_pose.Pose(
-            static_image_mode=True,
-            model_complexity=2,
+            static_image_mode=static_image_mode,
+            model_complexity=model_complexity,
             enable_segmentation=False,
-            min_detection_confidence=0.5
+            min_detection_confidence=min_detection_confidence
         )
     
-    def estimate_pose(self, image_path: str) -> Dict[str, Any]:
+    @staticmethod
+    def load_image(image_path: str, max_size: Optional[int] = None) -> np.ndarray:
         """
-        Estimate pose from image and return keypoints
+        Read an image (BGR), downscaling it so that its longest side
+        does not exceed max_size pixels
         """
-        # Read image
         image = cv2.imread(image_path)
         if image is None:
             raise ValueError(f"Could not read image from {image_path}")
         
+        return PoseEstimator.resize_image(image, max_size)
+    
+    @staticmethod
+    def decode_image(data: bytes, max_size: Optional[int] = None) -> np.ndarray:
+        """
+        Decode an encoded image (JPEG, PNG...) from memory, without a
+        temporary file, then downscale it like load_image
+        """
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+        if image is None:
+            raise ValueError("Could not decode image")
+        
+        return PoseEstimator.resize_image(image, max_size)
+    
+    @staticmethod
+    def resize_image(image: np.ndarray, max_size: Optional[int] = None) -> np.ndarray:
+        """
+        Downscale an image (BGR) so that its longest side does not exceed
+        max_size pixels
+        """
+        if max_size:
+            height, width = image.shape[:2]
+            scale = max_size / max(height, width)
+            if scale < 1:
+                image = cv2.resize(image, (int(width * scale), int(height * scale)),
+                                   interpolation=cv2.INTER_AREA)
+        return image
+    
+    def estimate_keypoints(self, image: np.ndarray) -> Optional[PoseKeypoints]:
+        """
+        Estimate keypoints from a BGR image array, without annotation
+        """
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        results = self.pose.process(image_rgb)
+        
+        if not results.pose_landmarks:
+            return None
+        return PoseKeypoints.from_mediapipe(results.pose_landmarks)
+    
+    def estimate_pose(self, image_path: str) -> Dict[str, Any]:
+        """
+        Estimate pose from image and return keypoints
+        """
+        # Read image
+        image = self.load_image(image_path)
+        
         # Convert BGR to RGB
         image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         results = self.pose.process(image_rgb)
@@ -31,14 +106,7 @@ class PoseEstimator:
             return {'keypoints': None, 'image_with_pose': None}
         
         # Extract keypoints
-        keypoints = []
-        for idx, landmark in enumerate(results.pose_landmarks.landmark):
-            keypoints.append({
-                'x': landmark.x,
-                'y': landmark.y,
-                'z': landmark.z,
-                'visibility': landmark.visibility
-            })
+        keypoints = PoseKeypoints.from_mediapipe(results.pose_landmarks)
         
         # Draw pose landmarks on image
         annotated_image = image.copy()
@@ -61,4 +129,184 @@ class PoseEstimator:
         }
     
     def close(self):
-        self.pose.close()
\ No newline at end of file
+        self.pose.close()
+
+
+class AdaptivePoseEstimator:
+    """
+    Pose estimation that picks the cheapest MediaPipe model able to detect
+    the pose, instead of always running model_complexity=2 on full images.
+
+    Each call downscales the image to target_size and, when the previous
+    call detected a pose, crops it to that bounding box plus a margin. The
+    first pass runs with min_complexity; a pass is accepted when the mean
+    visibility of the body landmarks reaches min_confidence. Otherwise the
+    call retries on the full image if the crop lost the pose, or escalates
+    one complexity tier, as long as the expected latency of the next pass
+    fits in the remaining latency budget.
+
+    The timing and tier of the last call are kept in last_report, and
+    cumulative per-tier counters are returned by metrics().
+    """
+
+    # Landmarks used for the confidence check (shoulders to feet)
+    BODY_LANDMARKS = slice(PoseKeypoints.LEFT_SHOULDER, None)
+
+    def __init__(self, min_complexity=0, max_complexity=2, min_detection_confidence=0.5,
+                 target_size=ADAPTIVE_TARGET_SIZE, latency_budget_ms=ADAPTIVE_LATENCY_BUDGET_MS,
+                 min_confidence=ADAPTIVE_MIN_CONFIDENCE, roi_margin=ROI_MARGIN, use_roi=True):
+        self.min_complexity = min_complexity
+        self.max_complexity = max_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.target_size = target_size
+        self.latency_budget_ms = latency_budget_ms
+        self.min_confidence = min_confidence
+        self.roi_margin = roi_margin
+        self.use_roi = use_roi
+
+        # One MediaPipe graph per complexity tier, created on first use
+        self._poses: Dict[int, Any] = {}
+        # Exponential moving average of each tier's latency (ms)
+        self._latency_ms: Dict[int, float] = {}
+        self._roi: Optional[Tuple[float, float, float, float]] = None
+
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._calls = 0
+        self._detections = 0
+        self._tier_counts = {tier: 0 for tier in range(min_complexity, max_complexity + 1)}
+        self._total_ms = 0.0
+
+    def _pose(self, complexity):
+        pose = self._poses.get(complexity)
+        if pose is None:
+            pose = self._poses[complexity] = mp.solutions.pose.Pose(
+                static_image_mode=True,
+                model_complexity=complexity,
+                enable_segmentation=False,
+                min_detection_confidence=self.min_detection_confidence
+            )
+        return pose
+
+    def reset(self):
+        """Forget the previous detection (next call runs on the full image)"""
+        self._roi = None
+
+    def _crop(self, image: np.ndarray, roi) -> np.ndarray:
+        if roi is None:
+            return image
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = roi
+        return image[int(y0 * height):int(np.ceil(y1 * height)), int(x0 * width):int(np.ceil(x1 * width))]
+
+    def _run(self, complexity, image: np.ndarray, roi) -> Tuple[Optional[PoseKeypoints], float]:
+        """One MediaPipe pass; keypoints are returned in full-image coordinates"""
+        crop = PoseEstimator.resize_image(self._crop(image, roi), self.target_size)
+        results = self._pose(complexity).process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        if not results.pose_landmarks:
+            return None, 0.0
+
+        keypoints = PoseKeypoints.from_mediapipe(results.pose_landmarks)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            array = keypoints.array
+            array[:, 0] = x0 + array[:, 0] * (x1 - x0)
+            array[:, 1] = y0 + array[:, 1] * (y1 - y0)
+            # z uses the same scale as x (normalized by the image width)
+            array[:, 2] *= x1 - x0
+        return keypoints, float(keypoints.visibility[self.BODY_LANDMARKS].mean())
+
+    def _roi_from(self, keypoints: PoseKeypoints) -> Optional[Tuple[float, float, float, float]]:
+        """Bounding box of the visible landmarks plus the margin, or None if it covers most of the image"""
+        visible = keypoints.visibility > 0.5
+        xy = keypoints.xy[visible] if visible.sum() >= 4 else keypoints.xy
+        (x0, y0), (x1, y1) = xy.min(axis=0), xy.max(axis=0)
+        margin = self.roi_margin * max(x1 - x0, y1 - y0)
+        x0, y0 = max(0.0, float(x0 - margin)), max(0.0, float(y0 - margin))
+        x1, y1 = min(1.0, float(x1 + margin)), min(1.0, float(y1 + margin))
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) > 0.8:
+            return None
+        return x0, y0, x1, y1
+
+    def _fits_budget(self, complexity, started) -> bool:
+        remaining_ms = self.latency_budget_ms - 1000 * (time.perf_counter() - started)
+        # A tier that never ran has no estimate: it is allowed once
+        return self._latency_ms.get(complexity, 0.0) <= remaining_ms
+
+    def estimate(self, image: np.ndarray) -> Tuple[Optional[PoseKeypoints], Dict[str, Any]]:
+        """
+        Estimate keypoints from a BGR image array.
+        Returns the keypoints (None if no pose) and the report of the call:
+        chosen tier, whether the image was cropped, confidence and timings.
+        """
+        started = time.perf_counter()
+        complexity = self.min_complexity
+        roi = self._roi if self.use_roi else None
+        passes = []
+        best = (None, 0.0, None, None)
+
+        while True:
+            warm = complexity in self._poses
+            pass_started = time.perf_counter()
+            keypoints, confidence = self._run(complexity, image, roi)
+            elapsed_ms = 1000 * (time.perf_counter() - pass_started)
+            # The first pass of a graph includes its initialization: not a latency sample
+            if warm:
+                previous = self._latency_ms.get(complexity)
+                self._latency_ms[complexity] = elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms
+            passes.append({'complexity': complexity, 'roi': roi is not None,
+                           'confidence': round(confidence, 3), 'ms': round(elapsed_ms, 2)})
+
+            if keypoints is not None and confidence >= best[1]:
+                best = (keypoints, confidence, complexity, roi)
+            if confidence >= self.min_confidence:
+                break
+
+            # Pose lost in the crop: full image at the same tier,
+            # low confidence: next tier
+            if keypoints is None and roi is not None:
+                roi = None
+            elif complexity < self.max_complexity:
+                complexity += 1
+            else:
+                break
+            if not self._fits_budget(complexity, started):
+                break
+
+        keypoints, confidence, tier, used_roi = best
+        self._roi = self._roi_from(keypoints) if keypoints is not None else None
+
+        total_ms = 1000 * (time.perf_counter() - started)
+        self._calls += 1
+        self._total_ms += total_ms
+        if keypoints is not None:
+            self._detections += 1
+            self._tier_counts[tier] += 1
+
+        self.last_report = {
+            'complexity': tier,
+            'roi': used_roi is not None,
+            'confidence': round(confidence, 3),
+            'escalated': len(passes) > 1,
+            'total_ms': round(total_ms, 2),
+            'passes': passes,
+        }
+        return keypoints, self.last_report
+
+    def estimate_keypoints(self, image: np.ndarray) -> Optional[PoseKeypoints]:
+        """Same interface as PoseEstimator.estimate_keypoints (report in last_report)"""
+        return self.estimate(image)[0]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Cumulative counters: detections per chosen tier and mean latency per call"""
+        return {
+            'calls': self._calls,
+            'detections': self._detections,
+            'tiers': dict(self._tier_counts),
+            'avg_ms': round(self._total_ms / self._calls, 2) if self._calls else 0,
+            'tier_latency_ms': {tier: round(ms, 2) for tier, ms in self._latency_ms.items()},
+        }
+
+    def close(self):
+        for pose in self._poses.values():
+            pose.close()
+        self._poses.clear()
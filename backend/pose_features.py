@@ -0,0 +1,86 @@
+import numpy as np
+from functools import cached_property
+from typing import Dict, List, Sequence
+from keypoints import PoseKeypoints
+from pose_geometry import ANGLE_NAMES, DISTANCE_NAMES, calculate_angles_batch, calculate_distances_batch
+
+ANGLE_INDEX = {name: idx for idx, name in enumerate(ANGLE_NAMES)}
+
+# Paires d'angles gauche/droite comparées pour la symétrie
+SYMMETRIC_PAIRS = [
+    ('left_elbow', 'right_elbow'),
+    ('left_knee', 'right_knee'),
+    ('left_shoulder', 'right_shoulder'),
+]
+_SYMMETRIC_LEFT = np.array([ANGLE_INDEX[left] for left, _ in SYMMETRIC_PAIRS])
+_SYMMETRIC_RIGHT = np.array([ANGLE_INDEX[right] for _, right in SYMMETRIC_PAIRS])
+
+
+class PoseFeatures:
+    """
+    Géométrie d'une pose calculée une seule fois par requête.
+    Chaque propriété est évaluée à la première lecture puis mise en cache.
+    """
+
+    def __init__(self, keypoints):
+        self.keypoints = PoseKeypoints.coerce(keypoints)
+
+    @classmethod
+    def batch(cls, keypoints_list: Sequence) -> List['PoseFeatures']:
+        """
+        Construit les PoseFeatures d'un lot de poses: angles, distances et
+        vecteurs de features sont calculés en une passe sur le tableau (N, 33, 4)
+        """
+        features_list = [cls(keypoints) for keypoints in keypoints_list]
+        if not features_list:
+            return features_list
+
+        batch = PoseKeypoints.stack([features.keypoints for features in features_list])
+        angle_values = calculate_angles_batch(batch)
+        distance_values = calculate_distances_batch(batch)
+        positions = batch[:, :, :2].astype(np.float64).reshape(len(batch), -1)
+        vectors = np.concatenate([positions, angle_values, distance_values], axis=1)
+
+        for features, angles, distances, vector in zip(features_list, angle_values, distance_values, vectors):
+            # Pré-remplit les propriétés mises en cache
+            features.__dict__.update(angle_values=angles, distance_values=distances, vector=vector)
+        return features_list
+
+    @cached_property
+    def _batch(self) -> np.ndarray:
+        return self.keypoints.array[np.newaxis]
+
+    @cached_property
+    def angle_values(self) -> np.ndarray:
+        """Angles articulaires (degrés), dans l'ordre de ANGLE_NAMES"""
+        return calculate_angles_batch(self._batch)[0]
+
+    @cached_property
+    def angles(self) -> Dict[str, float]:
+        return dict(zip(ANGLE_NAMES, self.angle_values.tolist()))
+
+    @cached_property
+    def distance_values(self) -> np.ndarray:
+        """Distances et ratios, dans l'ordre de DISTANCE_NAMES"""
+        return calculate_distances_batch(self._batch)[0]
+
+    @cached_property
+    def distances(self) -> Dict[str, float]:
+        return dict(zip(DISTANCE_NAMES, self.distance_values.tolist()))
+
+    @cached_property
+    def vector(self) -> np.ndarray:
+        """Vecteur de features du modèle, identique à extract_features_from_keypoints"""
+        positions = self.keypoints.xy.astype(np.float64).ravel()
+        return np.concatenate([positions, self.angle_values, self.distance_values])
+
+    @cached_property
+    def symmetric_differences(self) -> np.ndarray:
+        """Écarts absolus gauche/droite, dans l'ordre de SYMMETRIC_PAIRS"""
+        values = self.angle_values
+        return np.abs(values[_SYMMETRIC_LEFT] - values[_SYMMETRIC_RIGHT])
+
+    @cached_property
+    def hip_height_difference(self) -> float:
+        y = self.keypoints.y
+        return abs(float(y[PoseKeypoints.LEFT_HIP]) - float(y[PoseKeypoints.RIGHT_HIP]))
@@ -0,0 +1,97 @@
+"""
+Géométrie des poses: angles articulaires, distances et vecteur de features.
+
+Ce module ne dépend que de NumPy: il est partagé par l'entraînement
+(DataPreprocessor) et par l'API, qui analyse des keypoints déjà calculés
+par le navigateur sans charger MediaPipe ni scikit-learn.
+"""
+import numpy as np
+from keypoints import PoseKeypoints, NUM_LANDMARKS, KEYPOINT_FIELDS
+
+# Définition des triplets pour calcul d'angles (point, sommet, point)
+ANGLE_POINTS = [
+    ('left_elbow', [11, 13, 15]),      # Épaule, coude, poignet gauche
+    ('right_elbow', [12, 14, 16]),     # Épaule, coude, poignet droit
+    ('left_knee', [23, 25, 27]),       # Hanche, genou, cheville gauche
+    ('right_knee', [24, 26, 28]),      # Hanche, genou, cheville droit
+    ('left_hip', [11, 23, 25]),        # Épaule, hanche, genou gauche
+    ('right_hip', [12, 24, 26]),       # Épaule, hanche, genou droit
+    ('left_shoulder', [13, 11, 23]),   # Coude, épaule, hanche gauche
+    ('right_shoulder', [14, 12, 24]),  # Coude, épaule, hanche droit
+]
+ANGLE_NAMES = [name for name, _ in ANGLE_POINTS]
+_ANGLE_INDICES = np.array([idx for _, idx in ANGLE_POINTS])
+
+DISTANCE_NAMES = ['shoulder_width', 'hip_width', 'shoulder_hip_ratio']
+
+FEATURE_NAMES = (
+    [f'{axis}{i}' for i in range(NUM_LANDMARKS) for axis in ('x', 'y')]
+    + ANGLE_NAMES
+    + DISTANCE_NAMES
+)
+
+
+def keypoints_to_array(keypoints) -> np.ndarray:
+    """
+    Convertit des keypoints en tableau (33, 4).
+    Les PoseKeypoints (float32) sont renvoyés sans copie; une liste de dicts
+    est convertie en float64 sans perte de précision, les landmarks manquants
+    étant remplis avec NaN. La géométrie est toujours calculée en float64.
+    """
+    if isinstance(keypoints, PoseKeypoints):
+        return keypoints.array
+
+    array = np.full((NUM_LANDMARKS, len(KEYPOINT_FIELDS)), np.nan, dtype=np.float64)
+    for i, kp in enumerate(keypoints[:NUM_LANDMARKS]):
+        array[i] = [kp.get(field, 0.0) for field in KEYPOINT_FIELDS]
+    return array
+
+
+def calculate_angles_batch(keypoints: np.ndarray) -> np.ndarray:
+    """
+    Calcule les angles articulaires pour un lot de poses.
+    keypoints: tableau (N, 33, >=2) -> angles (N, len(ANGLE_NAMES)) en degrés
+    """
+    xy = np.asarray(keypoints, dtype=np.float64)[:, :, :2]
+    a = xy[:, _ANGLE_INDICES[:, 0]]
+    b = xy[:, _ANGLE_INDICES[:, 1]]
+    c = xy[:, _ANGLE_INDICES[:, 2]]
+    ba = a - b
+    bc = c - b
+
+    dot = np.einsum('nkd,nkd->nk', ba, bc)
+    norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    cosine_angle = dot / (norms + 1e-8)
+    return np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
+
+
+def calculate_distances_batch(keypoints: np.ndarray) -> np.ndarray:
+    """
+    Calcule les distances et ratios pour un lot de poses.
+    keypoints: tableau (N, 33, >=2) -> distances (N, len(DISTANCE_NAMES))
+    Le ratio épaule/hanche vaut 0 lorsque la largeur des hanches est nulle.
+    """
+    x = np.asarray(keypoints, dtype=np.float64)[:, :, 0]
+    shoulder_width = np.abs(x[:, 11] - x[:, 12])
+    hip_width = np.abs(x[:, 23] - x[:, 24])
+
+    ratio = np.zeros_like(hip_width)
+    np.divide(shoulder_width, hip_width, out=ratio, where=hip_width > 0)
+    return np.stack([shoulder_width, hip_width, ratio], axis=1)
+
+
+def extract_features_batch(keypoints: np.ndarray) -> np.ndarray:
+    """
+    Extrait la matrice de features d'un lot de poses.
+    keypoints: tableau (N, 33, 4) -> features (N, len(FEATURE_NAMES))
+    Colonnes: positions (x, y) des 33 points, angles, distances.
+    """
+    keypoints = np.asarray(keypoints)
+    if keypoints.ndim != 3 or keypoints.shape[1] != NUM_LANDMARKS:
+        raise ValueError(f"Forme de keypoints invalide: {keypoints.shape}, attendu (N, {NUM_LANDMARKS}, 4)")
+
+    positions = keypoints[:, :, :2].astype(np.float64).reshape(len(keypoints), -1)
+    angles = calculate_angles_batch(keypoints)
+    distances = calculate_distances_batch(keypoints)
+
+    return np.concatenate([positions, angles, distances], axis=1)
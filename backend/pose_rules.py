@@ -0,0 +1,279 @@
+"""
+Règles de notation des postures, décrites une seule fois par posture.
+
+POSE_RULES est la source unique des postures reconnues: fiche du catalogue
+(/api/postures/available), angles cibles, contrôles notés et conseils.
+ScoringRules compile ces règles en tableaux NumPy (poids, bornes, points)
+pour calculer les cinq indicateurs de qualité d'un lot de poses en une passe.
+Ajouter une posture revient à ajouter une entrée dans POSE_RULES.
+
+Un contrôle est un dict:
+    metric    indicateur concerné (voir METRIC_BASES)
+    measures  mesures lues (voir MEASURE_NAMES)
+    combine   'mean' (moyenne des mesures, un seul contrôle) ou 'each'
+              (un contrôle par mesure)
+    bands     [(min, max, points[, bornes]), ...]: la première plage qui
+              contient la valeur (None = non bornée) donne ses points;
+              bornes vaut '[]' (incluses, par défaut), '[)', '(]' ou '()'
+"""
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+from pose_geometry import ANGLE_NAMES
+from pose_features import SYMMETRIC_PAIRS
+
+# Score de départ de chaque indicateur, dans l'ordre des résultats
+METRIC_BASES = {
+    'alignment': 50.0,
+    'stability': 50.0,
+    'symmetry': 50.0,
+    'range_of_motion': 50.0,
+    'technique': 80.0,
+}
+METRIC_NAMES = list(METRIC_BASES)
+
+# Points d'amplitude par angle cible atteint (au prorata, plafonné à la cible)
+RANGE_OF_MOTION_POINTS = 10.0
+
+# Mesures disponibles pour les contrôles: angles, écarts gauche/droite, hanches
+ASYMMETRY_NAMES = [f"{left[len('left_'):]}_asymmetry" for left, _ in SYMMETRIC_PAIRS]
+MEASURE_NAMES = ANGLE_NAMES + ASYMMETRY_NAMES + ['hip_height_difference']
+MEASURE_INDEX = {name: idx for idx, name in enumerate(MEASURE_NAMES)}
+
+# Contrôles appliqués à toutes les postures
+GLOBAL_RULES = [
+    # Répartition du poids (simplifiée): différence de hauteur entre les hanches
+    {'metric': 'stability', 'measures': ['hip_height_difference'],
+     'bands': [(None, 0.05, 15, '[)'), (0.1, None, -20, '(]')]},
+    # Écarts gauche/droite: acceptable jusqu'à 10°, grande asymétrie au-delà de 25°
+    {'metric': 'symmetry', 'measures': ASYMMETRY_NAMES, 'combine': 'each',
+     'bands': [(None, 10, 3), (25, None, -10, '(]')]},
+]
+
+POSE_RULES = {
+    'downdog': {
+        'catalog': {
+            'name': 'Downward Dog',
+            'icon': '🐕',
+            'description': 'Posture de chien tête en bas, excellente pour l\'étirement complet',
+            'benefits': 'Étire les ischio-jambiers, renforce les bras et les épaules',
+            'difficulty': 'beginner',
+            'musclesWorked': ['Épaules', 'Ischio-jambiers', 'Mollets'],
+            'breathingTips': '5-10 respirations profondes',
+        },
+        'target_angles': {'left_shoulder': 90, 'right_shoulder': 90, 'left_hip': 90, 'right_hip': 90},
+        'range_of_motion': ['left_shoulder', 'right_shoulder'],
+        'rules': [
+            # Alignement épaules-mains-hanches
+            {'metric': 'alignment', 'measures': ['left_shoulder', 'right_shoulder'], 'combine': 'mean',
+             'bands': [(70, 100, 10), (None, 70, -15, '[)')]},
+        ],
+        'tips': {'alignment': "Travaillez l'alignement épaules-mains-hanches"},
+        'priority_tips': {
+            'alignment': "Pliez légèrement les genoux pour permettre à votre bassin de se souvier "
+                         "et améliorer l'alignement de votre colonne.",
+        },
+    },
+    'warrior2': {
+        'catalog': {
+            'name': 'Warrior II',
+            'icon': '⚔️',
+            'description': 'Posture de guerrier pour la force et la stabilité',
+            'benefits': 'Renforce les jambes, améliore l\'équilibre',
+            'difficulty': 'beginner',
+            'musclesWorked': ['Cuisses', 'Fessiers', 'Épaules'],
+            'breathingTips': '5-8 respirations par côté',
+        },
+        'target_angles': {'left_knee': 90, 'right_knee': 90, 'left_hip': 45, 'right_hip': 45},
+        'range_of_motion': ['left_knee', 'right_knee'],
+        'rules': [
+            # Alignement genou-cheville
+            {'metric': 'alignment', 'measures': ['left_knee', 'right_knee'], 'combine': 'each',
+             'bands': [(80, 100, 5)]},
+        ],
+        'tips': {'alignment': "Alignez le genou avant avec la cheville"},
+    },
+    'tree': {
+        'catalog': {
+            'name': 'Tree Pose',
+            'icon': '🌳',
+            'description': 'Posture de l\'arbre pour l\'enracinement et l\'équilibre',
+            'benefits': 'Améliore l\'équilibre, concentration',
+            'difficulty': 'beginner',
+            'musclesWorked': ['Jambes', 'Abdominaux', 'Dos'],
+            'breathingTips': '5-10 respirations profondes',
+        },
+        'target_angles': {'left_hip': 45, 'right_hip': 45},
+        'range_of_motion': ['left_hip', 'right_hip'],
+        'rules': [],
+        'tips': {'alignment': "Maintenez l'alignement hanche-genou-cheville"},
+        'priority_tips': {
+            'stability': "Fixez un point devant vous et engagez vos abdominaux pour améliorer votre stabilité.",
+        },
+    },
+    'goddess': {
+        'catalog': {
+            'name': 'Goddess Pose',
+            'icon': '👸',
+            'description': 'Posture de la déesse pour la puissance et l\'ouverture',
+            'benefits': 'Renforce les cuisses, ouverture des hanches',
+            'difficulty': 'intermediate',
+            'musclesWorked': ['Cuisses', 'Hanches', 'Épaules'],
+            'breathingTips': '5-8 respirations profondes',
+        },
+        'target_angles': {'left_knee': 90, 'right_knee': 90, 'left_hip': 45, 'right_hip': 45},
+        # Genoux fléchis à 90°
+        'range_of_motion': ['left_knee', 'right_knee'],
+        'rules': [],
+    },
+    'plank': {
+        'catalog': {
+            'name': 'Plank',
+            'icon': '💪',
+            'description': 'Posture de la planche pour la force centrale',
+            'benefits': 'Renforce le core, bras et épaules',
+            'difficulty': 'beginner',
+            'musclesWorked': ['Abdominaux', 'Épaules', 'Bras'],
+            'breathingTips': '3-5 respirations profondes',
+        },
+        'target_angles': {'left_shoulder': 180, 'right_shoulder': 180, 'left_hip': 180, 'right_hip': 180,
+                          'left_knee': 180, 'right_knee': 180},
+        'range_of_motion': ['left_hip', 'right_hip', 'left_knee', 'right_knee'],
+        'rules': [
+            # Bras presque droits
+            {'metric': 'technique', 'measures': ['left_shoulder'], 'bands': [(160, None, 10, '(]')]},
+        ],
+    },
+}
+
+# Labels du classifieur écrits autrement que l'identifiant de la posture
+POSE_ALIASES = {
+    'godess': 'goddess',
+}
+
+
+def _expand_rule(rule) -> List[Dict[str, Any]]:
+    """Découpe un contrôle 'each' en un contrôle par mesure"""
+    if rule.get('combine', 'mean') == 'each':
+        return [dict(rule, measures=[measure], combine='mean') for measure in rule['measures']]
+    return [rule]
+
+
+class ScoringRules:
+    """
+    Règles de POSE_RULES compilées en tableaux:
+        _check_weights (C, K)  poids des mesures de chaque contrôle (moyenne)
+        _band_min/_band_max/_band_points (C, B)  plages et points
+        _band_min_open/_band_max_open (C, B)     bornes exclues
+        _check_pose (C,)       posture du contrôle (-1: toutes les postures)
+        _check_metric (C, M)   indicateur du contrôle (one-hot)
+        _rom_targets (P + 1, A) angles cibles notés en amplitude (0: non noté)
+    """
+
+    def __init__(self, pose_rules=POSE_RULES, global_rules=GLOBAL_RULES):
+        self.pose_rules = pose_rules
+        self.pose_names = list(pose_rules)
+        self._pose_index = {name: idx for idx, name in enumerate(self.pose_names)}
+
+        checks = [(-1, check) for rule in global_rules for check in _expand_rule(rule)]
+        checks += [(self._pose_index[name], check)
+                   for name, spec in pose_rules.items()
+                   for rule in spec.get('rules', [])
+                   for check in _expand_rule(rule)]
+        num_bands = max((len(check['bands']) for _, check in checks), default=1)
+
+        self._check_pose = np.array([pose for pose, _ in checks], dtype=np.int64)
+        self._check_weights = np.zeros((len(checks), len(MEASURE_NAMES)))
+        self._check_metric = np.zeros((len(checks), len(METRIC_NAMES)))
+        # Plages de remplissage vides (min > max): jamais retenues
+        self._band_min = np.full((len(checks), num_bands), np.inf)
+        self._band_max = np.full((len(checks), num_bands), -np.inf)
+        self._band_points = np.zeros((len(checks), num_bands))
+        self._band_min_open = np.zeros((len(checks), num_bands), dtype=bool)
+        self._band_max_open = np.zeros((len(checks), num_bands), dtype=bool)
+
+        for c, (_, check) in enumerate(checks):
+            for measure in check['measures']:
+                self._check_weights[c, MEASURE_INDEX[measure]] = 1.0 / len(check['measures'])
+            self._check_metric[c, METRIC_NAMES.index(check['metric'])] = 1.0
+            for b, (low, high, points, *bounds) in enumerate(check['bands']):
+                bounds = bounds[0] if bounds else '[]'
+                self._band_min[c, b] = -np.inf if low is None else low
+                self._band_max[c, b] = np.inf if high is None else high
+                self._band_points[c, b] = points
+                self._band_min_open[c, b] = bounds[0] == '('
+                self._band_max_open[c, b] = bounds[1] == ')'
+
+        # Dernière ligne nulle: les postures inconnues (index -1) n'ont pas d'amplitude notée
+        self._rom_targets = np.zeros((len(self.pose_names) + 1, len(ANGLE_NAMES)))
+        for name, spec in pose_rules.items():
+            for angle_name in spec.get('range_of_motion', []):
+                self._rom_targets[self._pose_index[name], ANGLE_NAMES.index(angle_name)] = \
+                    spec['target_angles'][angle_name]
+
+        self._bases = np.array([METRIC_BASES[metric] for metric in METRIC_NAMES])
+
+    def pose_indices(self, pose_names: Sequence[str]) -> np.ndarray:
+        """Index de chaque posture dans POSE_RULES (-1 si inconnue)"""
+        return np.array([self._pose_index.get(POSE_ALIASES.get(name, name), -1) for name in pose_names],
+                        dtype=np.int64)
+
+    @staticmethod
+    def measures(angle_values: np.ndarray, hip_height_differences: np.ndarray) -> np.ndarray:
+        """Matrice des mesures (N, len(MEASURE_NAMES))"""
+        left = [ANGLE_NAMES.index(left) for left, _ in SYMMETRIC_PAIRS]
+        right = [ANGLE_NAMES.index(right) for _, right in SYMMETRIC_PAIRS]
+        asymmetries = np.abs(angle_values[:, left] - angle_values[:, right])
+        return np.concatenate([angle_values, asymmetries, hip_height_differences[:, np.newaxis]], axis=1)
+
+    def score_batch(self, pose_names: Sequence[str], angle_values: np.ndarray,
+                    hip_height_differences: np.ndarray) -> np.ndarray:
+        """
+        Calcule les indicateurs de qualité d'un lot de poses.
+        angle_values (N, len(ANGLE_NAMES)), hip_height_differences (N,)
+        -> scores (N, len(METRIC_NAMES)) entre 0 et 100
+        """
+        angle_values = np.asarray(angle_values, dtype=np.float64).reshape(-1, len(ANGLE_NAMES))
+        hip_height_differences = np.asarray(hip_height_differences, dtype=np.float64)
+        poses = self.pose_indices(pose_names)
+
+        # Contrôles: valeur de chaque contrôle puis points de la première plage qui la contient
+        values = self.measures(angle_values, hip_height_differences) @ self._check_weights.T
+        values = values[:, :, np.newaxis]
+        above_min = np.where(self._band_min_open, values > self._band_min, values >= self._band_min)
+        below_max = np.where(self._band_max_open, values < self._band_max, values <= self._band_max)
+        in_band = above_min & below_max
+        first_band = in_band.argmax(axis=2)
+        points = np.where(in_band.any(axis=2),
+                          self._band_points[np.arange(len(self._check_pose)), first_band], 0.0)
+        active = (self._check_pose == -1) | (self._check_pose == poses[:, np.newaxis])
+        scores = self._bases + (points * active) @ self._check_metric
+
+        # Amplitude: ratio angle / cible plafonné à 1 pour chaque angle noté
+        targets = self._rom_targets[poses]
+        ratios = np.minimum(angle_values / np.where(targets > 0, targets, 1.0), 1.0)
+        scores[:, METRIC_NAMES.index('range_of_motion')] += \
+            RANGE_OF_MOTION_POINTS * np.where(targets > 0, ratios, 0.0).sum(axis=1)
+
+        return np.clip(scores, 0, 100)
+
+    def quality_metrics(self, pose_names: Sequence[str], angle_values: np.ndarray,
+                        hip_height_differences: np.ndarray) -> List[Dict[str, float]]:
+        """Indicateurs de qualité d'un lot de poses, sous forme de dicts {indicateur: score}"""
+        scores = self.score_batch(pose_names, angle_values, hip_height_differences)
+        return [dict(zip(METRIC_NAMES, row.tolist())) for row in scores]
+
+    def tip(self, pose_name: str, metric: str, kind: str = 'tips') -> Optional[str]:
+        """Conseil propre à la posture pour un indicateur ('tips' ou 'priority_tips'), s'il existe"""
+        pose_name = POSE_ALIASES.get(pose_name, pose_name)
+        return self.pose_rules.get(pose_name, {}).get(kind, {}).get(metric)
+
+    def catalog(self) -> List[Dict[str, Any]]:
+        """Fiches des postures pour /api/postures/available"""
+        return [
+            {'id': name, **spec['catalog'], 'targetAngles': dict(spec['target_angles'])}
+            for name, spec in self.pose_rules.items()
+        ]
+
+
+# Règles compilées une seule fois au chargement du module
+scoring_rules = ScoringRules()
@@ -0,0 +1,259 @@
+import math
+import time
+import threading
+import numpy as np
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from keypoints import PoseKeypoints
+from pose_features import PoseFeatures
+from pose_geometry import ANGLE_NAMES
+
+# Nombre de frames conservées par session (environ 3 s à 30 images/s)
+STREAM_WINDOW = 90
+
+# Nombre maximal de sessions actives et délai d'inactivité avant éviction
+MAX_SESSIONS = 1000
+SESSION_IDLE_TIMEOUT_S = 300
+
+# Coefficient du lissage exponentiel des angles
+ANGLE_SMOOTHING = 0.3
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Horodatage 't' en secondes (None si absent); ValueError s'il n'est pas un nombre fini"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Horodatage invalide: {value!r}")
+    try:
+        timestamp = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Horodatage invalide: {value!r}")
+    if not math.isfinite(timestamp):
+        raise ValueError(f"Horodatage invalide: {value!r}")
+    return timestamp
+
+
+class SessionState:
+    """
+    État temporel d'une session: tampon circulaire de taille fixe et sommes
+    glissantes, mis à jour en O(1) par frame.
+
+    - sway: variance de la position du centre des hanches sur la fenêtre
+    - jitter: déplacement moyen des landmarks d'une frame à la suivante
+    - smoothed_angles: moyenne exponentielle des angles articulaires
+    - prediction_stability: part de la fenêtre où la posture majoritaire est prédite
+    - hold_duration: durée depuis laquelle la posture majoritaire est tenue
+    """
+
+    def __init__(self, window=STREAM_WINDOW, smoothing=ANGLE_SMOOTHING):
+        self.window = window
+        self.smoothing = smoothing
+        self.count = 0
+        self.head = 0
+        self.total_frames = 0
+
+        self._timestamps = np.zeros(window)
+        self._centers = np.zeros((window, 2))
+        self._displacements = np.zeros(window)
+        self._predictions: List[Optional[str]] = [None] * window
+
+        self._center_sum = np.zeros(2)
+        self._center_sq_sum = np.zeros(2)
+        self._displacement_sum = 0.0
+        self._prediction_counts = Counter()
+
+        self._previous_xy = None
+        self.smoothed_angles = None
+        self.held_pose = None
+        self.hold_start = None
+        self.last_timestamp = None
+        self.last_seen = time.monotonic()
+        # Horloge des horodatages: 'client' (champ t) ou 'server' (réception)
+        self.clock = None
+
+    def update(self, features: PoseFeatures, pose_name: Optional[str], timestamp: float):
+        """
+        Ajoute une frame; la plus ancienne sort de la fenêtre si le tampon est plein.
+        Les valeurs dérivées sont calculées avant toute modification de l'état:
+        une frame invalide (ValueError) laisse la session intacte.
+        """
+        timestamp = parse_timestamp(timestamp)
+        if timestamp is None:
+            raise ValueError("Horodatage manquant")
+        xy = features.keypoints.xy.astype(np.float64)
+        center = (xy[PoseKeypoints.LEFT_HIP] + xy[PoseKeypoints.RIGHT_HIP]) / 2
+        displacement = (float(np.linalg.norm(xy - self._previous_xy, axis=1).mean())
+                        if self._previous_xy is not None else 0.0)
+        angles = features.angle_values.astype(np.float64)
+        i = self.head
+
+        if self.count == self.window:
+            # Retrait de la frame évincée des sommes glissantes
+            self._center_sum -= self._centers[i]
+            self._center_sq_sum -= self._centers[i] ** 2
+            self._displacement_sum -= self._displacements[i]
+            self._prediction_counts[self._predictions[i]] -= 1
+        else:
+            self.count += 1
+
+        self._timestamps[i] = timestamp
+        self._centers[i] = center
+        self._displacements[i] = displacement
+        self._predictions[i] = pose_name
+        self._center_sum += center
+        self._center_sq_sum += center ** 2
+        self._displacement_sum += displacement
+        self._prediction_counts[pose_name] += 1
+        self.head = (i + 1) % self.window
+
+        if self.smoothed_angles is None:
+            self.smoothed_angles = angles
+        else:
+            self.smoothed_angles += self.smoothing * (angles - self.smoothed_angles)
+
+        # La tenue repart de zéro quand la posture majoritaire change
+        majority = self.majority_pose
+        if majority != self.held_pose:
+            self.held_pose = majority
+            self.hold_start = timestamp
+
+        self._previous_xy = xy
+        self.total_frames += 1
+        self.last_timestamp = timestamp
+        self.last_seen = time.monotonic()
+
+    @property
+    def majority_pose(self) -> Optional[str]:
+        if not self.count:
+            return None
+        return self._prediction_counts.most_common(1)[0][0]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Indicateurs temporels sur la fenêtre courante"""
+        if not self.count:
+            return {'frames': 0, 'window': 0}
+
+        mean = self._center_sum / self.count
+        # Somme des variances x et y (bornée à 0 contre les erreurs d'arrondi)
+        sway_variance = float(max(0.0, (self._center_sq_sum / self.count - mean ** 2).sum()))
+        # La toute première frame de la session n'a pas de déplacement
+        moves = self.count - 1 if self.total_frames <= self.window else self.count
+        jitter = self._displacement_sum / moves if moves else 0.0
+        majority = self.majority_pose
+        oldest = self._timestamps[self.head if self.count == self.window else 0]
+
+        return {
+            'frames': self.total_frames,
+            'window': self.count,
+            'window_duration_s': float(self.last_timestamp - oldest),
+            'pose_name': majority,
+            'prediction_stability': self._prediction_counts[majority] / self.count,
+            'hold_duration_s': float(self.last_timestamp - self.hold_start),
+            'sway_variance': sway_variance,
+            'jitter': float(jitter),
+            'smoothed_angles': dict(zip(ANGLE_NAMES, self.smoothed_angles.tolist())),
+        }
+
+
+class PoseStreamAnalyzer:
+    """
+    Analyse en continu de séquences de frames de keypoints.
+
+    Chaque session (utilisateur, identifiant de session) garde un SessionState
+    borné. Les sessions sont évincées après idle_timeout_s sans frame, ou par
+    ordre d'ancienneté au-delà de max_sessions.
+
+    Une session utilise une seule horloge: les horodatages du client (t) sur
+    toutes ses frames, ou l'heure de réception du serveur, une frame par
+    requête. Mélanger les deux fausserait les durées (ValueError).
+    """
+
+    def __init__(self, analyzer, window=STREAM_WINDOW, max_sessions=MAX_SESSIONS,
+                 idle_timeout_s=SESSION_IDLE_TIMEOUT_S, smoothing=ANGLE_SMOOTHING):
+        self.analyzer = analyzer
+        self.window = window
+        self.max_sessions = max_sessions
+        self.idle_timeout_s = idle_timeout_s
+        self.smoothing = smoothing
+        self._sessions: 'OrderedDict[Tuple[str, str], SessionState]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._evicted_idle = 0
+        self._evicted_capacity = 0
+
+    def process(self, user_id, session_id, frames: Sequence[Tuple[PoseKeypoints, Optional[float]]]) -> Dict[str, Any]:
+        """
+        Analyse des frames (keypoints, horodatage en secondes ou None) d'une session.
+        Retourne l'analyse de la dernière frame et les indicateurs temporels.
+        """
+        if not frames:
+            raise ValueError("Aucune frame fournie")
+        # Horodatages validés avant toute mise à jour de la session
+        frames = [(keypoints, parse_timestamp(timestamp)) for keypoints, timestamp in frames]
+        clock = self._clock(frames)
+
+        features_list = PoseFeatures.batch([keypoints for keypoints, _ in frames])
+        results = self.analyzer.analyze_features(features_list)
+        now = time.time()
+
+        with self._lock:
+            self._evict_idle()
+            state = self._get_session((str(user_id), str(session_id)))
+            if state.clock is not None and state.clock != clock:
+                raise ValueError(f"Horloge de session '{state.clock}': frames avec horodatage 't' "
+                                 f"{'requises' if state.clock == 'client' else 'refusées'}")
+            state.clock = clock
+            for features, result, (_, timestamp) in zip(features_list, results, frames):
+                state.update(features, result.get('pose_name'), timestamp if timestamp is not None else now)
+            temporal = state.metrics()
+
+        return {'session_id': session_id, 'analysis': results[-1], 'temporal': temporal}
+
+    @staticmethod
+    def _clock(frames: Sequence[Tuple[PoseKeypoints, Optional[float]]]) -> str:
+        """Horloge des frames d'une requête; ValueError si elle est ambiguë"""
+        stamped = sum(timestamp is not None for _, timestamp in frames)
+        if stamped == len(frames):
+            return 'client'
+        if stamped:
+            raise ValueError("Frames avec et sans horodatage 't' mélangées")
+        if len(frames) > 1:
+            raise ValueError("Horodatage 't' requis pour envoyer plusieurs frames")
+        return 'server'
+
+    def end_session(self, user_id, session_id) -> Optional[Dict[str, Any]]:
+        """Termine une session; retourne ses derniers indicateurs (None si inconnue)"""
+        with self._lock:
+            state = self._sessions.pop((str(user_id), str(session_id)), None)
+        return state.metrics() if state is not None else None
+
+    def _get_session(self, key) -> SessionState:
+        state = self._sessions.get(key)
+        if state is None:
+            if len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evicted_capacity += 1
+            state = self._sessions[key] = SessionState(self.window, self.smoothing)
+        else:
+            self._sessions.move_to_end(key)
+        return state
+
+    def _evict_idle(self):
+        """Évince les sessions inactives (rangées de la moins à la plus récemment utilisée)"""
+        deadline = time.monotonic() - self.idle_timeout_s
+        while self._sessions:
+            key, state = next(iter(self._sessions.items()))
+            if state.last_seen >= deadline:
+                break
+            del self._sessions[key]
+            self._evicted_idle += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'active_sessions': len(self._sessions),
+                'evicted_idle': self._evicted_idle,
+                'evicted_capacity': self._evicted_capacity,
+                'config': {'window': self.window, 'max_sessions': self.max_sessions,
+                           'idle_timeout_s': self.idle_timeout_s}
+            }
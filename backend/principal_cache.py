@@ -0,0 +1,109 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+# Nombre maximal de tokens en cache et durée de vie d'une entrée. Le cache est
+# propre à chaque processus: invalidate_user ne touche que le worker qui
+# traite la modification, les autres gardent l'ancien principal jusqu'à
+# expiration. La durée de vie courte borne ce délai avec plusieurs workers.
+PRINCIPAL_CACHE_SIZE = 10000
+PRINCIPAL_CACHE_TTL_S = 30
+
+# Champs du document utilisateur conservés dans le principal
+PRINCIPAL_FIELDS = ('_id', 'email', 'profile', 'preferences')
+
+
+class PrincipalCache:
+    """
+    Cache LRU/TTL token -> principal authentifié.
+
+    Le principal est une version réduite du document utilisateur
+    (PRINCIPAL_FIELDS, sans mot de passe haché). Un token en cache évite le
+    décodage du JWT et la lecture MongoDB de login_required. Une entrée
+    expire après ttl_s, ou plus tôt si le token lui-même expire; les
+    entrées d'un utilisateur sont invalidées explicitement quand son
+    document change (invalidate_user), dans ce processus seulement: avec
+    plusieurs workers, un principal modifié reste servi par les autres
+    jusqu'à ttl_s.
+    """
+
+    def __init__(self, max_entries=PRINCIPAL_CACHE_SIZE, ttl_s=PRINCIPAL_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # token -> (principal, expiration)
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+
+    def get(self, token) -> Optional[Dict[str, Any]]:
+        """Principal en cache pour ce token, ou None"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token, user: Dict[str, Any], token_expires_at: Optional[float] = None) -> Dict[str, Any]:
+        """Met en cache le principal d'un utilisateur authentifié et le retourne"""
+        principal = {field: user[field] for field in PRINCIPAL_FIELDS if field in user}
+        expires_at = time.time() + self.ttl_s
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            elif len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evicted += 1
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_user.setdefault(str(principal['_id']), set()).add(token)
+        return principal
+
+    def invalidate_user(self, user_id) -> int:
+        """Retire les entrées d'un utilisateur; retourne leur nombre"""
+        with self._lock:
+            tokens = self._tokens_by_user.pop(str(user_id), set())
+            for token in tokens:
+                self._entries.pop(token, None)
+            self.invalidated += len(tokens)
+            return len(tokens)
+
+    def _remove(self, token):
+        principal, _ = self._entries.pop(token)
+        user_id = str(principal['_id'])
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_s': self.ttl_s,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'invalidated': self.invalidated,
+            }
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Reconstruction des agrégats de statistiques (collections user_stats et
+daily_rollups) depuis la collection analyses: remplissage initial après migrate_history.py, ou
+réparation si les agrégats ont divergé.
+
+Usage: python rebuild_stats.py [--user USER_ID]
+"""
+import argparse
+import time
+from database import db
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reconstruction des statistiques par utilisateur")
+    parser.add_argument('--user', help="Ne reconstruit que cet utilisateur (par défaut: tous)")
+    args = parser.parse_args()
+
+    if getattr(db, 'demo_mode', False):
+        print("❌ MongoDB indisponible: rien à reconstruire")
+        raise SystemExit(1)
+
+    start = time.perf_counter()
+    user_ids = [args.user] if args.user else db.analyses.distinct('user_id')
+
+    for count, user_id in enumerate(user_ids, 1):
+        db.rebuild_user_stats(user_id)
+        if count % 100 == 0:
+            print(f"   {count}/{len(user_ids)} utilisateurs")
+
+    print(f"✅ Statistiques reconstruites pour {len(user_ids)} utilisateurs "
+          f"({time.perf_counter() - start:.1f} s)")
@@ -0,0 +1,140 @@
+"""
+Agrégats journaliers de l'activité (collection daily_rollups), tenus à jour
+à l'écriture.
+
+Un document par utilisateur et par jour (day = minuit UTC, index unique
+(user_id, day)):
+    count, score_sum, score_min, score_max     sessions et scores du jour
+    poses.<pose>                               sessions par posture
+
+Les vues par jour, semaine ou mois et les séries de jours consécutifs se
+calculent depuis ces lignes: au plus une par jour de la période demandée
+(MAX_PERIODS la limite à un an), quel que soit le nombre d'analyses.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from user_stats import field_key
+
+# Nombre de périodes par défaut et maximal par vue (un an au plus de lignes journalières)
+DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 6}
+MAX_PERIODS = {'day': 90, 'week': 52, 'month': 12}
+
+# Fenêtre de lecture des séries de jours consécutifs
+STREAK_WINDOW_DAYS = 366
+
+
+def day_start(value: datetime) -> datetime:
+    """Minuit UTC du jour de cette date"""
+    return datetime(value.year, value.month, value.day)
+
+
+def rollup_update(analysis: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Filtre et opérateurs de la ligne du jour pour une nouvelle analyse (upsert)"""
+    score = analysis.get('score', 0)
+    return (
+        {'user_id': analysis['user_id'], 'day': day_start(analysis['date'])},
+        {
+            '$inc': {'count': 1, 'score_sum': score, f"poses.{field_key(analysis.get('pose_name', 'unknown'))}": 1},
+            '$min': {'score_min': score},
+            '$max': {'score_max': score},
+        }
+    )
+
+
+def build_rollups(user_id, analyses: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Lignes journalières recalculées depuis les analyses d'un utilisateur"""
+    rows = {}
+    for analysis in analyses:
+        if not isinstance(analysis.get('date'), datetime):
+            continue
+        score = analysis.get('score', 0)
+        day = day_start(analysis['date'])
+        row = rows.setdefault(day, {'user_id': user_id, 'day': day, 'count': 0, 'score_sum': 0,
+                                    'score_min': score, 'score_max': score, 'poses': {}})
+        pose = field_key(analysis.get('pose_name', 'unknown'))
+        row['count'] += 1
+        row['score_sum'] += score
+        row['score_min'] = min(row['score_min'], score)
+        row['score_max'] = max(row['score_max'], score)
+        row['poses'][pose] = row['poses'].get(pose, 0) + 1
+    return [rows[day] for day in sorted(rows)]
+
+
+def period_start(day: datetime, period: str) -> datetime:
+    """Début du jour, de la semaine (lundi) ou du mois contenant ce jour"""
+    day = day_start(day)
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_starts(period: str, count: int, now: Optional[datetime] = None) -> List[datetime]:
+    """Début des count dernières périodes, la période en cours d'abord"""
+    start = period_start(now or datetime.utcnow(), period)
+    starts = []
+    for _ in range(count):
+        starts.append(start)
+        if period == 'month':
+            start = (start - timedelta(days=1)).replace(day=1)
+        else:
+            start -= timedelta(days=7 if period == 'week' else 1)
+    return starts
+
+
+def window_start(period: str, count: int, now: Optional[datetime] = None) -> datetime:
+    """Premier jour à lire pour la vue et les séries de jours consécutifs"""
+    now = now or datetime.utcnow()
+    return min(period_starts(period, count, now)[-1], day_start(now) - timedelta(days=STREAK_WINDOW_DAYS - 1))
+
+
+def group_periods(rows: Iterable[Dict[str, Any]], period: str, count: int,
+                  now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Série des count dernières périodes (la plus récente d'abord), périodes vides comprises"""
+    starts = period_starts(period, count, now)
+    totals = {start: {'sessions': 0, 'score_sum': 0, 'min_score': None, 'max_score': None, 'poses': {}}
+              for start in starts}
+
+    for row in rows:
+        total = totals.get(period_start(row['day'], period))
+        if total is None:
+            continue
+        total['sessions'] += row['count']
+        total['score_sum'] += row['score_sum']
+        total['min_score'] = row['score_min'] if total['min_score'] is None else min(total['min_score'], row['score_min'])
+        total['max_score'] = row['score_max'] if total['max_score'] is None else max(total['max_score'], row['score_max'])
+        for pose, pose_count in row.get('poses', {}).items():
+            total['poses'][pose] = total['poses'].get(pose, 0) + pose_count
+
+    series = []
+    for start in starts:
+        total = totals[start]
+        series.append({
+            'period': start.strftime('%Y-%m-%d'),
+            'sessions': total['sessions'],
+            'average_score': total['score_sum'] / total['sessions'] if total['sessions'] else 0,
+            'min_score': total['min_score'],
+            'max_score': total['max_score'],
+            'poses': total['poses'],
+        })
+    return series
+
+
+def streaks(rows: Iterable[Dict[str, Any]], today: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Série en cours (jours consécutifs jusqu'à aujourd'hui, 0 sans pratique
+    aujourd'hui) et plus longue série parmi les lignes fournies
+    """
+    today = day_start(today or datetime.utcnow())
+    days = sorted({row['day'] for row in rows if row.get('count')})
+
+    current = longest = run = 0
+    previous = None
+    for day in days:
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    if previous == today:
+        current = run
+    return {'current': current, 'longest': longest}
@@ -0,0 +1,64 @@
+import json
+import numpy as np
+import pytest
+from keypoints import PoseKeypoints
+from live_channel import parse_frame
+from pose_features import PoseFeatures
+from pose_stream import PoseStreamAnalyzer, SessionState, parse_timestamp
+
+
+class FixedAnalyzer:
+    def analyze_features(self, features_list):
+        return [{'pose_name': 'tree'} for _ in features_list]
+
+
+def random_keypoints(seed):
+    return PoseKeypoints.from_json(np.random.RandomState(seed).rand(33, 4).tolist())
+
+
+def assert_consistent(state, frames):
+    assert state.count == frames
+    assert sum(state._prediction_counts.values()) == frames
+    assert isinstance(state.metrics()['window_duration_s'], float)
+
+
+@pytest.mark.parametrize('value', ['abc', 'nan', float('inf'), [1], True])
+def test_invalid_timestamp_leaves_session_intact(value):
+    stream = PoseStreamAnalyzer(FixedAnalyzer(), window=4)
+    stream.process('u', 's', [(random_keypoints(i), float(i)) for i in range(3)])
+    state = stream._sessions[('u', 's')]
+
+    with pytest.raises(ValueError):
+        stream.process('u', 's', [(random_keypoints(3), value)])
+    assert_consistent(state, 3)
+
+    with pytest.raises(ValueError):
+        state.update(PoseFeatures.batch([random_keypoints(3)])[0], 'tree', value)
+    assert_consistent(state, 3)
+
+
+def test_numeric_string_timestamp_is_stored_as_float():
+    stream = PoseStreamAnalyzer(FixedAnalyzer(), window=4)
+    stream.process('u', 's', [(random_keypoints(0), 0.0)])
+    result = stream.process('u', 's', [(random_keypoints(1), '2')])
+    assert result['temporal']['window_duration_s'] == 2.0
+
+    # Les requêtes suivantes de la session restent analysables
+    result = stream.process('u', 's', [(random_keypoints(2), 3.5)])
+    assert result['temporal']['window_duration_s'] == 3.5
+
+
+def test_parse_timestamp():
+    assert parse_timestamp(None) is None
+    assert parse_timestamp('2') == 2.0
+    for value in ('abc', 'inf', '-inf', 'nan', {}, False):
+        with pytest.raises(ValueError):
+            parse_timestamp(value)
+
+
+def test_live_frame_rejects_invalid_timestamp():
+    flat = np.zeros(33 * 4).tolist()
+    assert parse_frame(json.dumps({'k': flat, 't': '2'}))[1] == 2.0
+    for value in ('abc', 'Infinity'):
+        with pytest.raises(ValueError):
+            parse_frame(json.dumps({'k': flat, 't': value}))
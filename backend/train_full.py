@@ -5,18 +5,53 @@ Script complet pour l'entraînement du modèle ML
 
 import sys
 import os
+import argparse
 
 # Ajouter le répertoire courant au chemin Python
 sys.path.append(os.path.dirname(__file__))
 
-from data_preprocessor import DataPreprocessor
-from train_model import PoseTrainer
+from data_preprocessor import DataPreprocessor, MAX_IMAGE_SIZE
+from train_model import PoseTrainer, SelectionPolicy
+from keypoint_cache import KeypointCache
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Entraînement complet du modèle de classification des postures")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Nombre de processus pour l'estimation de pose (1 = séquentiel)")
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help="Nombre d'images envoyées à chaque worker par paquet")
+    parser.add_argument('--max-image-size', type=int, default=MAX_IMAGE_SIZE,
+                        help="Taille maximale (plus grand côté, en pixels) des images décodées")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Dossier du cache de keypoints (défaut: ml_core/keypoint_cache)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Désactive le cache de keypoints")
+    parser.add_argument('--clear-cache', action='store_true',
+                        help="Vide le cache de keypoints avant le prétraitement")
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help="Nombre de processus pour la sélection de modèle (-1 = tous les cœurs)")
+    parser.add_argument('--max-latency-ms', type=float, default=None,
+                        help="Latence p99 maximale (ms) de predict_proba sur un échantillon")
+    parser.add_argument('--max-model-mb', type=float, default=None,
+                        help="Taille maximale (Mo) du modèle sérialisé")
+    parser.add_argument('--search', action='store_true',
+                        help="Recherche des hyperparamètres (successive halving) avant la sélection")
+    parser.add_argument('--search-candidates', type=int, default=8,
+                        help="Nombre de configurations tirées par modèle")
+    parser.add_argument('--search-time-budget', type=float, default=None,
+                        help="Budget de temps réel de la recherche (secondes)")
+    parser.add_argument('--search-cpu-budget', type=float, default=None,
+                        help="Budget de temps CPU cumulé de la recherche (secondes)")
+    parser.add_argument('--search-restart', action='store_true',
+                        help="Ignore le checkpoint existant et relance la recherche depuis le début")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     print("\n🚀 Démarrage de l'entraînement du modèle...")
     
     # 1. Prétraitement des données
-    print("\n📊 Étape 1: Prétraitement des données...")
+    print(f"\n📊 Étape 1: Prétraitement des données ({args.workers} workers)...")
     preprocessor = DataPreprocessor()
     
     # Chemins absolus vers les datasets
@@ -24,35 +59,63 @@ def main():
     test_path = os.path.join(os.path.dirname(__file__), '..','data', 'DATASET', 'TEST')
     models_path = os.path.join(os.path.dirname(__file__), '..','ml_core')
     
+    cache = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(models_path, 'keypoint_cache')
+        cache = KeypointCache(cache_dir, preprocessor.model_complexity,
+                              preprocessor.min_detection_confidence, args.max_image_size)
+        if args.clear_cache:
+            cache.clear()
+            print("🗑️ Cache de keypoints vidé")
+    
     print("Traitement des données d'entraînement...")
-    X_train, y_train = preprocessor.process_dataset(train_path)
-    preprocessor.save_dataset(X_train, y_train, models_path)
+    X_train, y_train = preprocessor.process_dataset(train_path, args.workers, args.chunksize, args.max_image_size, cache)
+    preprocessor.save_dataset(X_train, y_train, models_path, split='train')
     print("✅ Données d'entraînement prétraitées et sauvegardées")
     
     print("Traitement des données de test...")
-    X_test, y_test = preprocessor.process_dataset(test_path)
-    preprocessor.save_dataset(X_test, y_test, models_path)
+    X_test, y_test = preprocessor.process_dataset(test_path, args.workers, args.chunksize, args.max_image_size, cache)
+    preprocessor.save_dataset(X_test, y_test, models_path, split='test')
     print("✅ Données de test prétraitées et sauvegardées")
     
+    if cache is not None:
+        print(f"Cache de keypoints: {cache.stats()}")
+    
     # 2. Entraînement du modèle
     print("\n🧠 Étape 2: Entraînement du modèle...")
     trainer = PoseTrainer()
     
     # 🔥 CORRECTION : Charger les données AVANT l'entraînement
     print("Chargement des données et du label encoder...")
-    X_train_loaded, y_train_loaded = trainer.load_data(models_path)
-    X_test_loaded, y_test_loaded = trainer.load_data(models_path)
+    X_train_loaded, y_train_loaded = trainer.load_data(models_path, split='train')
+    X_test_loaded, y_test_loaded = trainer.load_data(models_path, split='test')
     
     print(f"Données chargées: {len(X_train_loaded)} échantillons d'entraînement, {len(X_test_loaded)} échantillons de test")
     print(f"Classes disponibles: {trainer.label_encoder.classes_}")
     
+    if args.search:
+        print("\n🔎 Recherche des hyperparamètres...")
+        checkpoint_path = os.path.join(models_path, 'hyperparameter_search.json')
+        if args.search_restart and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        trainer.search_hyperparameters(
+            X_train_loaded, y_train_loaded,
+            n_candidates=args.search_candidates,
+            time_budget_s=args.search_time_budget,
+            cpu_budget_s=args.search_cpu_budget,
+            n_jobs=args.jobs,
+            checkpoint_path=checkpoint_path
+        )
+    
     # Maintenant on peut entraîner
-    best_model_name, accuracy = trainer.train_models(X_train_loaded, y_train_loaded)
+    policy = SelectionPolicy(max_p99_ms=args.max_latency_ms, max_size_mb=args.max_model_mb)
+    best_model_name, accuracy = trainer.train_models(X_train_loaded, y_train_loaded, policy, n_jobs=args.jobs)
     test_accuracy = trainer.evaluate_model(X_test_loaded, y_test_loaded)
     
     # 3. Sauvegarde du modèle
     print("\n💾 Étape 3: Sauvegarde du modèle...")
     trainer.save_model(models_path)
+    trainer.export_compiled_model(models_path, X_test_loaded)
     
     print(f"\n🎉 Entraînement terminé !")
     print(f"📈 Meilleur modèle: {best_model_name}")
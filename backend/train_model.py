@@ -1,11 +1,101 @@
 import numpy as np
 import joblib
+import json
+import time
+import pickle
+from joblib import Parallel, delayed
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.svm import SVC
 from sklearn.neural_network import MLPClassifier
 from sklearn.metrics import accuracy_score, classification_report
-from sklearn.model_selection import cross_val_score
+from sklearn.model_selection import StratifiedKFold
 import os
+from feature_store import FeatureStore, DATASET_DIR
+from hyperparameter_search import SuccessiveHalvingSearch
+from compiled_model import export_compiled_model
+
+def _fit_and_score(model, X, y, train_idx, test_idx):
+    """Entraîne un clone du modèle sur un fold et retourne son accuracy"""
+    model = clone(model)
+    model.fit(X[train_idx], y[train_idx])
+    return model.score(X[test_idx], y[test_idx])
+
+
+def _fit(model, X, y):
+    return clone(model).fit(X, y)
+
+
+def benchmark_model(model, X, n_runs=200, batch_size=64):
+    """
+    Mesure la latence de predict_proba (un échantillon et par lot)
+    et la taille du modèle sérialisé
+    """
+    single = np.ascontiguousarray(X[:1])
+    batch = np.ascontiguousarray(X[:batch_size])
+    model.predict_proba(single)  # Échauffement
+    
+    single_ms = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        model.predict_proba(single)
+        single_ms.append((time.perf_counter() - start) * 1000)
+    
+    batch_ms = []
+    for _ in range(max(1, n_runs // 10)):
+        start = time.perf_counter()
+        model.predict_proba(batch)
+        batch_ms.append((time.perf_counter() - start) * 1000)
+    
+    return {
+        'p50_ms': float(np.percentile(single_ms, 50)),
+        'p99_ms': float(np.percentile(single_ms, 99)),
+        'batch_ms': float(np.median(batch_ms)),
+        'batch_size': len(batch),
+        'batch_per_row_ms': float(np.median(batch_ms)) / len(batch),
+        'size_mb': len(pickle.dumps(model)) / (1024 * 1024)
+    }
+
+
+class SelectionPolicy:
+    """
+    Politique de sélection du modèle: meilleure accuracy CV parmi les
+    candidats qui respectent les contraintes de latence et de taille.
+    Exemple: SelectionPolicy(max_p99_ms=2) -> "meilleure accuracy sous 2 ms p99"
+    """
+    def __init__(self, max_p99_ms=None, max_batch_per_row_ms=None, max_size_mb=None):
+        self.max_p99_ms = max_p99_ms
+        self.max_batch_per_row_ms = max_batch_per_row_ms
+        self.max_size_mb = max_size_mb
+    
+    def accepts(self, result):
+        limits = [
+            ('p99_ms', self.max_p99_ms),
+            ('batch_per_row_ms', self.max_batch_per_row_ms),
+            ('size_mb', self.max_size_mb),
+        ]
+        return all(limit is None or result[key] <= limit for key, limit in limits)
+    
+    def select(self, results):
+        """
+        Retourne le nom du modèle retenu. Si aucun candidat ne respecte les
+        contraintes, le plus rapide (p99) est retenu.
+        """
+        eligible = [name for name, result in results.items() if self.accepts(result)]
+        if not eligible:
+            print("⚠️ Aucun modèle ne respecte les contraintes, sélection du plus rapide")
+            return min(results, key=lambda name: results[name]['p99_ms'])
+        
+        # max() conserve le premier candidat en cas d'égalité
+        return max(eligible, key=lambda name: results[name]['cv_score'])
+    
+    def describe(self):
+        return {
+            'max_p99_ms': self.max_p99_ms,
+            'max_batch_per_row_ms': self.max_batch_per_row_ms,
+            'max_size_mb': self.max_size_mb
+        }
+
 
 class PoseTrainer:
     def __init__(self):
@@ -16,39 +106,93 @@ class PoseTrainer:
         }
         self.best_model = None
         self.label_encoder = None
+        self.selection_report = None
+        self.search = None
     
-    def load_data(self, data_path):
-        """Charge les données préparées"""
-        X = np.load(f'{data_path}/features.npy')
-        y = np.load(f'{data_path}/labels.npy')
+    def load_data(self, data_path, split='train'):
+        """
+        Charge un split des données préparées (memmap en lecture seule,
+        sans copie: le split n'a pas besoin de tenir en mémoire).
+        Les anciens fichiers features.npy/labels.npy restent lisibles.
+        """
+        store_path = os.path.join(data_path, DATASET_DIR)
+        if FeatureStore.exists(store_path):
+            X, y = FeatureStore(store_path).load(split)
+        else:
+            X = np.load(f'{data_path}/features.npy')
+            y = np.load(f'{data_path}/labels.npy')
         self.label_encoder = joblib.load(f'{data_path}/label_encoder.pkl')
         
         return X, y
     
-    def train_models(self, X_train, y_train):
-        """Entraîne plusieurs modèles et sélectionne le meilleur"""
+    def search_hyperparameters(self, X_train, y_train, **search_kwargs):
+        """
+        Recherche les hyperparamètres de chaque modèle par successive halving
+        (voir SuccessiveHalvingSearch) et remplace les modèles candidats par
+        leur meilleure configuration avant train_models
+        """
         y_encoded = self.label_encoder.transform(y_train)
-        best_score = 0
-        best_model_name = None
+        self.search = SuccessiveHalvingSearch(self.models, **search_kwargs)
+        best_params = self.search.fit(X_train, y_encoded)
         
-        for name, model in self.models.items():
-            print(f"Entraînement du modèle: {name}")
-            
-            # Validation croisée
-            scores = cross_val_score(model, X_train, y_encoded, cv=5)
-            mean_score = np.mean(scores)
-            print(f"  Score CV: {mean_score:.3f} (+/- {np.std(scores):.3f})")
+        for name, params in best_params.items():
+            self.models[name] = clone(self.models[name]).set_params(**params)
+            print(f"  {name}: {params}")
+        return best_params
+    
+    def train_models(self, X_train, y_train, policy=None, n_jobs=-1, cv=5):
+        """
+        Entraîne plusieurs modèles et sélectionne le meilleur.
+        Les folds de tous les candidats sont évalués en parallèle (n_jobs
+        processus), puis chaque candidat est mesuré en latence et en taille;
+        la politique de sélection choisit parmi ces résultats.
+        """
+        policy = policy or SelectionPolicy()
+        y_encoded = self.label_encoder.transform(y_train)
+        
+        # Validation croisée: candidats x folds en parallèle
+        # (mêmes folds que cross_val_score(cv=5) pour un classifieur)
+        folds = list(StratifiedKFold(n_splits=cv).split(X_train, y_encoded))
+        jobs = [(name, train_idx, test_idx) for name in self.models for train_idx, test_idx in folds]
+        print(f"Validation croisée: {len(self.models)} modèles x {cv} folds")
+        
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_and_score)(self.models[name], X_train, y_encoded, train_idx, test_idx)
+            for name, train_idx, test_idx in jobs
+        )
+        
+        # Entraînement final de tous les candidats, en parallèle
+        fitted = Parallel(n_jobs=n_jobs)(
+            delayed(_fit)(model, X_train, y_encoded) for model in self.models.values()
+        )
+        
+        # Mesures de latence, hors du pool pour ne pas être faussées par la charge
+        results = {}
+        for (name, model), fitted_model in zip(self.models.items(), fitted):
+            model_scores = [score for (job_name, _, _), score in zip(jobs, scores) if job_name == name]
+            result = {
+                'cv_score': float(np.mean(model_scores)),
+                'cv_std': float(np.std(model_scores))
+            }
+            result.update(benchmark_model(fitted_model, X_train))
+            results[name] = result
             
-            if mean_score > best_score:
-                best_score = mean_score
-                best_model_name = name
-                self.best_model = model
+            print(f"Modèle {name}:")
+            print(f"  Score CV: {result['cv_score']:.3f} (+/- {result['cv_std']:.3f})")
+            print(f"  Latence: p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+                  f"lot de {result['batch_size']}: {result['batch_per_row_ms']:.3f} ms/ligne")
+            print(f"  Taille: {result['size_mb']:.2f} Mo")
         
-        # Entraînement final du meilleur modèle
-        print(f"\nMeilleur modèle: {best_model_name}")
-        self.best_model.fit(X_train, y_encoded)
+        best_model_name = policy.select(results)
+        self.best_model = dict(zip(self.models, fitted))[best_model_name]
+        self.selection_report = {
+            'policy': policy.describe(),
+            'selected': best_model_name,
+            'candidates': results
+        }
         
-        return best_model_name, best_score
+        print(f"\nMeilleur modèle: {best_model_name}")
+        return best_model_name, results[best_model_name]['cv_score']
     
     def evaluate_model(self, X_test, y_test):
         """Évalue le modèle sur les données de test"""
@@ -70,13 +214,37 @@ class PoseTrainer:
         
         joblib.dump(self.best_model, f'{output_path}/pose_classifier.pkl')
         print(f"Modèle sauvegardé dans {output_path}/pose_classifier.pkl")
+        
+        if self.selection_report:
+            with open(f'{output_path}/model_selection.json', 'w', encoding='utf-8') as f:
+                json.dump(self.selection_report, f, indent=2)
+        
+        if self.search is not None:
+            self.search.save_trials(f'{output_path}/hyperparameter_trials.csv')
+            print(f"Table des essais sauvegardée dans {output_path}/hyperparameter_trials.csv")
+
+    def export_compiled_model(self, output_path, X_test):
+        """
+        Exporte le meilleur modèle en prédicteur NumPy (pose_classifier.npz)
+        après vérification de la parité sur X_test
+        """
+        compiled_path = f'{output_path}/pose_classifier.npz'
+        try:
+            return export_compiled_model(self.best_model, X_test, compiled_path,
+                                         labels=self.label_encoder.classes_)
+        except ValueError as e:
+            # Le serveur utilisera le modèle sklearn
+            print(f"⚠️ Export compilé impossible: {e}")
+            if os.path.exists(compiled_path):
+                os.remove(compiled_path)
+            return None
 
 if __name__ == "__main__":
     trainer = PoseTrainer()
     
     # Chargement des données
-    X_train, y_train = trainer.load_data('../ml_core')
-    X_test, y_test = trainer.load_data('../ml_core')
+    X_train, y_train = trainer.load_data('../ml_core', split='train')
+    X_test, y_test = trainer.load_data('../ml_core', split='test')
     
     # Entraînement
     best_model_name, best_score = trainer.train_models(X_train, y_train)
@@ -85,4 +253,5 @@ if __name__ == "__main__":
     trainer.evaluate_model(X_test, y_test)
     
     # Sauvegarde
-    trainer.save_model('../ml_core')
\ No newline at end of file
+    trainer.save_model('../ml_core')
+    trainer.export_compiled_model('../ml_core', X_test)
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Agrégats de statistiques par utilisateur, tenus à jour à l'écriture.
+
+Un document par utilisateur (collection user_stats, _id = id utilisateur):
+    total_sessions, score_sum, best_score      compteurs et maximum
+    poses.<pose>.count / .score_sum            sommes par posture
+    levels.<niveau>                            distribution des niveaux
+    best_session                               meilleure analyse (pose, score, date, niveau)
+    last_practice_date, streak                 série de jours consécutifs à la dernière pratique
+    storage.images / .bytes                    images distinctes stockées (voir record_user_image)
+
+add_pose_analysis applique stats_update() en une écriture ($inc/$max), puis,
+seulement si nécessaire, les mises à jour conditionnelles de followup_updates()
+(nouveau record, premier jour de pratique). build_stats() recalcule le même
+document depuis les analyses (reconstruction, voir rebuild_stats.py).
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def field_key(name) -> str:
+    """Nom de posture ou de niveau utilisable comme clé MongoDB"""
+    return str(name).replace('.', '_').lstrip('$') or 'unknown'
+
+
+def _day(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime('%Y-%m-%d') if isinstance(value, datetime) else None
+
+
+def _best_session(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'pose_name': analysis.get('pose_name'),
+        'score': analysis.get('score', 0),
+        'date': analysis.get('date'),
+        'level': analysis.get('level', 'beginner'),
+    }
+
+
+def stats_update(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Opérateurs de mise à jour des compteurs pour une nouvelle analyse"""
+    score = analysis.get('score', 0)
+    pose = field_key(analysis.get('pose_name', 'unknown'))
+    return {
+        '$inc': {
+            'total_sessions': 1,
+            'score_sum': score,
+            f'poses.{pose}.count': 1,
+            f'poses.{pose}.score_sum': score,
+            f"levels.{field_key(analysis.get('level', 'beginner'))}": 1,
+        },
+        '$max': {'best_score': score},
+        '$set': {'updated_at': datetime.utcnow()},
+    }
+
+
+def followup_updates(before: Optional[Dict[str, Any]], analysis: Dict[str, Any]) -> List[Tuple[Dict, Dict]]:
+    """
+    Mises à jour conditionnelles (filtre, opérateurs) à appliquer après
+    stats_update, d'après l'état précédent du document. Les filtres
+    reprennent l'état lu: une écriture concurrente les fait échouer au lieu
+    d'écraser un état plus récent.
+    """
+    before = before or {}
+    updates = []
+    score = analysis.get('score', 0)
+
+    # Nouveau record
+    best = before.get('best_session')
+    if best is None or score > best.get('score', 0):
+        updates.append((
+            {'$or': [{'best_session': None}, {'best_session.score': {'$lt': score}}]},
+            {'$set': {'best_session': _best_session(analysis)}}
+        ))
+
+    # Premier jour de pratique: la série continue (veille) ou repart à 1
+    today = _day(analysis.get('date'))
+    last = before.get('last_practice_date')
+    if today is not None and (last is None or today > last):
+        yesterday = _day(analysis['date'] - timedelta(days=1))
+        streak = before.get('streak', 0) + 1 if last == yesterday else 1
+        updates.append((
+            {'last_practice_date': last},
+            {'$set': {'last_practice_date': today, 'streak': streak}}
+        ))
+    return updates
+
+
+def build_stats(analyses: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Document d'agrégats recalculé depuis des analyses triées par date croissante"""
+    stats = None
+    for analysis in analyses:
+        if stats is None:
+            stats = {'total_sessions': 0, 'score_sum': 0, 'best_score': None, 'poses': {},
+                     'levels': {}, 'best_session': None, 'last_practice_date': None, 'streak': 0}
+        score = analysis.get('score', 0)
+        pose = stats['poses'].setdefault(field_key(analysis.get('pose_name', 'unknown')), {'count': 0, 'score_sum': 0})
+        pose['count'] += 1
+        pose['score_sum'] += score
+        level = field_key(analysis.get('level', 'beginner'))
+        stats['levels'][level] = stats['levels'].get(level, 0) + 1
+        stats['total_sessions'] += 1
+        stats['score_sum'] += score
+        stats['best_score'] = score if stats['best_score'] is None else max(stats['best_score'], score)
+
+        for _, update in followup_updates(stats, analysis):
+            stats.update(update['$set'])
+
+    if stats is not None:
+        stats['updated_at'] = datetime.utcnow()
+    return stats
+
+
+def current_streak(stats: Dict[str, Any], today: Optional[date] = None) -> int:
+    """Série en cours: jours consécutifs de pratique jusqu'à aujourd'hui (0 sans pratique aujourd'hui)"""
+    today = today or datetime.utcnow().date()
+    if stats.get('last_practice_date') != today.strftime('%Y-%m-%d'):
+        return 0
+    return stats.get('streak', 0)
+
+
+def summarize(stats: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Statistiques de /api/user/stats lues depuis les agrégats (sans parcourir l'historique)"""
+    if not stats or not stats.get('total_sessions'):
+        return None
+
+    poses = stats.get('poses', {})
+    best = stats.get('best_session') or {}
+    return {
+        'total_sessions': stats['total_sessions'],
+        'average_score': round(stats['score_sum'] / stats['total_sessions'], 1),
+        'most_frequent_pose': max(poses, key=lambda pose: poses[pose]['count']) if poses else None,
+        'best_score': best.get('score', 0),
+        'best_pose': best.get('pose_name', 'unknown'),
+    }
@@ -0,0 +1,277 @@
+"""
+Analyse de vidéos de pratique côté serveur.
+
+Les frames sont décodées une à une par OpenCV (générateur), échantillonnées
+à sample_fps, puis passées à MediaPipe en mode suivi (static_image_mode=False).
+Les keypoints détectés sont analysés par lots avec MLAnalyzer.analyze_batch.
+Seuls un lot de keypoints et les agrégats du résumé sont gardés en mémoire:
+la consommation ne dépend pas de la longueur de la vidéo.
+
+Usage: python video_pipeline.py video.mp4 [--fps 10] [--timeline timeline.jsonl]
+"""
+import argparse
+import json
+import cv2
+import numpy as np
+from typing import Any, Dict, Iterator, List, Tuple
+from pose_estimator import PoseEstimator, AdaptivePoseEstimator
+
+# Fréquence d'échantillonnage par défaut (frames analysées par seconde de vidéo)
+SAMPLE_FPS = 10
+
+# Nombre de poses détectées analysées par appel à analyze_batch
+VIDEO_BATCH_SIZE = 32
+
+# Taille maximale (plus grand côté) des frames passées à MediaPipe
+VIDEO_MAX_SIZE = 640
+
+# Le suivi rend un modèle plus léger suffisant pour la vidéo
+VIDEO_MODEL_COMPLEXITY = 1
+
+
+def iter_video_frames(video_path, sample_fps=SAMPLE_FPS, max_size=VIDEO_MAX_SIZE) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Décode une vidéo en flux et produit (index de frame, temps en s, image BGR)
+    pour les frames échantillonnées. Les frames ignorées sont seulement
+    avancées (grab), sans conversion d'image.
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Impossible de lire la vidéo {video_path}")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    interval = 1.0 / sample_fps if sample_fps else 0.0
+    next_sample = 0.0
+    index = 0
+
+    try:
+        while capture.grab():
+            timestamp = index / fps
+            if timestamp + 1e-9 >= next_sample:
+                ok, image = capture.retrieve()
+                if ok:
+                    yield index, timestamp, PoseEstimator.resize_image(image, max_size)
+                next_sample += interval
+                # Rattrapage si la vidéo a moins d'images par seconde que sample_fps
+                if next_sample < timestamp:
+                    next_sample = timestamp + interval
+            index += 1
+    finally:
+        capture.release()
+
+
+def video_info(video_path) -> Dict[str, Any]:
+    """Métadonnées de la vidéo (sans décodage)"""
+    capture = cv2.VideoCapture(video_path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        return {
+            'fps': fps,
+            'frame_count': frame_count,
+            'duration_s': frame_count / fps if frame_count > 0 else None,
+            'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        capture.release()
+
+
+class VideoSummary:
+    """Agrégats du résumé, mis à jour frame par frame (sans conserver la timeline)"""
+
+    def __init__(self):
+        self.sampled_frames = 0
+        self.detected_frames = 0
+        self.score_sum = 0.0
+        self.poses: Dict[str, Dict[str, Any]] = {}
+        self.segments: List[Dict[str, Any]] = []
+        self._segment = None
+        self.last_timestamp = 0.0
+
+    def add(self, entry: Dict[str, Any]):
+        self.sampled_frames += 1
+        self.last_timestamp = entry['t']
+        pose_name = entry.get('pose_name')
+
+        # Segments: suites de frames consécutives avec la même posture
+        if self._segment is None or self._segment['pose_name'] != pose_name:
+            self._close_segment(entry['t'])
+            self._segment = {'pose_name': pose_name, 'start_s': entry['t'], 'frames': 0, 'score_sum': 0.0}
+        self._segment['frames'] += 1
+
+        if pose_name is None:
+            return
+        self.detected_frames += 1
+        self.score_sum += entry['score']
+        self._segment['score_sum'] += entry['score']
+
+        stats = self.poses.setdefault(pose_name, {'frames': 0, 'score_sum': 0.0, 'best_score': 0.0, 'best_t': None})
+        stats['frames'] += 1
+        stats['score_sum'] += entry['score']
+        if entry['score'] > stats['best_score']:
+            stats['best_score'], stats['best_t'] = entry['score'], entry['t']
+
+    def _close_segment(self, end_s):
+        segment = self._segment
+        if segment is not None and segment['pose_name'] is not None:
+            self.segments.append({
+                'pose_name': segment['pose_name'],
+                'start_s': round(segment['start_s'], 3),
+                'end_s': round(end_s, 3),
+                'duration_s': round(end_s - segment['start_s'], 3),
+                'average_score': round(segment['score_sum'] / segment['frames'], 1),
+            })
+
+    def to_dict(self, frame_interval_s) -> Dict[str, Any]:
+        self._close_segment(self.last_timestamp + frame_interval_s)
+        self._segment = None
+
+        poses = {
+            name: {
+                'frames': stats['frames'],
+                'duration_s': round(stats['frames'] * frame_interval_s, 2),
+                'average_score': round(stats['score_sum'] / stats['frames'], 1),
+                'best_score': round(stats['best_score'], 1),
+                'best_t': stats['best_t'],
+            }
+            for name, stats in self.poses.items()
+        }
+        longest = max(self.segments, key=lambda segment: segment['duration_s'], default=None)
+        return {
+            'sampled_frames': self.sampled_frames,
+            'detected_frames': self.detected_frames,
+            'detection_rate': round(self.detected_frames / self.sampled_frames, 3) if self.sampled_frames else 0,
+            'average_score': round(self.score_sum / self.detected_frames, 1) if self.detected_frames else 0,
+            'main_pose': max(poses, key=lambda name: poses[name]['frames']) if poses else None,
+            'poses': poses,
+            'longest_hold': longest,
+            'segments': self.segments,
+        }
+
+
+class VideoAnalyzer:
+    """
+    Pipeline vidéo: décodage en flux -> MediaPipe (suivi) -> MLAnalyzer par lots.
+    Un PoseEstimator en mode suivi est créé pour chaque vidéo.
+
+    Avec adaptive=True, un AdaptivePoseEstimator remplace le suivi: recadrage
+    sur la pose de la frame précédente et complexité choisie à chaque frame
+    (model_complexity est alors le palier maximal). Le palier retenu est
+    indiqué dans la timeline (champ complexity).
+    """
+
+    def __init__(self, analyzer, sample_fps=SAMPLE_FPS, batch_size=VIDEO_BATCH_SIZE,
+                 max_size=VIDEO_MAX_SIZE, model_complexity=VIDEO_MODEL_COMPLEXITY,
+                 min_detection_confidence=0.5, adaptive=False):
+        self.analyzer = analyzer
+        self.sample_fps = sample_fps
+        self.batch_size = batch_size
+        self.max_size = max_size
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.adaptive = adaptive
+
+    def _create_estimator(self):
+        if self.adaptive:
+            return AdaptivePoseEstimator(max_complexity=self.model_complexity,
+                                         min_detection_confidence=self.min_detection_confidence,
+                                         target_size=self.max_size)
+        return PoseEstimator(self.model_complexity, self.min_detection_confidence, static_image_mode=False)
+
+    def iter_timeline(self, video_path) -> Iterator[Dict[str, Any]]:
+        """
+        Produit une entrée de timeline par frame échantillonnée, dans l'ordre.
+        Au plus batch_size frames (keypoints seulement) sont en attente d'analyse.
+        """
+        estimator = self._create_estimator()
+        pending = []  # (index, temps, keypoints ou None, palier de complexité ou None)
+
+        try:
+            for index, timestamp, image in iter_video_frames(video_path, self.sample_fps, self.max_size):
+                keypoints = estimator.estimate_keypoints(image)
+                complexity = estimator.last_report['complexity'] if self.adaptive else None
+                pending.append((index, timestamp, keypoints, complexity))
+                if len(pending) >= self.batch_size:
+                    yield from self._flush(pending)
+                    pending = []
+            yield from self._flush(pending)
+        finally:
+            estimator.close()
+
+    def _flush(self, pending) -> Iterator[Dict[str, Any]]:
+        detected = [keypoints for _, _, keypoints, _ in pending if keypoints is not None]
+        results = iter(self.analyzer.analyze_batch(detected) if detected else [])
+
+        for index, timestamp, keypoints, complexity in pending:
+            entry = {'frame': index, 't': round(timestamp, 3), 'pose_name': None}
+            if complexity is not None:
+                entry['complexity'] = complexity
+            if keypoints is not None:
+                result = next(results)
+                entry.update({
+                    'pose_name': str(result['pose_name']) if result.get('pose_name') is not None else None,
+                    'confidence': round(float(result.get('confidence', 0)), 3),
+                    'score': round(float(result.get('score', 0)), 1),
+                    'quality_metrics': {name: round(float(value), 1)
+                                        for name, value in result.get('quality_metrics', {}).items()},
+                })
+            yield entry
+
+    def frame_interval(self, fps) -> float:
+        """Durée représentée par une frame échantillonnée (s)"""
+        return 1.0 / min(self.sample_fps, fps) if self.sample_fps else 1.0 / fps
+
+    def analyze(self, video_path, include_timeline=True) -> Dict[str, Any]:
+        """Analyse une vidéo; retourne ses métadonnées, la timeline et le résumé"""
+        info = video_info(video_path)
+        summary = VideoSummary()
+        timeline = [] if include_timeline else None
+
+        for entry in self.iter_timeline(video_path):
+            summary.add(entry)
+            if timeline is not None:
+                timeline.append(entry)
+
+        result = {
+            'video': dict(info, sample_fps=self.sample_fps),
+            'summary': summary.to_dict(self.frame_interval(info['fps'])),
+        }
+        if timeline is not None:
+            result['timeline'] = timeline
+        return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyse d'une vidéo de pratique")
+    parser.add_argument('video', help="Chemin de la vidéo")
+    parser.add_argument('--fps', type=float, default=SAMPLE_FPS, help="Frames analysées par seconde")
+    parser.add_argument('--batch-size', type=int, default=VIDEO_BATCH_SIZE)
+    parser.add_argument('--max-size', type=int, default=VIDEO_MAX_SIZE, help="Plus grand côté des frames (px)")
+    parser.add_argument('--model-path', default='../ml_core')
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Complexité MediaPipe adaptative et recadrage sur la pose précédente")
+    parser.add_argument('--timeline', help="Écrit la timeline en JSON lines dans ce fichier")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    from pose_analyzer_ml import MLAnalyzer
+
+    args = parse_args()
+    video_analyzer = VideoAnalyzer(MLAnalyzer(args.model_path), args.fps, args.batch_size, args.max_size,
+                                   adaptive=args.adaptive)
+
+    summary = VideoSummary()
+    timeline_file = open(args.timeline, 'w', encoding='utf-8') if args.timeline else None
+    try:
+        for entry in video_analyzer.iter_timeline(args.video):
+            summary.add(entry)
+            if timeline_file:
+                timeline_file.write(json.dumps(entry) + '\n')
+    finally:
+        if timeline_file:
+            timeline_file.close()
+
+    info = video_info(args.video)
+    print(json.dumps(summary.to_dict(video_analyzer.frame_interval(info['fps'])), indent=2, ensure_ascii=False))
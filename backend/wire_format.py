@@ -0,0 +1,141 @@
+"""
+Formats binaires compacts de /analyze.
+
+Le Content-Type de la requête choisit le format du corps:
+- application/json: {"keypoints": [33 objets x/y/z/visibility], "image": ...} (historique)
+- application/x-pose-keypoints: 33 * 4 float32 little-endian bruts (528 octets)
+- application/msgpack: {"k": <33 * 4 float32 bruts>, "image": <octets JPEG>, "compact": bool}
+
+Le mode compact de la réponse omet les keypoints renvoyés en écho; il est
+utilisé par défaut pour les corps binaires. La réponse est en MessagePack si
+le client l'accepte (en-tête Accept), sinon en JSON.
+
+Usage: python wire_format.py [--runs 2000] [--model-path ../ml_core]
+"""
+import argparse
+import json
+import time
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+from keypoints import PoseKeypoints
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+KEYPOINTS_CONTENT_TYPE = 'application/x-pose-keypoints'
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+BINARY_CONTENT_TYPES = (KEYPOINTS_CONTENT_TYPE,) + MSGPACK_CONTENT_TYPES
+
+# Champs omis par le mode compact
+COMPACT_OMITTED_FIELDS = ('keypoints',)
+
+
+def is_binary(content_type: Optional[str]) -> bool:
+    return content_type in BINARY_CONTENT_TYPES
+
+
+def decode_body(content_type: str, body: bytes) -> Tuple[PoseKeypoints, Dict[str, Any]]:
+    """
+    Décode un corps binaire de /analyze.
+    Retourne les keypoints et les autres champs (image, compact).
+    Lève ValueError si le corps est invalide.
+    """
+    if content_type == KEYPOINTS_CONTENT_TYPE:
+        return PoseKeypoints.from_bytes(body), {}
+
+    if msgpack is None:
+        raise ValueError("MessagePack non disponible (pip install msgpack)")
+    try:
+        data = msgpack.unpackb(body, raw=False)
+        keypoints = data.pop('k')
+    except (msgpack.UnpackException, ValueError, AttributeError, KeyError, TypeError) as e:
+        raise ValueError(f"Corps MessagePack invalide: {e}")
+
+    # Tampon float32 brut, ou tableau plat de 132 nombres
+    if isinstance(keypoints, (bytes, bytearray)):
+        return PoseKeypoints.from_bytes(keypoints), data
+    return PoseKeypoints.from_flat(keypoints), data
+
+
+def compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Résultat d'analyse sans les champs volumineux renvoyés en écho"""
+    return {key: value for key, value in result.items() if key not in COMPACT_OMITTED_FIELDS}
+
+
+def _to_builtin(value):
+    # Scalaires numpy et dates, comme le fait l'encodeur JSON de Flask pour les dates
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def pack(obj: Any) -> bytes:
+    """Sérialise une réponse en MessagePack"""
+    return msgpack.packb(obj, default=_to_builtin, use_bin_type=True)
+
+
+def benchmark_wire_formats(result: Dict[str, Any], n_runs=2000) -> Dict[str, Dict[str, float]]:
+    """
+    Compare les formats de requête (encodage client + décodage serveur) et
+    de réponse (encodage serveur): taille en octets et temps moyen en µs.
+    result est un résultat d'analyse complet (avec les keypoints en écho).
+    """
+    keypoints = PoseKeypoints.coerce(result['keypoints'])
+
+    def measure(fn):
+        fn()  # Échauffement
+        start = time.perf_counter()
+        for _ in range(n_runs):
+            fn()
+        return 1e6 * (time.perf_counter() - start) / n_runs
+
+    requests = {
+        'json': (lambda: json.dumps({'keypoints': keypoints.to_list()}).encode(),
+                 lambda body: PoseKeypoints.from_json(json.loads(body)['keypoints'])),
+        'float32': (keypoints.to_bytes, PoseKeypoints.from_bytes),
+    }
+    if msgpack is not None:
+        requests['msgpack'] = (lambda: pack({'k': keypoints.to_bytes()}),
+                               lambda body: decode_body(MSGPACK_CONTENT_TYPES[0], body))
+
+    report = {}
+    for name, (encode, decode) in requests.items():
+        body = encode()
+        report[f'request_{name}'] = {
+            'bytes': len(body),
+            'encode_us': measure(encode),
+            'decode_us': measure(lambda: decode(body)),
+        }
+
+    responses = {
+        'json_full': lambda: json.dumps(result, default=_to_builtin).encode(),
+        'json_compact': lambda: json.dumps(compact_result(result), default=_to_builtin).encode(),
+    }
+    if msgpack is not None:
+        responses['msgpack_compact'] = lambda: pack(compact_result(result))
+
+    for name, encode in responses.items():
+        report[f'response_{name}'] = {'bytes': len(encode()), 'encode_us': measure(encode)}
+    return report
+
+
+if __name__ == '__main__':
+    from pose_analyzer_ml import MLAnalyzer
+
+    parser = argparse.ArgumentParser(description="Benchmark des formats de /analyze")
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--model-path', default='../ml_core')
+    args = parser.parse_args()
+
+    # Pose aléatoire: seule la taille des données compte ici
+    rng = np.random.default_rng(0)
+    sample = PoseKeypoints(rng.uniform(0, 1, (33, 4)))
+    result = MLAnalyzer(args.model_path).analyze_pose(sample)
+
+    for name, stats in benchmark_wire_formats(result, args.runs).items():
+        timings = ', '.join(f"{key} {value:.1f}" for key, value in stats.items() if key != 'bytes')
+        print(f"{name:<26} {stats['bytes']:>6} octets  {timings}")
@@ -3,8 +3,13 @@ import { userAPI } from '../../services/api'
 import { ClearHistoryModal } from '../ClearHistory/ClearHistory'
 import './Dashboard.css'
 
+// Champs de l'historique affichés par le dashboard
+const HISTORY_FIELDS = 'pose_name,score,level,feedback,quality_metrics,image_url'
+
 export function Dashboard() {
   const [history, setHistory] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [stats, setStats] = useState(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
@@ -19,11 +24,12 @@ export function Dashboard() {
     try {
       setLoading(true)
       const [historyResponse, statsResponse] = await Promise.all([
-        userAPI.getHistory(),
+        userAPI.getHistory({ fields: HISTORY_FIELDS }),
         userAPI.getDetailedStats()
       ])
       
-      setHistory(historyResponse.data)
+      setHistory(historyResponse.data.items)
+      setNextCursor(historyResponse.data.next_cursor)
       setStats(statsResponse.data)
     } catch (err) {
       setError('Erreur lors du chargement des données')
@@ -33,6 +39,19 @@ export function Dashboard() {
     }
   }
 
+  const loadMoreHistory = async () => {
+    try {
+      setLoadingMore(true)
+      const response = await userAPI.getHistory({ fields: HISTORY_FIELDS, cursor: nextCursor })
+      setHistory((previous) => [...previous, ...response.data.items])
+      setNextCursor(response.data.next_cursor)
+    } catch (err) {
+      console.error('Erreur historique:', err)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('fr-FR', {
       day: 'numeric',
@@ -189,6 +208,14 @@ export function Dashboard() {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="history-actions">
+            <button onClick={loadMoreHistory} className="btn-secondary" disabled={loadingMore}>
+              {loadingMore ? '🔄 Chargement...' : '⬇️ Voir plus'}
+            </button>
+          </div>
+        )}
       </div>
       {/* Bouton pour ouvrir la modal */}
       {history.length > 0 && (
@@ -54,8 +54,9 @@ export const postureAPI = {
 };
 
 export const userAPI = {
-  getHistory: () => 
-    api.get('/api/user/history'),
+  // Page d'historique: { items, next_cursor } (limit, cursor, fields, pose, from, to)
+  getHistory: (params = {}) => 
+    api.get('/api/user/history', { params }),
   
   getStats: () => 
     api.get('/api/user/stats'),
@@ -63,6 +64,10 @@ export const userAPI = {
   getDetailedStats: () => 
     api.get('/api/user/detailed-stats'),
   
+  // Séries par jour, semaine ou mois et séries de jours consécutifs
+  getActivity: (period = 'week', count) => 
+    api.get('/api/user/activity', { params: { period, count } }),
+  
   updateProfile: (profileData) => 
     api.put('/api/user/profile', profileData),
 